@@ -0,0 +1,2400 @@
+#! /usr/bin/python3
+##################################################################
+#
+# Raspberry Pi Antenna Driver benchmarks (RPiAntBench.py)
+#
+# Stand alone benchmarks for the RPiAntDrv.py building blocks.
+# Run with the name of a benchmark, e.g.  RPiAntBench.py encoder
+#
+##################################################################
+
+import argparse
+import bisect
+import collections
+import configparser
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import RPiAntCal
+import RPiAntLog
+from RPiAntDrv import (DEFAULT_INI, FREQ_PATTERN, PIN_KEYS,
+                       AntennaController, AntennaGroup, ControlThread,
+                       EncoderCounter, FrequencyIndex, MotionController,
+                       StallDetector)
+from RPiAntSim import (MotorPlant, SimGPIO, SimTimers, VirtualClock,
+                       default_load, read_sweep, run, run_controller,
+                       sim_controller, vfo_sweep)
+
+def fire_pulses(counter, rate, duration, direction=1):
+    # Emulate the RPi.GPIO callback thread: call counter.pulse at a fixed
+    # rate, busy waiting because sleep() is far too coarse at kHz rates
+    period = 1.0 / rate
+    fired = 0
+    counter.direction = direction
+    start = time.perf_counter()
+    due = start
+    while due - start < duration:
+        while time.perf_counter() < due:
+            pass
+        counter.pulse(None)
+        fired += 1
+        due += period
+    return fired
+
+def bench_encoder(args):
+    # Stress the encoder counter from a callback thread while another
+    # thread keeps reading it the way the GUI and motor_move do
+    print ('Encoder counter stress, %.1f s per rate' % args.duration)
+    print ('%8s %10s %10s %10s %12s' % ('rate Hz', 'fired', 'counted',
+                                         'lost', 'reads'))
+    failed = False
+    for rate in args.rates:
+        counter = EncoderCounter()
+        counter.sync(1000)
+        result = {}
+        reads = [0]
+        done = threading.Event()
+
+        def reader():
+            # GUI side: poll position and pulse history until told to stop
+            while not done.is_set():
+                counter.position        # Read as the display would
+                counter.recent(8)
+                reads[0] += 1
+
+        def writer():
+            result['up'] = fire_pulses(counter, rate, args.duration / 2, 1)
+            result['down'] = fire_pulses(counter, rate, args.duration / 2, -1)
+
+        read_thread = threading.Thread(target=reader)
+        write_thread = threading.Thread(target=writer)
+        read_thread.start()
+        write_thread.start()
+        write_thread.join()
+        done.set()
+        read_thread.join()
+
+        fired = result['up'] + result['down']
+        expected = 1000 + result['up'] - result['down']
+        lost = abs(expected - counter.position) + (fired - counter.pulses)
+        # Timestamps in the ring must be in order, oldest first
+        stamps = [t for t, _d in counter.recent(counter.mask + 1)]
+        ordered = all(a <= b for a, b in zip(stamps, stamps[1:]))
+        print ('%8d %10d %10d %10d %12d' % (rate, fired, counter.pulses,
+                                             lost, reads[0]))
+        if lost or not ordered:
+            failed = True
+    print ('FAIL: counts lost' if failed else 'PASS: no counts lost')
+    return 1 if failed else 0
+
+def verdict(failures):
+    # PASS, or FAIL and each check that failed, returns the exit code
+    for failure in failures:
+        print ('FAIL: %s' % failure)
+    if not failures:
+        print ('PASS')
+    return 1 if failures else 0
+
+def preset_targets(antenna='Antenna 1'):
+    # Encoder counts of the default preset table, in ini file order
+    return [int(v) for v in DEFAULT_INI[antenna + '_Preset'].values()]
+
+def legacy_mover(counter, plant, full_speed, slow_speed):
+    # The original motor_move: full speed until within 5 counts, then
+    # slow speed, stop when the count equals the preset
+    def start(target):
+        def tick():
+            position = counter.position
+            if position == target:
+                plant.stop()
+                return False
+            near = target - 5 <= position <= target + 5
+            direction = -1 if position > target else 1
+            counter.direction = direction
+            plant.drive(direction, slow_speed if near else full_speed)
+            return True
+        return tick
+    return start, 0.1
+
+def predictive_mover(counter, plant, full_speed, slow_speed):
+    def drive(direction, duty):
+        counter.direction = direction
+        plant.drive(direction, duty)
+    motion = MotionController(counter, drive,
+                              lambda _since=None: plant.stop(),
+                              clock=plant.clock)
+    motion.full_speed = full_speed
+    motion.slow_speed = slow_speed
+    def start(target):
+        motion.start(target)
+        return motion.step
+    return start, 0.02
+
+def run_moves(make_mover, targets, full_speed=100, slow_speed=25, **plant_args):
+    # Drive a simulated antenna through the targets, one move after another
+    clock = VirtualClock()
+    counter = EncoderCounter(clock=clock)
+    plant = MotorPlant(clock, **plant_args)
+    plant.callbacks.append(counter.pulse)
+    start, period = make_mover(counter, plant, full_speed, slow_speed)
+    results = []
+    for target in targets:
+        begin = counter.position
+        way = 1 if target >= begin else -1
+        peak = [0]
+        def watch(_channel):
+            peak[0] = max(peak[0], (counter.position - target) * way)
+        plant.callbacks.append(watch)
+        elapsed = run(clock, plant, start(target), period, limit=60.0)
+        plant.callbacks.remove(watch)
+        results.append((begin, target, elapsed, peak[0],
+                        counter.position - target))
+    return results
+
+def bench_move(args):
+    # Time-to-preset and overshoot across the default preset table for
+    # the original 100 mS polling motor_move and the motion controller
+    targets = preset_targets() * args.passes
+    movers = [('legacy', legacy_mover), ('predictive', predictive_mover)]
+    print ('Preset moves on simulated motor, max rate %.0f pulses/s'
+           % args.max_rate)
+    print ('%-11s %6s %9s %9s %10s %8s' % ('controller', 'moves', 'mean s',
+                                          'max s', 'overshoot', 'missed'))
+    found = {}
+    for name, mover in movers:
+        results = run_moves(mover, targets, max_rate=args.max_rate)
+        times = [r[2] for r in results]
+        overshoot = sum(r[3] for r in results)
+        missed = sum(1 for r in results if r[4])
+        mean = sum(times) / len(times)
+        print ('%-11s %6d %9.2f %9.2f %10d %8d' % (name, len(results),
+               mean, max(times), overshoot, missed))
+        found[name] = (mean, overshoot, missed)
+    # The motion controller has to stop on every preset, without going
+    # past more than the legacy mover. Where the legacy mover stops on
+    # every preset too, it may take no more than a tenth longer.
+    mean, overshoot, missed = found['predictive']
+    failures = []
+    if missed:
+        failures.append('predictive missed %d presets' % missed)
+    if overshoot > found['legacy'][1]:
+        failures.append('predictive overshot %d counts, legacy %d' % (
+            overshoot, found['legacy'][1]))
+    if not found['legacy'][2] and mean > 1.1 * found['legacy'][0]:
+        failures.append('predictive mean %.2f s, legacy %.2f s' % (
+            mean, found['legacy'][0]))
+    return verdict(failures)
+
+def sim_antenna(args, **plant_args):
+    # Simulated antenna on the default pins driven by AntennaController
+    gpio = SimGPIO()
+    plant_args.setdefault('max_rate', args.max_rate)
+    plant_args.setdefault('bounces', args.bounces)
+    plant_args.setdefault('load', default_load)
+    controller, plant = sim_controller(gpio, **plant_args)
+    return gpio, plant, controller
+
+def bench_sim(args):
+    # Preset moves and stall detection through the GPIO stand-in
+    gpio, plant, controller = sim_antenna(args)
+    clock = gpio.clock
+    targets = preset_targets() * args.passes
+    times, overshoots, missed, cpu = [], [], [], []
+    off = 0
+    for target in targets:
+        start = clock.now
+        way = 1 if target >= controller.encoder.position else -1
+        drift = controller.encoder.position - plant.count
+        peak = [0]
+        def watch(_channel):
+            peak[0] = max(peak[0], (plant.count - target) * way)
+        plant.callbacks.append(watch)
+        plant.last_moved = start
+        cpu_start = time.process_time()
+        controller.goto(target)
+        run_controller(gpio, controller, 60.0)
+        cpu.append(time.process_time() - cpu_start)
+        plant.callbacks.remove(watch)
+        times.append(plant.last_moved - start)
+        overshoots.append(peak[0])
+        missed.append(abs(controller.encoder.position - plant.count - drift))
+        if controller.encoder.position != target:
+            off += 1
+    print ('Simulated %s, %d preset moves, max rate %.0f pulses/s, '
+           'bounces %d' % (controller.antenna, len(targets), args.max_rate,
+                           args.bounces))
+    print ('  time-to-preset  mean %.2f s  max %.2f s' %
+           (sum(times) / len(times), max(times)))
+    print ('  overshoot       total %d counts  worst %d' %
+           (sum(overshoots), max(overshoots)))
+    print ('  missed pulses   %d  (%d edges seen)' % (sum(missed),
+                                                      plant.edge_count))
+    print ('  off target      %d' % off)
+    print ('  cpu per move    %.2f mS  (control logic plus simulation)' %
+           (1000 * sum(cpu) / len(cpu)))
+    print ('  sim speed       %.0fx real time' %
+           (sum(times) / max(sum(cpu), 1e-9)))
+    failures = []
+    if sum(missed):
+        failures.append('%d pulses missed' % sum(missed))
+    if off:
+        failures.append('%d moves off target' % off)
+    if max(overshoots) > args.max_overshoot:
+        failures.append('overshot by %d counts, at most %d allowed' % (
+            max(overshoots), args.max_overshoot))
+    failures.extend(trip_checks(gpio, controller))
+    # Drive into each end stop at several speeds. The stall has to be
+    # caught within the stall period at that duty, and a tick.
+    print ('  stall detection latency:')
+    for duty in (25, 50, 100):
+        latencies = []
+        for press in (controller.lower_antenna, controller.raise_antenna):
+            controller.pwm_duty = duty
+            press()
+            run_controller(gpio, controller, 120.0,
+                           until=lambda: not controller.motor_running)
+            limit = controller.stall_period() + controller.tick_period
+            controller.release()
+            if plant.stop_hit is not None and plant.power_off is not None:
+                latency = plant.power_off - plant.stop_hit
+                latencies.append(latency)
+                if latency > limit:
+                    failures.append('stall at %d%% caught after %.3f s, '
+                                    'limit %.3f s' % (duty, latency, limit))
+            else:
+                failures.append('stall at %d%% not caught' % duty)
+        print ('    duty %3d%%  %s' % (duty, '  '.join('%.3f s' % latency
+                                                   for latency in latencies)))
+    return verdict(failures)
+
+def trip_checks(gpio, controller):
+    # The encoder callback stops the motor without the lock, as a command
+    # holding it is about to write the pins. The stop is timed from the
+    # pulse, the command's own timing is left for it to record.
+    failures = []
+    now = gpio.clock.now
+    controller.motor_running = 1
+    controller.requested = now
+    stops = controller.stop_latency.total
+    commands = controller.command_latency.total
+    controller.motion_stop(now - 0.01)
+    if controller.requested != now:
+        failures.append('trip took the timing of a command in progress')
+    if controller.command_latency.total != commands:
+        failures.append('trip recorded a command latency')
+    if controller.stop_latency.total != stops + 1:
+        failures.append('trip stop latency not recorded')
+    controller.requested = None
+    return failures
+
+def bench_startup(args):
+    # Cold start of the one-shot command line against the GUI import path
+    here = os.path.dirname(os.path.abspath(__file__))
+    script = os.path.join(here, 'RPiAntDrv.py')
+    with tempfile.TemporaryDirectory() as tmp:
+        ini = os.path.join(tmp, 'RPiAntDrv.ini')
+        subprocess.run([sys.executable, script, '--ini', ini, '--list'],
+                       check=True, stdout=subprocess.DEVNULL)
+        runs = [('bare python', [sys.executable, '-c', 'pass']),
+                ('cli position', [sys.executable, script, '--ini', ini]),
+                ('cli --list', [sys.executable, script, '--ini', ini,
+                                '--list']),
+                ('gui imports', [sys.executable, '-c', 'import RPiAntGui'])]
+        if os.environ.get('DISPLAY'):
+            # Whole GUI start up, window built and drawn once
+            runs.append(('gui window', [sys.executable, '-c',
+                'import tkinter, RPiAntGui, RPiAntDrv; root = tkinter.Tk(); '
+                'RPiAntGui.Window(root, RPiAntDrv.AntennaGroup(%r, '
+                'simulate=True)); root.update(); root.destroy()' % ini]))
+        else:
+            print ('No DISPLAY, GUI window start up not measured')
+        print ('Cold start over %d runs' % args.runs)
+        print ('%-14s %10s %10s' % ('command', 'median mS', 'best mS'))
+        for name, command in runs:
+            times = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                subprocess.run(command, check=True, cwd=here,
+                               stdout=subprocess.DEVNULL)
+                times.append(1000 * (time.perf_counter() - start))
+            print ('%-14s %10.1f %10.1f' % (name, statistics.median(times),
+                                             min(times)))
+    check = subprocess.run([sys.executable, '-c', 'import sys, RPiAntDrv; '
+                            'print(" ".join(name for name in %r if name in '
+                            'sys.modules))' % (STARTUP_UNWANTED,)], cwd=here,
+                           capture_output=True, text=True)
+    unwanted = check.stdout.split()
+    print ('GUI, analysis and ctypes modules imported by RPiAntDrv: %s' % (
+        ' '.join(unwanted) or 'none'))
+    took = min(import_time('RPiAntDrv', here) for _ in range(args.runs))
+    print ('RPiAntDrv import %.1f mS, budget %.1f mS: %s' % (
+        took, args.budget, 'ok' if took <= args.budget else 'OVER'))
+    return 1 if unwanted or took > args.budget else 0
+
+# Modules RPiAntDrv must leave to whatever needs them, so a one-shot
+# command line run doesn't pay for them
+STARTUP_UNWANTED = ('tkinter', 'argparse', 'glob', 'mmap', 'ctypes',
+                    'subprocess')
+
+def import_time(module, here):
+    # mS taken to import a module and everything it imports, as reported
+    # by python -X importtime
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             'import ' + module], cwd=here,
+                            capture_output=True, text=True)
+    for line in output.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1000
+    raise RuntimeError('no import time for %s' % module)
+
+# Amateur bands as (name, low MHz, high MHz) for generated preset tables
+BANDS = [('160m', 1.800, 2.000), ('80m', 3.500, 4.000), ('60m', 5.330, 5.405),
+         ('40m', 7.000, 7.300), ('30m', 10.100, 10.150),
+         ('20m', 14.000, 14.350), ('17m', 18.068, 18.168),
+         ('15m', 21.000, 21.450), ('12m', 24.890, 24.990),
+         ('10m', 28.000, 29.700)]
+
+def make_presets(n):
+    # n presets spread evenly over the bands, in the ini file key style,
+    # encoder count falling as frequency rises like a screwdriver antenna.
+    # Frequencies get a fourth decimal when closer than a kHz apart.
+    span = sum(high - low for _name, low, high in BANDS)
+    presets = {}
+    for band, low, high in BANDS:
+        steps = max(1, int(round(n * (high - low) / span)))
+        places = 3 if (high - low) / steps >= 0.001 else 4
+        for i in range(steps):
+            freq = low + (high - low) * i / steps
+            count = int(round(400 * (1.8 / freq) ** 1.2))
+            key = '%s %*.*f (%03d)' % (band, places + 3, places, freq, count)
+            presets[key.replace('  ', ' _', 1)] = str(count)
+    return presets
+
+def write_ini(path, presets_per_antenna, antennas=('Antenna 1', 'Antenna 2')):
+    config = configparser.ConfigParser()
+    config.read_dict(DEFAULT_INI)
+    for name in antennas:
+        config[name + '_Preset'] = make_presets(presets_per_antenna)
+    config.set('Settings', 'antennas', ', '.join(antennas))
+    with open(path, 'w') as configfile:
+        config.write(configfile)
+
+def parse_per_click(path, antenna, preset):
+    # The original get_antenna_val / ant_refresh / get_preset_val path,
+    # a new ConfigParser reading the whole file for every selection
+    config = configparser.ConfigParser()
+    config.read (path)
+    config.getint (antenna + '_Config', 'pwm_freq', fallback=4000)
+    config.getint (antenna + '_Config', 'full_speed', fallback=100)
+    config.getint (antenna + '_Config', 'slow_speed', fallback=25)
+    config.getint (antenna + '_Config', 'stall_time', fallback=250)
+    config.options (antenna + '_Preset')
+    config = configparser.ConfigParser()
+    config.read (path)
+    return config.getint (antenna + '_Preset', preset)
+
+def bench_config(args):
+    # Antenna + preset selection latency, parse per click against the
+    # cached ConfigStore used by AntennaController
+    print ('Antenna and preset selection latency, %d selections' % args.runs)
+    print ('%8s %16s %16s %9s' % ('presets', 'parse/click uS', 'cached uS',
+                                  'speed up'))
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'RPiAntDrv.ini')
+        for n in args.sizes:
+            write_ini(path, n)
+            controller = AntennaController(path)
+            controller.load()
+            antennas = controller.antennas
+            picks = []
+            for i in range(args.runs):
+                antenna = antennas[i % len(antennas)]
+                names = list(controller.store.profile(antenna).presets)
+                picks.append((antenna, names[(i * 7919) % len(names)]))
+            start = time.perf_counter()
+            values = [parse_per_click(path, antenna, preset)
+                      for antenna, preset in picks]
+            old = (time.perf_counter() - start) / len(picks)
+            parsed = controller.store.config
+            start = time.perf_counter()
+            for antenna, preset in picks:
+                controller.select_antenna(antenna)
+                controller.select_preset(preset)
+            new = (time.perf_counter() - start) / len(picks)
+            print ('%8d %16.1f %16.1f %8.0fx' % (len(names), old * 1e6,
+                                                  new * 1e6, old / new))
+            # Every selection a cache hit, and an edit picked up
+            if controller.store.config is not parsed:
+                failures.append('%d presets: ini file parsed again '
+                                'unchanged' % n)
+            wrong = 0
+            for (antenna, preset), value in zip(picks, values):
+                controller.select_antenna(antenna)
+                controller.select_preset(preset)
+                wrong += controller.ant_preset_val != value
+            if wrong:
+                failures.append('%d presets: %d selections gave the wrong '
+                                'count' % (n, wrong))
+            antenna, preset = picks[-1]
+            controller.store.config.set(antenna + '_Preset', preset, '12345')
+            controller.store.save()
+            with open(path, 'a') as f:
+                f.write('\n')
+            controller.select_preset(preset)
+            if controller.ant_preset_val != 12345:
+                failures.append('%d presets: ini file edit not picked up' % n)
+            if old < 10 * new:
+                failures.append('%d presets: cached selection only %.0fx '
+                                'quicker' % (n, old / new))
+    return verdict(failures)
+
+# Keystrokes of someone looking for a preset in the GUI search box
+SEARCH_TYPING = ['2', '20', '20m', '20m 1', '20m 14', '20m 14.', '20m 14.2',
+                 '20m 14.23', '7', '7.', '7.0', '7.07', '7.074', 'm', 'ma',
+                 'max']
+
+def preset_timing(controller, antennas, edit_ini=None):
+    # Antenna switches, with the ini file unchanged and then edited before
+    # each, and the first frequency lookup after a switch, in mS
+    cached, edited, lookup = [], [], []
+    for i in range(12):
+        antenna = antennas[i % len(antennas)]
+        if edit_ini is not None and i >= 6:
+            edit_ini()
+        start = time.perf_counter()
+        controller.select_antenna(antenna)
+        took = 1000 * (time.perf_counter() - start)
+        (edited if edit_ini is not None and i >= 6 else cached).append(took)
+        start = time.perf_counter()
+        controller.freq_index.count(14.2)
+        lookup.append(1000 * (time.perf_counter() - start))
+    return cached, edited, lookup
+
+def bench_presets(args):
+    # Thousands of presets per antenna in the _Preset sections against the
+    # preset database: start up, antenna switch and search as you type
+    n = args.presets
+    antennas = ('Antenna 1', 'Antenna 2')
+    print ('%d presets for each of %d antennas\n' % (n, len(antennas)))
+    print ('%-9s %9s %10s %10s %10s %13s %10s' % ('', 'start mS',
+           'switch mS', 'edited mS', 'lookup mS', 'listed before',
+           'listed now'))
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        timing = {}
+        for store in ('ini', 'database'):
+            path = os.path.join(tmp, store, 'RPiAntDrv.ini')
+            os.mkdir(os.path.dirname(path))
+            write_ini(path, n, antennas)
+            if store == 'database':
+                # Import the _Preset sections and leave them out of the ini
+                config = configparser.ConfigParser()
+                config.read(path)
+                config.set('Settings', 'preset_db', 'RPiAntDrv.presets')
+                with open(path, 'w') as f:
+                    config.write(f)
+                controller = AntennaController(path)
+                controller.load()
+                for name in antennas:
+                    config.remove_section(name + '_Preset')
+                with open(path, 'w') as f:
+                    config.write(f)
+            start = time.perf_counter()
+            controller = AntennaController(path)
+            controller.load()
+            started = 1000 * (time.perf_counter() - start)
+            
+            def edit_ini():
+                # Touch the file as an editor saving it would
+                stat = os.stat(path)
+                os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+                
+            cached, edited, lookup = preset_timing(controller, antennas,
+                                                   edit_ini)
+            # What the GUI puts in the preset combo box on a switch, every
+            # preset as it used to, those of the selected band now
+            listed = controller.presets.search('20m', 100)
+            print ('%-9s %9.1f %10.2f %10.1f %10.2f %13d %10d' % (store,
+                   started, statistics.median(cached),
+                   statistics.median(edited), max(lookup),
+                   len(controller.presets), len(listed)))
+            results[store] = controller
+            timing[store] = (started, statistics.median(edited))
+            if len(listed) > 100:
+                failures.append('%s listed %d presets' % (store, len(listed)))
+        print ('\nSearch as you type, mS per keystroke, 100 listed at most')
+        print ('%-12s %7s %10s %10s' % ('typed', 'found', 'ini', 'database'))
+        worst = {'ini': 0.0, 'database': 0.0}
+        for text in SEARCH_TYPING:
+            found = {}
+            took = {}
+            for store, controller in results.items():
+                times = []
+                for _ in range(5):
+                    start = time.perf_counter()
+                    found[store] = controller.presets.search(text, 100)
+                    times.append(1000 * (time.perf_counter() - start))
+                took[store] = statistics.median(times)
+                worst[store] = max(worst[store], took[store])
+            if found['ini'] != found['database']:
+                failures.append('searches for %r differ' % text)
+            print ('%-12s %7d %10.2f %10.2f' % (repr(text), len(found['ini']),
+                                                took['ini'],
+                                                took['database']))
+        print ('%-12s %7s %10.2f %10.2f' % ('worst', '', worst['ini'],
+                                            worst['database']))
+        for controller in results.values():
+            controller.close()
+    # The database has to start up and follow an edited ini file at least
+    # ten times faster than parsing the presets from the ini file, unless
+    # it takes under 5 mS anyway, and keep up with typing
+    if len(results['ini'].presets) != len(results['database'].presets):
+        failures.append('the database has %d presets, the ini file %d' % (
+            len(results['database'].presets), len(results['ini'].presets)))
+    for i, what in enumerate(('start up', 'switch after an edit')):
+        if timing['database'][i] > max(timing['ini'][i] / 10, 5.0):
+            failures.append('database %s %.1f mS, ini file %.1f mS' % (
+                what, timing['database'][i], timing['ini'][i]))
+    if worst['database'] > args.search_budget:
+        failures.append('database search took %.1f mS a keystroke' %
+                        worst['database'])
+    return verdict(failures)
+
+def raises(exception, call, *args):
+    # True if call(*args) raises exception
+    try:
+        call(*args)
+    except exception:
+        return True
+    return False
+
+def frequency_index_checks():
+    # What FrequencyIndex has to get right, returns the failures
+    failures = []
+    presets = {k: int(v) for k, v in DEFAULT_INI['Antenna 1_Preset'].items()}
+    index = FrequencyIndex(presets)
+    for name, count in presets.items():
+        mhz = preset_mhz(name)
+        if mhz is None:
+            continue
+        for spline in (False, True):
+            if index.count(mhz, spline) != count:
+                failures.append('%s gave %d not %d%s' % (
+                    name, index.count(mhz, spline), count,
+                    ' with spline' if spline else ''))
+    # Halfway between 14.000 (39) and 14.200 (38), and 7.175 (89) and
+    # 7.300 (87)
+    if index.count(14.1) not in (38, 39) or index.count(7.2375) != 88:
+        failures.append('linear interpolation between presets')
+    # The spline never goes outside the counts of the presets either side
+    for i in range(len(index.freqs) - 1):
+        low, high = sorted(index.counts[i:i + 2])
+        f0, f1 = index.freqs[i:i + 2]
+        for step in range(1, 10):
+            count = index.count(f0 + (f1 - f0) * step / 10, True)
+            if not round(low) <= count <= round(high):
+                failures.append('spline overshoot between %.3f and %.3f MHz'
+                                % (f0, f1))
+                break
+    for mhz in (3.0, 30.0):
+        if not raises(ValueError, index.count, mhz) or \
+           not raises(ValueError, index.counts_for, [14.2, mhz]):
+            failures.append('%.1f MHz outside the presets accepted' % mhz)
+    empty = FrequencyIndex({})
+    if not raises(ValueError, empty.count, 14.2) or \
+       not raises(ValueError, empty.counts_for, [14.2]) or \
+       empty.counts_for([]) != []:
+        failures.append('empty index lookups')
+    single = FrequencyIndex({}, points=[(14.2, 38)])
+    if single.count(14.2) != 38 or single.counts_for([14.2]) != [38] or \
+       not raises(ValueError, single.count, 14.3):
+        failures.append('single preset lookups')
+    repeated = FrequencyIndex({}, points=[(7.0, 90), (7.0, 92), (14.0, 40)])
+    if repeated.count(7.0) != 91:
+        failures.append('presets at the same frequency not averaged')
+    rnd = random.Random(4)
+    queries = [rnd.uniform(index.freqs[0], index.freqs[-1])
+               for _ in range(500)]
+    for spline in (False, True):
+        if index.counts_for(queries, spline) != [index.count(mhz, spline)
+                                                 for mhz in queries]:
+            failures.append('counts_for differs from count%s' % (
+                ' with spline' if spline else ''))
+    return failures
+
+def preset_mhz(name):
+    # Frequency in a preset name, None if it hasn't one
+    match = FREQ_PATTERN.search(name)
+    return float(match.group(1)) if match else None
+
+def bench_freq(args):
+    # Frequency to encoder count lookups, one at a time and in batches
+    print ('Frequency lookups, %d queries' % args.runs)
+    print ('%8s %10s %12s %12s %12s' % ('presets', 'build mS', 'linear uS',
+                                        'spline uS', 'batch uS'))
+    for n in args.sizes:
+        presets = {k: int(v) for k, v in make_presets(n).items()}
+        start = time.perf_counter()
+        index = FrequencyIndex(presets)
+        build = time.perf_counter() - start
+        queries = [random.uniform(index.freqs[0], index.freqs[-1])
+                   for _ in range(args.runs)]
+        results = []
+        for spline in (False, True):
+            start = time.perf_counter()
+            for mhz in queries:
+                index.count(mhz, spline)
+            results.append((time.perf_counter() - start) / len(queries))
+        start = time.perf_counter()
+        index.counts_for(queries)
+        results.append((time.perf_counter() - start) / len(queries))
+        print ('%8d %10.2f %12.2f %12.2f %12.2f' % (len(index), build * 1e3,
+               results[0] * 1e6, results[1] * 1e6, results[2] * 1e6))
+    return verdict(frequency_index_checks())
+
+def bench_net(args):
+    # Network server load test: dozens of clients polling the position and
+    # watching updates while one of them moves the simulated antenna back
+    # and forth. The server runs on its own thread, as it does beside the
+    # GUI, and one subscriber never reads at all.
+    import asyncio
+    import RPiAntNet
+    # QSY around 40m and 30m, a few seconds per move
+    gpio, plant, controller = sim_antenna(args, position=70)
+    controller.sync(plant.count)
+    targets = [count for count in preset_targets() if 50 <= count <= 95]
+    gpio.run_realtime()
+    control = ControlThread(controller)
+    control.start()
+    server_thread = RPiAntNet.start_server(controller, control,
+                                           '127.0.0.1', 0)
+    server = server_thread.server
+    rtts = []
+    received = []
+    moves = [0]
+
+    async def connect():
+        reader, writer = await asyncio.open_connection('127.0.0.1',
+                                                      server.port)
+        replies = asyncio.Queue()
+        updates = [0]
+        async def read():
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.startswith(b'pos '):
+                    updates[0] += 1
+                else:
+                    replies.put_nowait(line)
+        reader_task = asyncio.create_task(read())
+        async def command(text):
+            start = time.perf_counter()
+            writer.write(text.encode() + b'\n')
+            reply = await replies.get()
+            rtts.append(time.perf_counter() - start)
+            return reply
+        return writer, command, updates, reader_task
+
+    async def poller(end):
+        writer, command, updates, reader_task = await connect()
+        await command('W')
+        while time.perf_counter() < end:
+            await command('p')
+            await asyncio.sleep(args.poll)
+        received.append(updates[0])
+        writer.close()
+        reader_task.cancel()
+
+    async def mover(end):
+        writer, command, _updates, reader_task = await connect()
+        i = 0
+        while time.perf_counter() < end:
+            await command('P %d' % targets[i % len(targets)])
+            i += 1
+            while time.perf_counter() < end:
+                await asyncio.sleep(0.1)
+                if (await command('s')).startswith(b'idle'):
+                    moves[0] += 1
+                    break
+        await command('S')
+        writer.close()
+        reader_task.cancel()
+
+    async def load():
+        # Subscribe and then never read
+        _reader, slow = await asyncio.open_connection('127.0.0.1',
+                                                      server.port)
+        slow.write(b'W\n')
+        end = time.perf_counter() + args.duration
+        await asyncio.gather(mover(end),
+                             *[poller(end) for _ in range(args.clients)])
+        slow.close()
+
+    ticks = control.ticks
+    control.worst_late = 0.0
+    cpu = time.process_time()
+    asyncio.run(load())
+    cpu = time.process_time() - cpu
+    ticks = control.ticks - ticks
+    server_thread.stop()
+    control.stop()
+    rtts.sort()
+    cuts = statistics.quantiles(rtts, n=100)
+    print ('Network server, %d polling clients every %.0f mS for %.1f s, '
+           'one stalled reader' % (args.clients, args.poll * 1000,
+                                   args.duration))
+    print ('  commands        %d  (%.0f/s)' % (len(rtts),
+                                               len(rtts) / args.duration))
+    print ('  round trip      p50 %.2f mS  p99 %.2f mS  max %.2f mS' %
+           (cuts[49] * 1000, cuts[98] * 1000, rtts[-1] * 1000))
+    print ('  moves           %d completed, position %d' %
+           (moves[0], controller.encoder.position))
+    print ('  position lines  %d changes published, %.0f/s per client, '
+           '%.0f/s fan-out' % (server.published,
+                               statistics.mean(received) / args.duration,
+                               sum(received) / args.duration))
+    print ('  control thread  %d ticks (%.0f/s), worst %.2f mS late' %
+           (ticks, ticks / args.duration, control.worst_late * 1000))
+    print ('  cpu             %.0f%% of one core (clients, server and '
+           'simulation)' % (100 * cpu / args.duration))
+    return 0
+
+def count_run(args, rate, fixed):
+    # Run a bouncing antenna flat out at rate pulses/s and back to rest,
+    # returns (true pulses, pulses counted, edges rejected)
+    gpio, plant, controller = sim_antenna(args, max_rate=rate,
+                                          maximum=1e9, bounces=args.bounces
+                                          or 3)
+    if fixed:
+        # The old RPi.GPIO bouncetime=40
+        controller.encoder.debounce(0.040, 0.040, 1.0)
+    start_count, start = plant.count, controller.encoder.position
+    controller.pwm_duty = 100
+    controller.raise_antenna()
+    run_controller(gpio, controller, args.duration, until=lambda: False)
+    controller.release()
+    run_controller(gpio, controller, 10.0)
+    return (plant.count - start_count, controller.encoder.position - start,
+            controller.encoder.rejected)
+
+def bench_debounce(args):
+    # Bouncing reed switch counted with the fixed 40 mS lockout and with
+    # the adaptive window, at rising pulse rates
+    print ('Bouncing reed switch, up to %d extra edges per pulse, %.1f s '
+           'runs' % (args.bounces or 3, args.duration))
+    print ('%8s %8s %12s %12s %10s' % ('rate', 'pulses', 'fixed 40 mS',
+                                       'adaptive', 'rejected'))
+    clean = {True: 0, False: 0}     # Highest rate counted exactly
+    missed = {True: False, False: False}
+    for rate in sorted(args.pulse_rates):
+        row = [rate]
+        for fixed in (True, False):
+            true, counted, rejected = count_run(args, rate, fixed)
+            if counted != true:
+                missed[fixed] = True
+            elif not missed[fixed]:
+                clean[fixed] = rate
+            row.append(counted)
+        print ('%8d %8d %12d %12d %10d' % (rate, true, row[1], row[2],
+                                           rejected))
+    print ('Highest clean rate: fixed 40 mS %d pulses/s, adaptive %d '
+           'pulses/s' % (clean[True], clean[False]))
+    failures = edge_checks()
+    if clean[False] < args.min_clean:
+        failures.append('adaptive window miscounted below %d pulses/s' %
+                        args.min_clean)
+    if clean[False] <= clean[True]:
+        failures.append('adaptive window no better than the fixed lockout')
+    return verdict(failures)
+
+def edge_checks():
+    # What EncoderCounter.edge() has to get right, on a clock of its own,
+    # returns the failures
+    failures = []
+    now = [0.0]
+    def edges(counter, *times):
+        # Edges at these times, returns which were counted
+        counted = []
+        for t in times:
+            now[0] = t
+            before = counter.pulses
+            counter.edge()
+            counted.append(counter.pulses > before)
+        return counted
+    counter = EncoderCounter(clock=lambda: now[0])
+    counter.debounce(0.005, 0.040, 0.4)
+    counter.motor_start(0.0)
+    # Closer than window_min after a start is a bounce, then the window
+    # follows 0.4 of the interval: 40 mS after 100 mS, 20 mS after 50 mS
+    if edges(counter, 0.002, 0.100, 0.139, 0.150, 0.169, 0.175) != \
+       [False, True, False, True, False, True]:
+        failures.append('adaptive window accepted a bounce or dropped a '
+                        'pulse')
+    if counter.rejected != 3 or counter.count != 3:
+        failures.append('edge counted %d and rejected %d, not 3 and 3' % (
+            counter.count, counter.rejected))
+    # The window never gets longer than window_cap, or shorter than
+    # window_min however fast the pulses come
+    counter.window_cap = 0.010
+    if edges(counter, 0.675, 0.686) != [True, True]:
+        failures.append('window not held to window_cap')
+    if edges(counter, 0.690, 0.6905, 0.692) != [False, False, True]:
+        failures.append('window shorter than window_min')
+    # Counting down, and the trip position stops a move
+    counter.direction = -1
+    tripped = []
+    counter.on_trip = lambda: tripped.append(counter.position)
+    counter.trip = counter.position - 2
+    edges(counter, 0.800, 0.900, 1.000)
+    if counter.position != 3 or tripped != [4]:
+        failures.append('counting down ended at %d, tripped at %s' % (
+            counter.position, tripped))
+    # The old fixed 40 mS lockout throws away every other 25 mS pulse
+    fixed = EncoderCounter(clock=lambda: now[0])
+    fixed.debounce(0.040, 0.040, 1.0)
+    if sum(edges(fixed, *[2.0 + 0.025 * i for i in range(10)])) != 5:
+        failures.append('fixed 40 mS lockout')
+    return failures
+
+def rough_load(roughness, seed=2):
+    # default_load with every revolution up to roughness harder or easier
+    # to turn, like a worn screw thread
+    import random
+    rnd = random.Random(seed)
+    bumps = [1.0 + rnd.uniform(-roughness, roughness) for _ in range(512)]
+    return lambda position: default_load(position) * bumps[int(position) & 511]
+
+def binding_load(start):
+    # Antenna that gets steadily harder to turn past start until it stops
+    return lambda position: 1.0 + 0.05 * max(0.0, position - start) ** 2
+
+def stall_run(args, detect, duty, start, load, until=None):
+    # Raise at duty from start until stalled or until(), returns the plant
+    # and controller afterwards
+    gpio, plant, controller = sim_antenna(args, position=start, load=load)
+    controller.sync(start)
+    controller.stall_detect = detect
+    controller.pwm_duty = duty
+    controller.raise_antenna()
+    run_controller(gpio, controller, 60.0, until=lambda: not
+                   controller.motor_running or (until and until(plant)))
+    if controller.motor_running:
+        controller.release()
+    return plant, controller
+
+def bench_stall(args):
+    # Stall detection, pulse interval statistics against the original
+    # count-per-stall-period check, at several duties
+    detectors = ('period', 'interval')
+    print ('Stall detection, max rate %.0f pulses/s, rough load +-%.0f%%' %
+           (args.max_rate, args.roughness * 100))
+    print ('%6s %-9s %10s %10s %8s %8s' % ('duty', 'detector', 'latency s',
+                                          'worst s', 'false', 'binding'))
+    failures = stall_detector_checks()
+    for duty in (25, 50, 75, 100):
+        worst = {}
+        for detect in detectors:
+            # Into the upper end stop from a few different distances
+            latencies = []
+            for i in range(args.passes * 3):
+                plant, controller = stall_run(args, detect, duty,
+                                              265 - 2 * i, default_load)
+                latencies.append(plant.power_off - plant.stop_hit)
+            # Full length runs over a rough thread, which must not stall
+            false = warned = 0
+            for i in range(args.passes * 3):
+                plant, controller = stall_run(
+                    args, detect, duty, 0, rough_load(args.roughness, seed=i),
+                    until=lambda plant: plant.count >= 260)
+                if controller.motor_stalled and not plant.stalled:
+                    false += 1
+                warned += controller.binding
+            print ('%5d%% %-9s %10.3f %10.3f %5d/%-2d %5d/%-2d' % (duty, detect,
+                   statistics.mean(latencies), max(latencies), false,
+                   args.passes * 3, warned, args.passes * 3))
+            worst[detect] = max(latencies)
+            if detect == 'interval' and (false or warned):
+                failures.append('%d false stalls and %d binding warnings on '
+                                'a rough thread at %d%%' % (false, warned,
+                                                           duty))
+        if worst['interval'] > worst['period']:
+            failures.append('interval detector slower than the period check '
+                            'at %d%%' % duty)
+    # Binding: how long before the stall was it seen coming
+    print ('Binding antenna, warning before the stall:')
+    for duty in (50, 100):
+        gpio, plant, controller = sim_antenna(args, position=100,
+                                              load=binding_load(120))
+        controller.sync(100)
+        controller.pwm_duty = duty
+        controller.raise_antenna()
+        warned = None
+        start = gpio.clock.now
+        while controller.motor_running and gpio.clock.now - start < 60:
+            controller.tick()
+            if warned is None and controller.binding:
+                warned = gpio.clock.now
+            gpio.advance(controller.tick_period)
+        if warned is None:
+            print ('  duty %3d%%  no warning' % duty)
+            failures.append('no binding warning at %d%%' % duty)
+        else:
+            print ('  duty %3d%%  warned %.2f s before the stall at count %d'
+                   % (duty, plant.power_off - warned, controller.encoder.position))
+    return verdict(failures)
+
+def stall_detector_checks():
+    # What StallDetector has to get right, fed pulse times directly,
+    # returns the failures
+    failures = []
+    now = [0.0]
+    encoder = EncoderCounter(clock=lambda: now[0])
+    detector = StallDetector(encoder)
+    def pulses(*intervals):
+        for dt in intervals:
+            now[0] += dt
+            encoder.pulse()
+    detector.start(now[0])
+    # Spinning up isn't an interval, the bound is the longest allowed
+    pulses(0.3, 0.2)
+    if detector.bound(100, 2.0) != 2.0:
+        failures.append('start up pulses taken as intervals')
+    # 50 mS a pulse at full duty, twice as long allowed at half duty
+    pulses(*[0.05] * 10)
+    last = now[0]
+    if detector.stalled(last + 0.08, 100, 2.0) or \
+       not detector.stalled(last + 0.15, 100, 2.0):
+        failures.append('stall bound at 100%% %.3f s, not about 0.1 s' %
+                        detector.bound(100, 2.0))
+    if detector.stalled(last + 0.15, 50, 2.0) or \
+       not detector.stalled(last + 0.25, 50, 2.0):
+        failures.append('stall bound not scaled with duty')
+    if detector.bound(1, 0.5) != 0.5:
+        failures.append('stall bound over the longest allowed')
+    # Intervals growing at a steady duty are binding, back to normal
+    # they aren't
+    pulses(*[0.05] * 4)
+    detector.update(100)
+    if detector.binding:
+        failures.append('binding at a steady speed')
+    pulses(0.06, 0.07, 0.08, 0.09, 0.10)
+    detector.update(100)
+    if not detector.binding:
+        failures.append('intervals doubled without binding')
+    pulses(*[0.05] * 6)
+    detector.update(100)
+    if detector.binding:
+        failures.append('binding not cleared')
+    return failures
+
+def replay_sweep(args, sweep, mode):
+    # Replay a VFO sweep into a simulated antenna on the virtual clock,
+    # through FrequencyFollower ('follow'), a goto() for every update
+    # ('retarget') or a halt() and goto() for every update ('restart'),
+    # which is what following did before goto() retargeted a move
+    follow = mode == 'follow'
+    gpio, plant, controller = sim_antenna(args)
+    clock = gpio.clock
+    start_count = controller.freq_index.count(sweep[0][1])
+    controller.sync(start_count)
+    plant.position = start_count + 0.5
+    if follow:
+        controller.follow()
+    start = clock.now
+    plant.last_moved = start
+    gotos = 0
+    i = 0
+    cpu = time.process_time()
+    while i < len(sweep):
+        # Deliver every update due by now, then a control tick
+        while i < len(sweep) and sweep[i][0] <= clock.now - start:
+            mhz = sweep[i][1]
+            if follow:
+                controller.follower.update(mhz)
+            else:
+                if mode == 'restart':
+                    controller.halt()
+                controller.goto(controller.freq_index.count(mhz))
+                gotos += 1
+            i += 1
+        controller.tick()
+        gpio.advance(controller.tick_period)
+    last_update = start + sweep[-1][0]
+    # Let the final move finish
+    run_controller(gpio, controller, 60.0,
+                   until=lambda: not (controller.motion.busy or plant.moving))
+    cpu = time.process_time() - cpu
+    wanted = controller.freq_index.count(sweep[-1][1])
+    moves = controller.follower.moves if follow else gotos
+    return {'moves': moves,
+            'starts': plant.starts,
+            'drift': controller.encoder.position - plant.count,
+            'on_time': plant.on_time,
+            'settle': max(0.0, plant.last_moved - last_update),
+            'error': plant.count - wanted,
+            'deadband': controller.follow_deadband,
+            'cpu': cpu}
+
+def bench_follow(args):
+    # Frequency follow against a recorded VFO sweep: a move restarted for
+    # every update from the radio, a move retargeted for every update and
+    # the coalescing, deadbanded FrequencyFollower. The follower has to
+    # start the motor less often and run it for less time than restarting
+    # does, and it and retargeting have to end up on frequency.
+    sweep = read_sweep(args.sweep) if args.sweep else vfo_sweep()
+    print ('VFO sweep of %d updates over %.1f s, %.3f to %.3f MHz' %
+           (len(sweep), sweep[-1][0], min(f for _t, f in sweep),
+            max(f for _t, f in sweep)))
+    print ('%-11s %6s %7s %9s %9s %6s %6s %8s' % ('', 'moves', 'starts',
+           'motor s', 'settle s', 'error', 'drift', 'cpu mS'))
+    results = {}
+    for name, mode in (('restart', 'restart'), ('retarget', 'retarget'),
+                       ('follower', 'follow')):
+        r = results[mode] = replay_sweep(args, sweep, mode)
+        print ('%-11s %6d %7d %9.2f %9.2f %6d %6d %8.1f' % (name, r['moves'],
+               r['starts'], r['on_time'], r['settle'], r['error'],
+               r['drift'], r['cpu'] * 1000))
+    restart, follower = results['restart'], results['follow']
+    print ('Follower against restarting: %d fewer motor starts, %.2f s less '
+           'motor time' % (restart['starts'] - follower['starts'],
+                           restart['on_time'] - follower['on_time']))
+    failures = []
+    if follower['starts'] >= restart['starts']:
+        failures.append('follower started the motor %d times, restarting '
+                        '%d' % (follower['starts'], restart['starts']))
+    if follower['on_time'] > restart['on_time']:
+        failures.append('follower ran the motor for longer than restarting')
+    # Restarting is allowed to lose count, that's why it was replaced
+    for name in ('retarget', 'follow'):
+        r = results[name]
+        if abs(r['error']) > r['deadband'] or r['drift']:
+            failures.append('%s ended %d counts off frequency, drift %d' % (
+                name, r['error'], r['drift']))
+    return verdict(failures)
+
+def pulse_cost(counter, n):
+    # Mean seconds per encoder callback
+    start = time.perf_counter()
+    for _i in range(n):
+        counter.pulse(None)
+    return (time.perf_counter() - start) / n
+
+def bench_telemetry(args):
+    # What the recorder costs the encoder callback and the controller, then
+    # a simulated session captured to files and analysed
+    with tempfile.TemporaryDirectory() as tmp:
+        counter = EncoderCounter()
+        n = 200000
+        alone = pulse_cost(counter, n)
+        telemetry = RPiAntLog.Telemetry(counter)
+        writer = RPiAntLog.TelemetryWriter(
+            telemetry, RPiAntLog.TelemetryFiles(os.path.join(tmp, 'stress')),
+            period=0.01)
+        writer.start()
+        recording = pulse_cost(counter, n)
+        start = time.perf_counter()
+        for _i in range(n):
+            telemetry.event(RPiAntLog.DUTY, 0, 50, 1)
+        event = (time.perf_counter() - start) / n
+        writer.stop()
+        # At a steady rate every pulse has to reach the file
+        counter = EncoderCounter()
+        telemetry = RPiAntLog.Telemetry(counter)
+        writer = RPiAntLog.TelemetryWriter(
+            telemetry, RPiAntLog.TelemetryFiles(os.path.join(tmp, 'rate')))
+        writer.start()
+        fired = fire_pulses(counter, 2000, args.duration)
+        writer.stop()
+        capture = RPiAntLog.Capture(os.path.join(tmp, 'rate'))
+        kept = sum(1 for k in capture.kinds if k == RPiAntLog.PULSE)
+        print ('Encoder callback  %.2f uS alone, %.2f uS while recording' %
+               (alone * 1e6, recording * 1e6))
+        print ('Controller event  %.2f uS' % (event * 1e6))
+        print ('Recorded %d of %d pulses at 2000/s, %d lost' % (
+            kept, fired, telemetry.lost))
+
+        # Simulated session: preset moves, a stall and a binding warning
+        gpio, plant, controller = sim_antenna(args)
+        files = RPiAntLog.TelemetryFiles(os.path.join(tmp, 'sim'))
+        writer = RPiAntLog.TelemetryWriter(controller.telemetry, files)
+        flush = 0.0
+        for target in preset_targets() * args.passes:
+            controller.goto(target)
+            run_controller(gpio, controller, 60.0)
+            start = time.perf_counter()
+            writer.flush()
+            flush += time.perf_counter() - start
+        controller.pwm_duty = 50
+        controller.lower_antenna()
+        run_controller(gpio, controller, 120.0,
+                       until=lambda: not controller.motor_running)
+        controller.release()
+        writer.flush()
+        files.close()
+        start = time.perf_counter()
+        capture = RPiAntLog.Capture(os.path.join(tmp, 'sim'))
+        load = time.perf_counter() - start
+        print ('Simulated session, %d records, flushed in %.1f mS, loaded '
+               'in %.1f mS' % (len(capture), flush * 1000, load * 1000))
+        # Column load against a tuple per record, on the session repeated
+        # up to about a full capture file
+        data = b''.join(RPiAntLog.RECORD.pack(*record)
+                        for record in capture.records())
+        data *= max(1, 100000 // len(capture))
+        n = len(data) // RPiAntLog.RECORD.size
+        start = time.perf_counter()
+        columns = RPiAntLog.record_columns(data)
+        strided = time.perf_counter() - start
+        start = time.perf_counter()
+        unpacked = list(zip(*RPiAntLog.RECORD.iter_unpack(data)))
+        per_record = time.perf_counter() - start
+        print ('Loading %d records  %.0f nS a record in columns, %.0f nS '
+               'unpacked a record at a time\n' % (n, strided * 1e9 / n,
+                                                  per_record * 1e9 / n))
+        RPiAntLog.report(capture, limit=8)
+    failures = []
+    if kept != fired or telemetry.lost:
+        failures.append('%d of %d pulses recorded, %d lost' % (
+            kept, fired, telemetry.lost))
+    if [list(column) for column in columns] != [list(column)
+                                                for column in unpacked]:
+        failures.append('columns differ from the records unpacked')
+    return verdict(failures)
+
+def journal_hour(args, journal, seed=5):
+    # An hour of typical use on the virtual clock: a preset move every
+    # minute or so, now and then nudged with Raise or Lower. Returns the
+    # number of times the motor stopped.
+    import random
+    rnd = random.Random(seed)
+    gpio, plant, controller = sim_antenna(args)
+    clock = gpio.clock
+    writer = RPiAntLog.JournalWriter(journal, controller.journal_state,
+                                     clock=clock)
+    targets = preset_targets()
+    stops = 0
+    end = clock.now + 3600.0
+    polled = clock.now
+    while clock.now < end:
+        if rnd.random() < 0.3:
+            controller.pwm_duty = 50
+            (controller.raise_antenna if rnd.random() < 0.5
+             else controller.lower_antenna)()
+            nudge = clock.now + rnd.uniform(0.3, 2.0)
+            until = lambda: clock.now >= nudge
+        else:
+            controller.goto(rnd.choice(targets))
+            until = None
+        idle = clock.now + rnd.uniform(20.0, 100.0)
+        while True:
+            if clock.now - polled >= writer.period:
+                polled = clock.now
+                writer.poll(clock.now)
+            if until is not None and until():
+                controller.release()
+                until = None
+            if not controller.tick() and not plant.moving and \
+               clock.now >= idle:
+                break
+            if controller.motor_running or plant.moving:
+                gpio.advance(controller.tick_period)
+            else:
+                clock.advance(writer.period) # Nothing to simulate
+        for record in controller.telemetry.collect():
+            if record[1] == RPiAntLog.STOP:
+                stops += 1
+    writer.flush()
+    return stops, controller
+
+def bench_journal(args):
+    # Position journal write rate, what an hour of use costs the SD card
+    # against saving the ini file at every stop, and how long recovery
+    # takes from the end of a large journal
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = RPiAntLog.PositionJournal(os.path.join(tmp, 'rate'),
+                                            max_size=1 << 30)
+        journal.open()
+        n = 100000
+        start = time.perf_counter()
+        for i in range(n):
+            journal.append(i, 'Antenna 1')
+        appended = n / (time.perf_counter() - start)
+        n = 500
+        start = time.perf_counter()
+        for i in range(n):
+            journal.append(i, 'Antenna 1')
+            journal.sync()
+        synced = n / (time.perf_counter() - start)
+        journal.close()
+        print ('Write rate  %.0f records/s appended, %.0f records/s synced '
+               'one at a time\n' % (appended, synced))
+        
+        journal = RPiAntLog.PositionJournal(os.path.join(tmp, 'hour'))
+        journal.open()
+        stops, controller = journal_hour(args, journal)
+        journal.close()
+        ini = os.path.join(tmp, 'RPiAntDrv.ini')
+        controller.store.path = ini
+        controller.store.save()
+        ini_size = os.path.getsize(ini)
+        print ('An hour of typical use, %d motor stops:' % stops)
+        print ('  %-24s %8s %8s %10s %14s' % ('', 'appends', 'fsyncs',
+               'bytes', 'KiB flushed >='))
+        print ('  %-24s %8d %8d %10d %14d' % ('journal', journal.records,
+               journal.syncs, journal.written, 4 * journal.syncs))
+        print ('  %-24s %8d %8d %10d %14d' % ('ini file at every stop',
+               stops, 2 * stops, stops * ini_size, 8 * stops))
+        if journal.records:
+            print ('  %d KiB journal compacts every %.0f hours\n' % (
+                   journal.max_size >> 10, journal.max_size /
+                   (RPiAntLog.JOURNAL_RECORD_SIZE * journal.records)))
+        
+        print ('Recovery from the end of the journal:')
+        path = os.path.join(tmp, 'large')
+        records = 1000000
+        entry = RPiAntLog.JOURNAL_ENTRY
+        crc = RPiAntLog.JOURNAL_CRC
+        key = RPiAntLog.antenna_key('Antenna 1')
+        data = [RPiAntLog.JOURNAL_HEADER.pack(
+            RPiAntLog.JOURNAL_MAGIC, RPiAntLog.VERSION,
+            RPiAntLog.JOURNAL_RECORD_SIZE)]
+        for i in range(records):
+            e = entry.pack(i + 1, i % 300, key)
+            data.append(e + crc.pack(RPiAntLog.zlib.crc32(e)))
+        data = b''.join(data)
+        size = RPiAntLog.JOURNAL_RECORD_SIZE
+        cases = (('intact', data),
+                 ('torn last record', data[:-size // 2]),
+                 ('last 3 records corrupt', data[:-3 * size] +
+                  bytes(3 * size)))
+        failures = []
+        for (name, contents), last in zip(cases, (records, records - 1,
+                                                  records - 3)):
+            with open(path, 'wb') as f:
+                f.write(contents)
+            runs = 200
+            start = time.perf_counter()
+            for _i in range(runs):
+                found = RPiAntLog.PositionJournal(path).recover()
+            took = (time.perf_counter() - start) / runs
+            print ('  %-24s %7.1f uS  count %d' % (name, took * 1e6,
+                                                  found[0]))
+            # Record n has count (n - 1) % 300
+            if found != ((last - 1) % 300, key):
+                failures.append('%s recovered %s, not record %d' % (
+                    name, found, last))
+        # What reading the whole journal from the front would cost
+        start = time.perf_counter()
+        with open(path, 'rb') as f:
+            whole = f.read()
+        newest = None
+        for i in range(RPiAntLog.JOURNAL_HEADER.size, len(whole) - size + 1,
+                       size):
+            e = whole[i:i + entry.size]
+            if RPiAntLog.zlib.crc32(e) == crc.unpack_from(whole,
+                                                          i + entry.size)[0]:
+                newest = entry.unpack(e)
+        took = time.perf_counter() - start
+        print ('  %-24s %7.1f mS  count %d  (%d records, %.1f MB)' % (
+               'full scan from the front', took * 1000, newest[1], records,
+               len(data) / 1e6))
+        failures += journal_recovery_checks(os.path.join(tmp, 'sessions'))
+    return verdict(failures)
+
+def journal_session(ini, position=None):
+    # Start an antenna from the ini file and journal, as the program does,
+    # and move it to position by setting the count. Returns the controller
+    # and where it started.
+    gpio = SimGPIO()
+    controller = AntennaController(ini, gpio=gpio, clock=gpio.clock)
+    controller.load()
+    started = controller.encoder.position
+    controller.start(monitor=False)
+    if position is not None:
+        controller.encoder.sync(position)
+        controller.journal_writer.checkpoint()
+    return controller, started
+
+def journal_crash(controller):
+    # Stop as a power cut would, without saving the ini file
+    controller.journal_writer.stop()
+    if controller.telemetry_writer is not None:
+        controller.telemetry_writer.stop()
+
+def hand_edit(ini, position):
+    config = configparser.ConfigParser()
+    config.read(ini)
+    config.set('Settings', 'last_position', str(position))
+    with open(ini, 'w') as f:
+        config.write(f)
+
+def journal_recovery_checks(directory):
+    # Which of the ini file and the journal wins at start up, through a few
+    # sessions of a controller, returns the failures
+    failures = []
+    os.mkdir(directory)
+    ini = os.path.join(directory, 'RPiAntDrv.ini')
+    config = configparser.ConfigParser()
+    config.read_dict(DEFAULT_INI)
+    with open(ini, 'w') as f:
+        config.write(f)
+    def check(what, started, wanted):
+        if started != wanted:
+            failures.append('%s: started at %d, not %d' % (what, started,
+                                                           wanted))
+    # Saved at 100, moved to 150, the ini file saved again for something
+    # else, as a calibration does, then the power cut
+    controller, _started = journal_session(ini, 100)
+    controller.ini_update()
+    controller.encoder.sync(150)
+    controller.journal_writer.checkpoint()
+    controller.store.set('Antenna 1_Config', 'coast_counts', '1.50')
+    controller.store.save()
+    journal_crash(controller)
+    controller, started = journal_session(ini)
+    check('moved after a save, then a calibration', started, 150)
+    # Closed cleanly, then the position edited by hand
+    controller.close()
+    hand_edit(ini, 42)
+    controller, started = journal_session(ini, 60)
+    check('position edited after a clean close', started, 42)
+    # Moved after the hand edit and lost power
+    journal_crash(controller)
+    controller, started = journal_session(ini, 65)
+    check('moved after a hand edit, then a power cut', started, 60)
+    # Moved and lost power, then edited by hand before starting again
+    journal_crash(controller)
+    hand_edit(ini, 7)
+    controller, started = journal_session(ini)
+    check('position edited after a power cut', started, 7)
+    # Moved and lost power, nothing edited
+    controller.encoder.sync(80)
+    controller.journal_writer.checkpoint()
+    journal_crash(controller)
+    controller, started = journal_session(ini)
+    check('moved then a power cut', started, 80)
+    controller.close()
+    return failures
+
+# Pins and simulated motor of each antenna for the group benchmark, the
+# first is on the [Settings] pins, and how its presets compare in counts
+GROUP_ANTENNAS = (
+    (None, {'max_rate': 20.0}, 1.0),
+    ((33, 35, 37, 40), {'max_rate': 15.0}, 0.75),
+    ((32, 36, 38, 22), {'max_rate': 28.0}, 1.2),
+    ((16, 18, 21, 23), {'max_rate': 18.0, 'min_duty': 15}, 0.9))
+
+def group_antennas(args, directory):
+    # AntennaGroup of simulated antennas on pins of their own, with its ini
+    # file in directory, returns the GPIO stand-in, the plants and the group
+    config = configparser.ConfigParser()
+    config.read_dict(DEFAULT_INI)
+    antennas = GROUP_ANTENNAS[:args.antennas]
+    names = ['Antenna %d' % (i + 1) for i in range(len(antennas))]
+    config.set('Settings', 'antennas', ', '.join(names))
+    for name, (pins, _plant, scale) in zip(names, antennas):
+        for sect in ('_Config', '_Preset'):
+            if not config.has_section(name + sect):
+                config.add_section(name + sect)
+        for key, value in DEFAULT_INI['Antenna 1_Config'].items():
+            config.set(name + '_Config', key, value)
+        for key, value in DEFAULT_INI['Antenna 1_Preset'].items():
+            config.set(name + '_Preset', key, str(int(int(value) * scale)))
+        if pins is not None:
+            for key, pin in zip(PIN_KEYS, pins):
+                config.set(name + '_Config', key, str(pin))
+    path = os.path.join(directory, 'RPiAntDrv.ini')
+    with open(path, 'w') as f:
+        config.write(f)
+    gpio = SimGPIO()
+    group = AntennaGroup(path, gpio=gpio, clock=gpio.clock)
+    group.load()
+    plants = []
+    for controller, (_pins, plant_args, _scale) in zip(group.controllers,
+                                                       antennas):
+        plant_args = dict(plant_args, load=default_load,
+                          position=controller.encoder.position)
+        plants.append(gpio.attach(MotorPlant(gpio.clock, **plant_args),
+                                  *controller.pins))
+    group.start(monitor=False, record=False)
+    return gpio, plants, group
+
+def group_settle(gpio, plants, group, limit=120.0):
+    # Tick the group until every antenna has come to rest, returns the time
+    start = gpio.clock.now
+    for plant in plants:
+        plant.last_moved = start
+    while gpio.clock.now - start < limit:
+        if not group.tick() and not any(plant.moving for plant in plants):
+            break
+        gpio.advance(group.tick_period)
+    return max(plant.last_moved for plant in plants) - start
+
+def group_edit_check(group):
+    # Edit the ini file behind the group's back and pick a preset on every
+    # controller, returns the antennas that then end up on the wrong pins
+    with open(group.ini_path, 'a') as f:
+        f.write('\n# edited\n')
+    for controller in group.controllers:
+        controller.select_preset(controller.band_preset('20m'))
+    wrong = []
+    for name in group.antennas:
+        controller = group.controller_for(name)
+        if group.store.profile(name).pins is None:
+            right = controller is group.shared
+        else:
+            right = controller.own_pins == name
+        if not right:
+            wrong.append(name)
+    return wrong
+
+def bench_group(args):
+    # Band changes on several antennas, all at once against one after the
+    # other, on two identical sets of simulated antennas
+    with tempfile.TemporaryDirectory() as tmp, \
+         tempfile.TemporaryDirectory() as tmp_1:
+        return group_run(args, tmp, tmp_1)
+    
+def group_run(args, directory, directory_1):
+    bands = ['80m', '40m', '20m', '10m', '60m', '15m', '30m',
+             '12m'] * args.passes
+    gpio, plants, group = group_antennas(args, directory)
+    gpio_1, plants_1, group_1 = group_antennas(args, directory_1)
+    print ('%d antennas, %d band changes\n' % (len(group.controllers),
+                                               len(bands)))
+    print ('%-5s %10s %10s %12s' % ('band', 'together', 'slowest',
+                                    'one by one'))
+    together = slowest = alone = 0.0
+    errors = 0
+    failures = []
+    for band in bands:
+        group.goto_band(band)
+        took = group_settle(gpio, plants, group)
+        singles = []
+        for controller in group_1.controllers:
+            name = controller.band_preset(band)
+            if name is not None:
+                controller.goto_preset(name)
+                singles.append(group_settle(gpio_1, plants_1, group_1))
+        for controller in group.controllers + group_1.controllers:
+            if controller.encoder.position != controller.ant_preset_val:
+                errors += 1
+        print ('%-5s %10.2f %10.2f %12.2f' % (band, took, max(singles),
+                                              sum(singles)))
+        # Together takes as long as the slowest antenna, give or take a
+        # tick, however many there are
+        if took > 1.1 * max(singles) + 2 * group.tick_period:
+            failures.append('%s together took %.2f s, the slowest antenna '
+                            '%.2f s' % (band, took, max(singles)))
+        together += took
+        slowest += max(singles)
+        alone += sum(singles)
+    print ('%-5s %10.2f %10.2f %12.2f' % ('total', together, slowest, alone))
+    print ('Antennas off target after a band change: %d' % errors)
+    wrong = group_edit_check(group)
+    print ('Antennas on the wrong pins after an ini edit: %s' % (
+        ', '.join(wrong) or 'none'))
+    group.close()
+    group_1.close()
+    if errors:
+        failures.append('%d antennas off target' % errors)
+    if wrong:
+        failures.append('wrong pins for %s' % ', '.join(wrong))
+    return verdict(failures)
+
+def preset_moves(gpio, plant, controller, targets):
+    # Time-to-preset of each move, and how many stalled or missed
+    times, stalls, misses = [], 0, 0
+    for target in targets:
+        start = gpio.clock.now
+        plant.last_moved = start
+        controller.goto(target)
+        run_controller(gpio, controller, 120.0)
+        times.append(plant.last_moved - start)
+        if controller.motor_stalled:
+            stalls += 1
+        elif controller.encoder.position != target:
+            misses += 1
+    return times, stalls, misses
+
+# Simulated antennas for the calibration benchmark
+CALIBRATION_PLANTS = (
+    ('default', {}),
+    ('fast', {'max_rate': 60.0, 'min_duty': 30}),
+    ('stiff', {'max_rate': 15.0, 'min_duty': 22, 'spin_up': 0.3,
+               'load': lambda position: default_load(position, extra=0.8)}))
+
+def bench_calibrate(args):
+    # Preset moves on default settings against settings learned by
+    # RPiAntCal, on antennas the defaults suit to a varying degree
+    targets = preset_targets() * args.passes
+    print ('%d preset moves per antenna' % len(targets))
+    print ('%-8s %-10s %7s %7s %7s %6s %6s  %s' % ('antenna', 'settings',
+           'mean s', 'max s', 'total s', 'stalls', 'missed', 'learned in'))
+    for name, plant_args in CALIBRATION_PLANTS:
+        for calibrated in (False, True):
+            gpio, plant, controller = sim_antenna(args, **plant_args)
+            learned = ''
+            if calibrated:
+                start = gpio.clock.now
+                calibrator = RPiAntCal.Calibrator(controller, wait=gpio.advance)
+                settings = calibrator.calibrate()
+                if settings is None:
+                    learned = '%.0f s: kept the defaults' % (
+                        gpio.clock.now - start)
+                else:
+                    calibrator.apply(settings, save=False)
+                    learned = '%.0f s: %s' % (gpio.clock.now - start,
+                        ' '.join('%s=%s' % item
+                                 for item in sorted(settings.items())))
+            times, stalls, misses = preset_moves(gpio, plant, controller,
+                                                 targets)
+            print ('%-8s %-10s %7.2f %7.2f %7.1f %6d %6d  %s' % (name,
+                   'learned' if calibrated else 'default',
+                   sum(times) / len(times), max(times), sum(times), stalls,
+                   misses, learned))
+    return 0
+
+def command_bursts(bursts, targets, seed=3):
+    # Scripted GUI session of (time, command, argument), bursts of button
+    # presses that mostly land on a move still in progress
+    import random
+    rnd = random.Random(seed)
+    script = []
+    t = 1.0
+    for _ in range(bursts):
+        kind = rnd.choice(('repeat', 'change', 'manual', 'stop', 'antenna'))
+        target = rnd.choice(targets)
+        script.append((t, 'preset', target))
+        if kind == 'repeat':
+            # Impatient double and triple clicks on Preset
+            for i in range(1, rnd.randint(2, 6)):
+                script.append((t + 0.08 * i, 'preset', target))
+        elif kind == 'change':
+            # Changed preset while the antenna is on its way
+            for i in range(1, rnd.randint(2, 4)):
+                script.append((t + 0.3 * i, 'preset', rnd.choice(targets)))
+        elif kind == 'manual':
+            script.append((t + 0.4, rnd.choice(('raise', 'lower')), None))
+            script.append((t + 0.9, 'release', None))
+        elif kind == 'stop':
+            script.append((t + rnd.uniform(0.2, 1.5), 'stop', None))
+        else:
+            script.append((t + 0.5, 'antenna', 'Antenna 2'))
+            script.append((t + 0.6, 'antenna', 'Antenna 1'))
+        t += rnd.uniform(1.0, 6.0)
+    script.sort(key=lambda step: step[0])
+    script.append((t + 2.0, 'preset', rnd.choice(targets)))
+    return script
+
+class ControlLoop:
+    # How the GUI ran controller.tick() before it had ControlThread: every
+    # tick_period from a Tk timer while the antenna is busy, with only
+    # ever one timer pending. kick() after a command starts the loop if it
+    # isn't already running. after and after_cancel are Tk's, or anything
+    # that schedules a callback in milliseconds the same way. Kept here
+    # for the latency benchmark to compare against.
+    def __init__(self, controller, after, after_cancel):
+        self.controller = controller
+        self.after = after
+        self.after_cancel = after_cancel
+        self.job = None            # The one pending timer
+        self.ticks = 0             # Ticks run so far
+        self.starts = 0            # Times the loop has been started
+        
+    @property
+    def running(self):
+        return self.job is not None
+    
+    def kick(self):
+        if self.job is None:
+            self.starts += 1
+            self.schedule()
+            
+    def schedule(self):
+        self.job = self.after(int(self.controller.tick_period * 1000),
+                              self.run)
+        
+    def run(self):
+        self.job = None
+        self.ticks += 1
+        if self.controller.tick():
+            self.schedule()
+            
+    def stop(self):
+        if self.job is not None:
+            self.after_cancel(self.job)
+            self.job = None
+
+def commands_run(args, script, directory):
+    # Play the script into simulated antennas in real time, the way the
+    # GUI does: an AntennaGroup ticked by a ControlThread, each button
+    # sent to it and Antenna Selection picking the controller the buttons
+    # drive. Every call of group.tick() is timed and the thread it came
+    # from noted. Returns the tick times, the ticking threads, the most
+    # ticks ever running at once, the send times, how many of the
+    # commands ran, motor starts, the error
+    # of the last move, whether the control thread was still running and
+    # the tick period.
+    gpio, plants, group = group_antennas(args, directory)
+    gpio.run_realtime()
+    ticks = []                 # When each tick started
+    threads = set()            # Idents of the threads that ticked
+    running = [0, 0]           # Ticks running now, most ever at once
+    tick = group.tick
+    def counted_tick(now=None):
+        ticks.append(time.monotonic())
+        threads.add(threading.get_ident())
+        running[0] += 1
+        running[1] = max(running)
+        try:
+            return tick(now)
+        finally:
+            running[0] -= 1
+    group.tick = counted_tick
+    control = ControlThread(group)
+    control.start()
+    selected = [group.controller_for(group.selected)]
+    sent = []
+    done = []                  # Commands the control thread has run
+    def press(command, arg):
+        controller = selected[0]
+        if command == 'antenna':
+            selected[0] = group.controller_for(arg)
+            return
+        sent.append(time.monotonic())
+        ran = lambda _result, _error: done.append(True)
+        if command == 'preset':
+            control.send(controller.goto, arg, done=ran)
+        else:
+            control.send({'raise': controller.raise_antenna,
+                          'lower': controller.lower_antenna,
+                          'release': controller.release,
+                          'stop': controller.halt}[command], done=ran)
+    start = time.monotonic()
+    for t, command, arg in script:
+        delay = start + t - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        press(command, arg)
+    # Let the last command run and its move finish
+    end = time.monotonic() + 60.0
+    while time.monotonic() < end and (
+        len(done) < len(sent) or
+        any(c.motion.busy or c.motor_running for c in group.started) or
+        any(plant.moving for plant in plants)):
+        time.sleep(0.05)
+    alive = control.is_alive()
+    control.stop()
+    group.close()
+    error = selected[0].encoder.position - script[-1][2]
+    return (ticks, threads, running[1], sent, len(done),
+            sum(plant.starts for plant in plants), error, alive,
+            group.tick_period)
+
+def peak_ticks(ticks, sent, period):
+    # Most ticks in any one second, and the most any one second had over
+    # what it is allowed: one every period on schedule plus one for each
+    # command sent then, which wakes the thread at once
+    peak = 0
+    over = -len(ticks)
+    first = 0
+    for i, t in enumerate(ticks):
+        while t - ticks[first] >= 1.0:
+            first += 1
+        count = i - first + 1
+        commands = (bisect.bisect_right(sent, t) -
+                    bisect.bisect_left(sent, ticks[first]))
+        peak = max(peak, count)
+        over = max(over, count - (int(1.0 / period) + 1 + commands))
+    return peak, over
+
+def bench_commands(args):
+    # Bursts of GUI commands sent to the one ControlThread of an
+    # AntennaGroup, in real time. There must only ever be the one tick
+    # loop, however the commands pile up, and it must tick no faster
+    # than tick_period allows plus one tick for each command.
+    bursts = 4 * args.passes
+    script = command_bursts(bursts, preset_targets())
+    print ('%d commands in %d bursts over %.0f s, %d antennas\n' % (
+           len(script), bursts, script[-1][0], args.antennas))
+    with tempfile.TemporaryDirectory() as tmp:
+        ticks, threads, overlap, sent, ran, starts, error, alive, period = \
+            commands_run(args, script, tmp)
+    span = ticks[-1] - ticks[0]
+    peak, over = peak_ticks(ticks, sent, period)
+    print ('%-22s %d' % ('Threads ticking', len(threads)))
+    print ('%-22s %d' % ('Ticks at once', overlap))
+    print ('%-22s %.1f/s, period %.0f mS' % ('Ticks', len(ticks) / span,
+                                            period * 1000))
+    print ('%-22s %d/s, most over the allowance %d' % ('Peak ticks', peak,
+                                                         over))
+    print ('%-22s %d' % ('Motor starts', starts))
+    print ('%-22s %d' % ('Last move error', error))
+    failures = []
+    if len(threads) != 1 or overlap != 1:
+        failures.append('%d threads ticked, %d ticks at once' % (
+            len(threads), overlap))
+    if over > 0:
+        failures.append('%d ticks too many in one second' % over)
+    if not alive or ran != len(sent):
+        failures.append('%d of %d commands run, control thread %s' % (
+            ran, len(sent), 'running' if alive else 'died'))
+    if error:
+        failures.append('last move ended %d counts off' % error)
+    return verdict(failures)
+
+class ChartCanvas:
+    # Canvas stand-in that counts the calls and points the strip chart
+    # sends to Tk
+    def __init__(self, width=330, height=90):
+        self.size = {'width': width, 'height': height}
+        self.calls = 0
+        self.points = 0
+        self.created = 0
+        
+    def __getitem__(self, key):
+        return self.size[key]
+    
+    def create_line(self, *coords, **_options):
+        self.calls += 1
+        self.created += 1
+        self.points += len(coords) // 2
+        return self.created
+    
+    def create_text(self, *_coords, **_options):
+        self.calls += 1
+        self.created += 1
+        return self.created
+    
+    def coords(self, _item, *coords):
+        self.calls += 1
+        self.points += len(coords) // 2
+        
+    def itemconfigure(self, _item, **_options):
+        self.calls += 1
+        
+    def delete(self, _item):
+        self.calls += 1
+        
+class RedrawChart:
+    # The obvious strip chart: every sample kept in a list and the lines
+    # deleted and created again from all of them on every frame
+    def __init__(self, canvas, span, fps):
+        self.canvas = canvas
+        self.span = span
+        self.samples = collections.deque(maxlen=int(span * fps) + 1)
+        self.items = []
+        
+    def update(self, controller, now, low, high):
+        rate = controller.motion.rate(now) if controller.motor_running else 0.0
+        self.samples.append((now, controller.encoder.position, rate))
+        width, height = self.canvas['width'], self.canvas['height']
+        low = min(low, min(s[1] for s in self.samples))
+        high = max(high, max(s[1] for s in self.samples), low + 1)
+        top = 1.1 * max(1.0, max(s[2] for s in self.samples))
+        position_line, rate_line = [-1, -1], [-1, -1]
+        for t, position, rate in self.samples:
+            x = int((t - now + self.span) * width / self.span)
+            position_line += (x, int(height - 3 - (position - low) *
+                                     (height - 6) / (high - low)))
+            rate_line += (x, int(height - 3 - rate * (height - 6) / top))
+        for item in self.items:
+            self.canvas.delete(item)
+        self.items = [self.canvas.create_line(*position_line),
+                      self.canvas.create_line(*rate_line)]
+        
+class LabelDisplay:
+    # The count, duty and status labels. per_pulse sets the count on every
+    # encoder pulse and the status every 100 mS as RPiAntGui v1.6 did,
+    # otherwise only changed values are pushed once a frame.
+    def __init__(self, per_pulse):
+        self.controller = None
+        self.per_pulse = per_pulse
+        self.shown = (None, None, None)
+        self.calls = 0
+        
+    def pulse(self, _channel):
+        if self.per_pulse:
+            self.calls += 1
+            
+    def frame(self):
+        controller = self.controller
+        shown = (controller.encoder.position, controller.pwm_duty,
+                 controller.status)
+        if self.per_pulse:
+            self.calls += 1
+            return
+        self.calls += sum(1 for old, new in zip(self.shown, shown)
+                          if old != new)
+        self.shown = shown
+        
+def chart_session(args, views, span, rest=5.0, idle=10.0):
+    # Preset moves with rests between on a simulated antenna, each view
+    # (name, fps, labels, chart) sampling it at its own frame rate on the
+    # virtual clock, then a wait until the chart has nothing but rest on
+    # it. Returns per view the Tk calls per second while moving, at rest
+    # and once idle, the points sent per second and the share of a CPU
+    # spent in its frames.
+    gpio, plant, controller = sim_antenna(args)
+    clock = gpio.clock
+    for _name, _fps, labels, _chart in views:
+        labels.controller = controller
+        plant.callbacks.append(labels.pulse)
+    low, high = controller.presets.count_range()
+    due = [clock.now] * len(views)
+    spent = [0.0] * len(views)
+    counted = [0] * len(views)
+    calls = {phase: [0] * len(views) for phase in ('move', 'rest', 'idle')}
+    times = dict.fromkeys(calls, 0.0)
+    start = clock.now
+    
+    def run(phase, until):
+        while not until():
+            controller.tick()
+            for i, (_name, fps, labels, chart) in enumerate(views):
+                if clock.now >= due[i]:
+                    due[i] += 1.0 / fps
+                    began = time.perf_counter()
+                    labels.frame()
+                    if chart is not None:
+                        chart.update(controller, clock.now, low, high)
+                    spent[i] += time.perf_counter() - began
+                total = labels.calls + (chart.canvas.calls if chart else 0)
+                calls[phase][i] += total - counted[i]
+                counted[i] = total
+            gpio.advance(0.005)
+            times[phase] += 0.005
+            
+    for target in preset_targets() * args.passes:
+        controller.goto(target)
+        run('move', lambda: not controller.motion.busy and not plant.moving)
+        settle = clock.now + rest
+        run('rest', lambda: clock.now >= settle)
+    settle = clock.now + span
+    run('rest', lambda: clock.now >= settle)
+    settle = clock.now + idle
+    run('idle', lambda: clock.now >= settle)
+    elapsed = clock.now - start
+    return [(name, calls['move'][i] / times['move'],
+             calls['rest'][i] / times['rest'],
+             calls['idle'][i] / times['idle'],
+             (chart.canvas.points if chart else 0) / elapsed,
+             spent[i] / elapsed)
+            for i, (name, _fps, _labels, chart) in enumerate(views)]
+
+def gui_session(ini, seconds):
+    # The GUI on a simulated antenna sent from preset to preset, prints
+    # the share of a CPU the process used and the moves made. Runs in a
+    # process of its own for bench_gui, as the simulation threads can't
+    # be stopped.
+    import tkinter
+    import RPiAntGui
+    root = tkinter.Tk()
+    window = RPiAntGui.Window(root, AntennaGroup(ini, simulate=True))
+    targets = preset_targets()
+    moves = [0]
+    def next_move():
+        controller = window.controller
+        if not controller.motion.busy and not controller.motor_running:
+            controller.goto(targets[moves[0] % len(targets)])
+            moves[0] += 1
+            window.control_start()
+        root.after(250, next_move)
+    root.after(0, next_move)
+    root.update()
+    start, cpu = time.monotonic(), time.process_time()
+    root.after(int(seconds * 1000), root.quit)
+    root.mainloop()
+    used = (time.process_time() - cpu) / (time.monotonic() - start)
+    window.close()
+    print ('%.4f %d' % (used, moves[0]))
+
+def bench_gui(args):
+    # Display refresh and strip chart cost: Tk calls and Python time per
+    # second on the simulated antenna, then the whole GUI's CPU use while
+    # moving when there is a display to open it on
+    import RPiAntGui
+    span = 60.0
+    views = [('per pulse', 10, LabelDisplay(True), None),
+             ('10 fps', 10, LabelDisplay(False), None),
+             ('10 fps redraw', 10, LabelDisplay(False),
+              RedrawChart(ChartCanvas(), span, 10)),
+             ('10 fps chart', 10, LabelDisplay(False),
+              RPiAntGui.StripChart(ChartCanvas(), span)),
+             ('30 fps chart', 30, LabelDisplay(False),
+              RPiAntGui.StripChart(ChartCanvas(), span))]
+    print ('Display of %d preset moves, 5 s rest after each, %.0f s chart\n'
+           % (len(preset_targets()) * args.passes, span))
+    print ('%-14s %21s %10s %9s' % ('', 'Tk calls/s', '', 'Python'))
+    print ('%-14s %6s %6s %6s %10s %9s' % ('', 'move', 'rest', 'idle',
+                                          'points/s', 'CPU %'))
+    results = {}
+    for name, moving, resting, idle, points, cpu in chart_session(args, views,
+                                                                  span):
+        print ('%-14s %6.1f %6.1f %6.1f %10.0f %9.3f' % (name, moving,
+               resting, idle, points, 100 * cpu))
+        results[name] = (idle, points, cpu)
+    failures = chart_buffer_checks(RPiAntGui.ChartBuffer)
+    # Once the antenna has been still for the whole chart nothing is
+    # redrawn, and the decimated chart costs well under half what
+    # redrawing every sample does
+    for name in ('10 fps', '10 fps chart', '30 fps chart'):
+        if results[name][0]:
+            failures.append('%s makes Tk calls while idle' % name)
+    redraw = results['10 fps redraw']
+    for name in ('10 fps chart', '30 fps chart'):
+        _idle, points, cpu = results[name]
+        if points > redraw[1] / 2 or cpu > redraw[2] / 2:
+            failures.append('%s sends %.0f points/s using %.3f%% CPU' % (
+                name, points, 100 * cpu))
+    if not os.environ.get('DISPLAY'):
+        print ('\nNo DISPLAY, CPU use of the GUI itself not measured')
+        return verdict(failures)
+    seconds = max(args.duration, 20.0)
+    print ('\nGUI process CPU over %.0f s of preset moves' % seconds)
+    print ('%-14s %8s %6s' % ('', 'CPU %', 'moves'))
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name, fps, chart in (('10 fps', 10, 0), ('10 fps chart', 10, span),
+                             ('30 fps chart', 30, span),
+                             ('5 fps chart', 5, span)):
+        with tempfile.TemporaryDirectory() as tmp:
+            ini = os.path.join(tmp, 'RPiAntDrv.ini')
+            config = configparser.ConfigParser()
+            config.read_dict(DEFAULT_INI)
+            config.set('Settings', 'gui_fps', str(fps))
+            config.set('Settings', 'chart_seconds', str(chart))
+            with open(ini, 'w') as f:
+                config.write(f)
+            result = subprocess.run([sys.executable, '-c',
+                                     'import RPiAntBench; RPiAntBench.'
+                                     'gui_session(%r, %r)' % (ini, seconds)],
+                                    check=True, cwd=here, capture_output=True,
+                                    text=True)
+            used, moves = result.stdout.split()[-2:]
+            print ('%-14s %8.1f %6s' % (name, 100 * float(used), moves))
+            if not int(moves):
+                failures.append('%s GUI made no moves' % name)
+    return verdict(failures)
+
+def chart_buffer_checks(ChartBuffer):
+    # What the strip chart's ChartBuffer has to get right, returns the
+    # failures. Ten one second columns, 106 pixels high so positions 0 to
+    # 20 are 5 pixels each up from 103.
+    failures = []
+    buffer = ChartBuffer(10, 10.0)
+    # Column 0 goes from 5 up to 9 and back to 7, column 3 stays at 20,
+    # the two between are empty
+    for now, position, rate in ((0.1, 5, 0), (0.5, 9, 2), (0.9, 7, 1),
+                                (3.2, 20, 4)):
+        buffer.add(now, position, rate)
+    position_line, rate_line, low, high, top = buffer.lines(106, 0, 0)
+    if position_line != [6, 78, 6, 58, 9, 3] or \
+       rate_line != [6, 103, 6, 63, 9, 23] or (low, high, top) != (0, 20, 5):
+        failures.append('chart lines %s %s scaled %s' % (
+            position_line, rate_line, (low, high, top)))
+    # A repeated sample, or one from before the newest column, changes
+    # nothing
+    buffer.add(3.5, 20, 4)
+    buffer.add(2.0, 1, 1)
+    if buffer.changed:
+        failures.append('chart changed by a repeated or late sample')
+    # However many samples, at most two points a column in each line
+    for i in range(400):
+        buffer.add(4.0 + i * 0.1, (i * 7) % 23, i % 5)
+    position_line, rate_line, _low, _high, _top = buffer.lines(106, 0, 0)
+    xs = position_line[::2]
+    if len(position_line) > 4 * 10 or len(rate_line) > 4 * 10 or \
+       xs != sorted(xs) or not 0 <= min(xs) <= max(xs) < 10:
+        failures.append('chart holds %d points for 10 columns' %
+                        (len(position_line) // 2))
+    # A sample long after the last leaves only itself on the chart
+    buffer.add(1000.0, 3, 0)
+    if len(buffer.lines(106, 0, 20)[0]) != 2:
+        failures.append('old columns kept after a long gap')
+    return failures
+
+class WallClock:
+    # SimTimers on the wall clock, for a stand-in Tk mainloop
+    @property
+    def now(self):
+        return time.monotonic()
+    
+def latency_session(ini, mode, seconds, burst, every, seed=11):
+    # The GUI's side of the control loop on a simulated antenna, run in a
+    # process of its own for bench_latency. The main thread stands in for
+    # the Tk mainloop, busy in Python for burst seconds in every every.
+    # It keeps sending the antenna from end to end, and a remote thread
+    # presses Stop a moment into each move. mode 'tk' ticks the antenna
+    # from mainloop timers and the Stop is given directly, as the GUI and
+    # network server used to, 'thread' runs a ControlThread and Stop is
+    # sent to it. Prints the wake up and Stop latencies as JSON.
+    group = AntennaGroup(ini, simulate=True)
+    group.load()
+    group.start()
+    controller = group.controller_for(group.selected)
+    timers = SimTimers(WallClock())
+    rnd = random.Random(seed)
+    if mode == 'tk':
+        control = None
+        wake = RPiAntLog.LatencyHistogram('Wake up')
+        def after(ms, callback):
+            due = time.monotonic() + ms / 1000.0
+            def timed():
+                wake.record(time.monotonic() - due)
+                callback()
+            return timers.after(ms, timed)
+        loop = ControlLoop(group, after, timers.after_cancel)
+        def give(command, *args):
+            command(*args)
+            loop.kick()
+    else:
+        control = ControlThread(group)
+        control.start()
+        wake = control.wake
+        give = control.send
+    stopped = threading.Event()
+    moving = threading.Event()
+    def remote():
+        # Stop pressed over the network part way into each move, timed
+        # from when it was due, so waiting to run at all counts too
+        while not stopped.is_set():
+            if moving.wait(0.1):
+                pressed = time.monotonic() + rnd.uniform(0.2, 0.6)
+                time.sleep(pressed - time.monotonic())
+                moving.clear()
+                if control is None:
+                    with controller.command(pressed):
+                        controller.halt()
+                else:
+                    control.commands.append((pressed, controller.halt, (),
+                                              None))
+                    control.kick()
+    threading.Thread(target=remote, daemon=True).start()
+    time.sleep(0.5)
+    wake.reset()
+    controller.stop_latency.reset()
+    end = time.monotonic() + seconds
+    next_burst = time.monotonic() + every
+    targets = (250, 20)
+    moves = 0
+    while time.monotonic() < end:
+        timers.run_due()
+        now = time.monotonic()
+        if now >= next_burst:
+            next_burst += every
+            busy = now + burst
+            while time.monotonic() < busy:
+                pass
+        if not moving.is_set() and not controller.motion.busy and \
+           not controller.motor_running:
+            give(controller.goto, targets[moves % 2])
+            moves += 1
+            moving.set()
+        time.sleep(0.001)
+    stopped.set()
+    stop = controller.stop_latency
+    result = {'status': ', '.join(control.rt_status) if control else
+              'Tk timers', 'moves': moves, 'stops': stop.total}
+    for name, histogram in (('wake', wake), ('stop', stop)):
+        result[name] = [histogram.percentile(50) or 0.0,
+                        histogram.percentile(99) or 0.0, histogram.worst]
+    if control is not None:
+        control.stop()
+    group.close()
+    print (json.dumps(result))
+    
+def bench_latency(args):
+    # Wake up and Stop latency of the control loop with the GUI thread
+    # busy and a CPU burner on every core, ticked from Tk timers as the
+    # GUI used to, from a ControlThread, and from one at SCHED_FIFO on a
+    # CPU of its own with memory locked
+    seconds = max(args.duration, 20.0)
+    burst, every = 0.05, 0.25
+    cpus = os.cpu_count() or 1
+    print ('Control loop latency, %.0f s each, GUI thread busy %.0f mS in '
+           'every %.0f mS, %d CPU burners on %d CPUs\n' % (
+           seconds, 1000 * burst, 1000 * every, args.load, cpus))
+    print ('%-12s %22s %29s' % ('', 'wake up mS', 'Stop to pins mS'))
+    print ('%-12s %7s %7s %7s %6s %7s %7s %7s  %s' % ('', 'p50', 'p99', 'max',
+           'stops', 'p50', 'p99', 'max', 'control thread'))
+    here = os.path.dirname(os.path.abspath(__file__))
+    burners = [subprocess.Popen([sys.executable, '-c', 'while True: pass'])
+               for _ in range(args.load)]
+    try:
+        for name, mode, priority in (('Tk timers', 'tk', 0),
+                                     ('thread', 'thread', 0),
+                                     ('thread FIFO', 'thread', 50)):
+            with tempfile.TemporaryDirectory() as tmp:
+                ini = os.path.join(tmp, 'RPiAntDrv.ini')
+                config = configparser.ConfigParser()
+                config.read_dict(DEFAULT_INI)
+                if priority:
+                    config.set('Settings', 'rt_priority', str(priority))
+                    config.set('Settings', 'rt_cpu', str(cpus - 1))
+                    config.set('Settings', 'rt_lock_memory', 'yes')
+                with open(ini, 'w') as f:
+                    config.write(f)
+                output = subprocess.run(
+                    [sys.executable, '-c', 'import RPiAntBench; RPiAntBench.'
+                     'latency_session(%r, %r, %r, %r, %r)' % (
+                         ini, mode, seconds, burst, every)],
+                    check=True, cwd=here, capture_output=True, text=True)
+                result = json.loads(output.stdout.splitlines()[-1])
+            print ('%-12s %7.2f %7.2f %7.2f %6d %7.2f %7.2f %7.2f  %s' % ((
+                name,) + tuple(1000 * t for t in result['wake']) + (
+                result['stops'],) + tuple(1000 * t for t in result['stop']) +
+                (result['status'],)))
+    finally:
+        for burner in burners:
+            burner.kill()
+            burner.wait()
+    return 0
+
+def watchdog_session(ini, scenario, block, reps):
+    # A simulated antenna started by a command from the GUI, whose thread
+    # then blocks for block seconds, busy in Python the whole time, before
+    # it can send the Release. 'free' raises past the top preset of an
+    # antenna that turns freely there, a loop capacitor say. 'lock'
+    # lowers into the end stop while the GUI thread holds the controller
+    # lock, which also holds up the control thread and stall checks. Run
+    # in a process of its own for bench_watchdog, prints per run how long
+    # the motor was powered, counts past the presets, seconds powered
+    # against an end stop, and if a watchdog cut or stall stopped it, how
+    # late that was and the status, as JSON.
+    group = AntennaGroup(ini, simulate=True)
+    group.load()
+    group.start()
+    controller = group.controller_for(group.selected)
+    plant = group.gpio.plants[0][0]
+    clock = group.gpio.clock
+    control = ControlThread(group)
+    control.start()
+    low, high = controller.presets.count_range()
+    if scenario == 'free':
+        plant.maximum = 1e6
+        home, press, edge = high - 20, controller.raise_antenna, high
+    else:
+        home, press, edge = low + 40, controller.lower_antenna, low
+    runs = []
+    for _ in range(reps):
+        control.send(controller.goto, home)
+        time.sleep(0.1)
+        while controller.motion.busy or plant.moving:
+            time.sleep(0.05)
+        controller.pwm_duty = 100
+        controller.stop_latency.reset()
+        start = clock.now
+        plant.power_off = None
+        control.send(press)
+        time.sleep(0.5)
+        busy = time.monotonic() + block
+        if scenario == 'lock':
+            with controller.lock:
+                while time.monotonic() < busy:
+                    pass
+        else:
+            while time.monotonic() < busy:
+                pass
+        # A moment for a stall check held up by the lock
+        time.sleep(0.1)
+        stopped = controller.stop_latency
+        late = stopped.worst if stopped.total else None
+        status = controller.status
+        control.send(controller.release)
+        time.sleep(0.2)
+        while plant.moving:
+            time.sleep(0.05)
+        power_off = plant.power_off if plant.power_off is not None \
+            else clock.now
+        pushed = (power_off - plant.stop_hit if plant.stop_hit is not None
+                  else 0.0)
+        runs.append({'powered': power_off - start,
+                     'past': max(0, (plant.count - edge) *
+                                 (1 if scenario == 'free' else -1)),
+                     'pushed': pushed, 'late': late, 'status': status})
+        controller.sync(plant.count)
+        controller.cut_reason = None
+    control.stop()
+    group.close()
+    print (json.dumps(runs))
+    
+def follow_session(ini, first, then):
+    # The radio tuned to first and, once the antenna is on its way there,
+    # to then, further on in the same direction, with the watchdog
+    # running. Run in a process of its own for bench_watchdog, prints the
+    # target and final counts, the seconds taken and the status as JSON.
+    group = AntennaGroup(ini, simulate=True)
+    group.load()
+    group.start()
+    controller = group.controller_for(group.selected)
+    plant = group.gpio.plants[0][0]
+    control = ControlThread(group)
+    control.start()
+    controller.follow()
+    start = time.monotonic()
+    controller.follower.update(first)
+    while not controller.motor_running:
+        time.sleep(0.01)
+    time.sleep(0.2)
+    controller.follower.update(then)
+    time.sleep(0.5)
+    while controller.motion.busy or plant.moving:
+        time.sleep(0.05)
+    result = {'target': controller.freq_index.count(then),
+              'count': controller.encoder.position,
+              'seconds': time.monotonic() - start,
+              'status': controller.status}
+    control.stop()
+    group.close()
+    print (json.dumps(result))
+    
+def bench_watchdog(args):
+    # Worst case stop with the GUI thread blocked: how long the motor
+    # stays powered with and without the watchdog, and how late the stop
+    # was past its deadline, the watchdog's or the stall check's
+    block = max(args.duration, 10.0)
+    print ('GUI thread blocked %.0f s after the command, Release only sent '
+           'once it is free\n' % block)
+    print ('%-26s %4s %9s %6s %8s %11s %11s  %s' % ('', 'runs', 'powered s',
+           'past', 'pushed s', 'late p50 mS', 'late max mS', 'stopped by'))
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name, scenario, watchdog, reps in (
+            ('release lost, free turning', 'free', False, 1),
+            ('  with watchdog', 'free', True, args.runs // 4 or 1),
+            ('lock held, into end stop', 'lock', False, 1),
+            ('  with watchdog', 'lock', True, args.runs // 4 or 1)):
+        with tempfile.TemporaryDirectory() as tmp:
+            ini = os.path.join(tmp, 'RPiAntDrv.ini')
+            config = configparser.ConfigParser()
+            config.read_dict(DEFAULT_INI)
+            if not watchdog:
+                config.set('Settings', 'watchdog_heartbeat', '0')
+                config.set('Settings', 'watchdog_margin', '0')
+            with open(ini, 'w') as f:
+                config.write(f)
+            output = subprocess.run(
+                [sys.executable, '-c', 'import RPiAntBench; RPiAntBench.'
+                 'watchdog_session(%r, %r, %r, %r)' % (ini, scenario, block,
+                                                       reps)],
+                check=True, cwd=here, capture_output=True, text=True)
+            runs = json.loads(output.stdout.splitlines()[-1])
+        lates = sorted(run['late'] for run in runs if run['late'] is not None)
+        print ('%-26s %4d %9.2f %6d %8.2f %11s %11s  %s' % (
+            name, len(runs), max(run['powered'] for run in runs),
+            max(run['past'] for run in runs),
+            max(run['pushed'] for run in runs),
+            '%.2f' % (1000 * lates[len(lates) // 2]) if lates else '-',
+            '%.2f' % (1000 * lates[-1]) if lates else '-',
+            runs[-1]['status'] if lates else 'Release'))
+    print ('\npowered: longest the motor was on, past: counts beyond the '
+           'presets,\npushed: seconds powered against the end stop, late: '
+           'stop past its deadline')
+    # A follow move retargeted far beyond its first stop point has to get
+    # the time the new distance takes
+    first, then = 28.0, 3.5
+    with tempfile.TemporaryDirectory() as tmp:
+        ini = os.path.join(tmp, 'RPiAntDrv.ini')
+        config = configparser.ConfigParser()
+        config.read_dict(DEFAULT_INI)
+        with open(ini, 'w') as f:
+            config.write(f)
+        output = subprocess.run(
+            [sys.executable, '-c', 'import RPiAntBench; RPiAntBench.'
+             'follow_session(%r, %r, %r)' % (ini, first, then)],
+            check=True, cwd=here, capture_output=True, text=True)
+        result = json.loads(output.stdout.splitlines()[-1])
+    print ('\nFollow %.3f then %.3f MHz: count %d of %d in %.1f s, %s' % (
+        first, then, result['count'], result['target'], result['seconds'],
+        result['status']))
+    return 0 if result['count'] == result['target'] else 1
+
+BENCHMARKS = {'calibrate': bench_calibrate,
+              'commands': bench_commands,
+              'config': bench_config,
+              'debounce': bench_debounce,
+              'encoder': bench_encoder,
+              'follow': bench_follow,
+              'group': bench_group,
+              'gui': bench_gui,
+              'journal': bench_journal,
+              'latency': bench_latency,
+              'freq': bench_freq,
+              'move': bench_move,
+              'net': bench_net,
+              'presets': bench_presets,
+              'sim': bench_sim,
+              'stall': bench_stall,
+              'startup': bench_startup,
+              'telemetry': bench_telemetry,
+              'watchdog': bench_watchdog}
+
+def main():
+    parser = argparse.ArgumentParser(description='RPiAntDrv benchmarks')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--duration', type=float, default=2.0,
+                        help='seconds per run (default 2)')
+    parser.add_argument('--rates', type=int, nargs='+',
+                        default=[1000, 2000, 3000, 4000, 5000],
+                        help='pulse rates in Hz for the encoder benchmark')
+    parser.add_argument('--max-rate', type=float, default=20.0,
+                        help='simulated motor pulses/s at full speed')
+    parser.add_argument('--min-clean', type=int, default=100,
+                        help='debounce: lowest pulses/s the adaptive window '
+                        'must count exactly')
+    parser.add_argument('--search-budget', type=float, default=20.0,
+                        help='presets: mS a search as you type keystroke '
+                        'may take with the database')
+    parser.add_argument('--passes', type=int, default=2,
+                        help='times through the preset table')
+    parser.add_argument('--bounces', type=int, default=0,
+                        help='most extra encoder edges per simulated pulse')
+    parser.add_argument('--max-overshoot', type=int, default=2,
+                        help='most counts a preset move may overshoot in the '
+                        'sim benchmark (default 2)')
+    parser.add_argument('--runs', type=int, default=20,
+                        help='repeats for the startup benchmark')
+    parser.add_argument('--budget', type=float, default=30.0,
+                        help='most mS the startup benchmark allows for '
+                        'importing RPiAntDrv, best of --runs (default 30)')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[100, 500, 1000, 5000],
+                        help='presets per antenna for the config benchmark')
+    parser.add_argument('--presets', type=int, default=10000,
+                        help='presets per antenna for the presets benchmark')
+    parser.add_argument('--clients', type=int, default=48,
+                        help='network clients for the net benchmark')
+    parser.add_argument('--poll', type=float, default=0.02,
+                        help='seconds between position polls per client')
+    parser.add_argument('--pulse-rates', type=int, nargs='+',
+                        default=[10, 20, 25, 30, 40, 60, 80, 100, 120, 150,
+                                 200],
+                        help='motor pulses/s for the debounce benchmark')
+    parser.add_argument('--roughness', type=float, default=0.25,
+                        help='load variation per revolution for the stall '
+                        'benchmark')
+    parser.add_argument('--antennas', type=int, default=4,
+                        help='simulated antennas for the group benchmark, '
+                        'up to 4')
+    parser.add_argument('--load', type=int, default=os.cpu_count() or 1,
+                        help='CPU burning processes for the latency '
+                        'benchmark (default one per CPU)')
+    parser.add_argument('--sweep', metavar='FILE',
+                        help='recorded "seconds MHz" VFO sweep for the '
+                        'follow benchmark (default a built in one)')
+    args = parser.parse_args()
+    return BENCHMARKS[args.benchmark](args)
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,392 @@
+#! /usr/bin/python3
+##################################################################
+#
+# Raspberry Pi Antenna Driver calibration (RPiAntCal.py)
+#
+# Drives an antenna back and forth between its lowest and highest
+# presets to learn the _Config settings that are otherwise found by
+# trial and error:
+#
+#   min_duty      lowest duty that turns the motor both ways, plus a step
+#   full_speed    lowest duty that reaches the top pulse rate
+#   slow_speed    } the pair with the quickest test moves that all
+#   ramp_time     } stop on target, from the duties the antenna coasts
+#                 less than a count from and fractions of the time it
+#                 takes to slow down to them
+#   coast_counts  coast learned in those test moves
+#   stall_time    longest wait for a pulse anywhere in the range, scaled
+#                 to 100% duty, with room to spare
+#
+# The learned settings are then tried on moves to the presets, and are
+# only kept if they reach every preset and do so quicker than the
+# settings the antenna already has.
+#
+# Started with RPiAntDrv.py --calibrate. The antenna must be free to
+# move between its presets. Nothing else may drive the antenna while
+# it runs. tick() is only called for the test moves, so no stall check
+# or move gets in the way of the other measurements.
+#
+##################################################################
+
+import math
+import statistics
+import time
+
+class Run:
+    # Pulses from one run of the motor from rest
+    def __init__(self, duty, direction, start):
+        self.duty = duty
+        self.direction = direction
+        self.start = start          # When the motor was switched on
+        self.stamps = []            # Pulse times
+        self.positions = []         # Count after each pulse
+        self.switched = None        # When the duty was changed part way
+        self.switch_duty = duty     # What it was changed to
+        self.coast = 0              # Pulses after the motor was switched off
+
+    def gaps(self):
+        # Seconds to the first pulse, then between pulses
+        times = [self.start] + self.stamps
+        return [b - a for a, b in zip(times, times[1:])]
+
+    def scaled(self):
+        # Gaps times the duty they were at, as the stall check scales them
+        ends = self.stamps
+        return [gap * (self.switch_duty if self.switched is not None and
+                       t > self.switched else self.duty) / 100
+                for gap, t in zip(self.gaps(), ends)]
+
+    def rate(self):
+        # Steady pulses/s, once past spinning up
+        steady = self.gaps()[2:]
+        if not steady:
+            return 0.0
+        return 1.0 / statistics.median(steady)
+
+class Calibrator:
+    # Measures one antenna through its controller, which must have been
+    # started. wait(seconds) lets time pass, RPiAntSim.SimGPIO.advance
+    # runs a simulated antenna faster than real time.
+    def __init__(self, controller, wait=time.sleep, progress=None):
+        self.controller = controller
+        self.wait = wait
+        self.progress = progress    # progress(text) for each step, or None
+        self.clock = controller.clock
+        self.poll = 0.01            # Seconds between looks at the encoder
+        self.probe_time = 3.0       # Longest wait for a pulse
+        self.probe_pulses = 3       # Pulses that show a duty turns the motor
+        self.duty_step = 5          # Duty step when looking for min_duty
+        self.duties = (25, 40, 55, 70, 85, 100) # Duties measured above min_duty
+        self.run_counts = 20        # Pulses per measuring run
+        self.settle_time = 0.5      # No pulses for this long means at rest
+        self.stall_margin = 1.5     # stall_time over the longest wait seen
+        self.coast_limit = 1.0      # Most coast at slow_speed, in counts
+        self.full_rate = 0.97       # Fraction of the top rate that is full speed
+        self.candidates = 3         # Slow speeds given test moves
+        self.ramps = (0.35, 0.7, 1.05) # Fractions of the slowing time tried
+        self.test_moves = (40, -3, -12, 6, 25, -2, -50, 1) # Counts moved
+        self.move_time = 60.0       # Longest a test move may take
+        self.tour_presets = 24      # Most presets the settings are tried on
+        self.tour_passes = 2        # Times round them, the coast learned in
+                                    # the first pass is tried in the second
+        self.runs = []              # Every Run so far
+        self.rates = {}             # Steady pulses/s by duty
+        self.coasts = {}            # Mean pulses coasted by duty
+        self.min_duty = None
+        self.slowing = {}           # Seconds to slow from full by slow duty
+        presets = controller.presets.count_range()
+        if presets is None:
+            raise ValueError('%s has no presets to calibrate between'
+                             % controller.antenna)
+        self.low, self.high = presets
+        encoder = controller.encoder
+        self.seen = encoder.pulses  # Encoder pulses taken in so far
+        self.count = encoder.count  # Raw encoder count at the last of them
+
+    def say(self, text):
+        if self.progress is not None:
+            self.progress(text)
+
+    def pulses(self):
+        # (time, position) of each pulse since the last call
+        encoder = self.controller.encoder
+        end = encoder.pulses
+        found = []
+        for i in range(max(self.seen, end - encoder.mask), end):
+            self.count += encoder.dirs[i & encoder.mask]
+            found.append((encoder.stamps[i & encoder.mask],
+                          self.count + encoder.offset))
+        self.seen = end
+        return found
+
+    def drive(self, direction, duty):
+        controller = self.controller
+        with controller.lock:
+            controller.pwm_duty = duty
+            controller.motion_drive(direction, duty)
+
+    def stop(self):
+        with self.controller.lock:
+            self.controller.motor_stop()
+
+    def rest(self):
+        # Wait for the antenna to come to rest, returns the pulses seen
+        found = []
+        quiet = self.clock()
+        while self.clock() - quiet < self.settle_time:
+            self.wait(self.poll)
+            new = self.pulses()
+            if new:
+                found += new
+                quiet = new[-1][0]
+        return found
+
+    def way(self):
+        # Towards the end of the range furthest away
+        position = self.controller.encoder.position
+        return 1 if self.high - position >= position - self.low else -1
+
+    def room(self, position, direction):
+        # Counts left before the end of the range, less what it may coast
+        end = self.high if direction > 0 else self.low
+        reserve = 2 + max(self.coasts.values(), default=3)
+        return (end - position) * direction - reserve
+
+    def run(self, direction, duty, pulses, switch=None):
+        # Run from rest until pulses pulses, the end of the range or no
+        # pulse for probe_time, then switch off and count the coast.
+        # switch is (pulses, duty) to change the duty part way.
+        self.rest()
+        run = Run(duty, direction, self.clock())
+        position = self.controller.encoder.position
+        self.drive(direction, duty)
+        last = run.start
+        while len(run.stamps) < pulses and self.room(position, direction) > 0:
+            self.wait(self.poll)
+            for stamp, position in self.pulses():
+                run.stamps.append(stamp)
+                run.positions.append(position)
+                last = stamp
+            if switch is not None and run.switched is None and \
+               len(run.stamps) >= switch[0]:
+                run.switched = self.clock()
+                run.switch_duty = switch[1]
+                self.drive(direction, switch[1])
+            if self.clock() - last > self.probe_time:
+                break
+        self.stop()
+        run.coast = len(self.rest())
+        self.runs.append(run)
+        return run
+
+    def centre(self):
+        # Drive to the middle of the range, so there's room both ways
+        middle = (self.low + self.high) // 2
+        counts = abs(middle - self.controller.encoder.position)
+        if counts > self.run_counts:
+            self.run(self.way(), 100, counts - self.run_counts // 2)
+
+    def find_min_duty(self):
+        # Lowest duty that turns the motor both ways, plus a step for luck
+        for duty in range(self.duty_step, 101, self.duty_step):
+            direction = self.way()
+            moved = all(len(self.run(way, duty, self.probe_pulses).stamps)
+                        >= self.probe_pulses for way in (direction, -direction))
+            self.say('duty %3d%%  %s' % (duty, 'turns' if moved else
+                                         'does not turn'))
+            if moved:
+                self.min_duty = min(100, duty + self.duty_step)
+                return self.min_duty
+        raise RuntimeError('%s did not move' % self.controller.antenna)
+
+    def measure_duties(self):
+        # Pulse rate and coast at a spread of duties, a run each way
+        duties = sorted({self.min_duty} |
+                        {d for d in self.duties if d > self.min_duty})
+        for duty in duties:
+            direction = self.way()
+            runs = [self.run(way, duty, self.run_counts)
+                    for way in (direction, -direction)]
+            self.rates[duty] = statistics.mean(run.rate() for run in runs)
+            self.coasts[duty] = statistics.mean(run.coast for run in runs)
+            self.say('duty %3d%%  %5.1f pulses/s  coast %.1f  longest wait '
+                     '%.3f s' % (duty, self.rates[duty], self.coasts[duty],
+                                 max(max(run.gaps(), default=0.0)
+                                     for run in runs)))
+
+    def measure_slowing(self, full, slow):
+        # Time for the pulse rate to settle after dropping to slow speed
+        steady = 1.0 / self.rates[slow]
+        times = []
+        for way in (self.way(), -self.way()):
+            run = self.run(way, full, 2 * self.run_counts,
+                           switch=(self.run_counts, slow))
+            if run.switched is None:
+                continue
+            after = [(t, gap) for t, gap in zip(run.stamps, run.gaps())
+                     if t > run.switched]
+            settled = [t for t, gap in after if gap >= 0.85 * steady]
+            if settled:
+                times.append(settled[0] - run.switched)
+        self.slowing[slow] = max(times, default=0.0)
+        self.say('slowing from %d%% to %d%% takes %.2f s' % (
+            full, slow, self.slowing[slow]))
+
+    def measure_range(self):
+        # Creep from one end of the range to the other at min_duty, the
+        # slowest it is driven, to find the hardest place to turn
+        near = -self.way()
+        self.run(near, 100, self.high - self.low)
+        run = self.run(-near, self.min_duty, self.high - self.low)
+        scaled = run.scaled()
+        if scaled:
+            worst = scaled.index(max(scaled))
+            self.say('creeping at %d%%  longest wait %.3f s at count %d' % (
+                self.min_duty, run.gaps()[worst], run.positions[worst]))
+
+    def use(self, settings):
+        # Drive with these settings without touching the ini file
+        controller = self.controller
+        with controller.lock:
+            controller.min_duty = int(settings['min_duty'])
+            controller.full_speed = int(settings['full_speed'])
+            controller.slow_speed = int(settings['slow_speed'])
+            controller.stall_time = int(settings['stall_time'])
+            motion = controller.motion
+            motion.full_speed = controller.full_speed
+            motion.slow_speed = controller.slow_speed
+            motion.coast = float(settings['coast_counts'])
+            motion.ramp_time = float(settings['ramp_time'])
+
+    def current(self):
+        # The settings the antenna is driven with now, to compare against
+        controller = self.controller
+        motion = controller.motion
+        return {'min_duty': '%d' % controller.min_duty,
+                'full_speed': '%d' % controller.full_speed,
+                'slow_speed': '%d' % controller.slow_speed,
+                'coast_counts': '%.2f' % motion.coast,
+                'ramp_time': '%.2f' % motion.ramp_time,
+                'stall_time': '%d' % controller.stall_time}
+
+    def try_moves(self, settings):
+        # Seconds taken by the test moves from the middle of the range,
+        # None if any of them stalled or missed
+        self.centre()
+        self.use(settings)
+        direction = self.way()
+        position = self.controller.encoder.position
+        targets = []
+        for counts in self.test_moves:
+            position += direction * counts
+            targets.append(position)
+        return self.timed_moves(targets)
+
+    def try_presets(self, settings):
+        # Seconds taken to go to each preset in turn, in the order they are
+        # listed, None if any move stalled or missed. At most tour_presets
+        # of them, spread through the list. Every try starts from the last
+        # of them, so they are all timed over the same moves.
+        self.use(settings)
+        targets = list(dict.fromkeys(self.controller.presets.values()))
+        step = max(1, math.ceil(len(targets) / self.tour_presets))
+        targets = targets[::step]
+        self.timed_moves(targets[-1:])
+        return self.timed_moves(targets * self.tour_passes)
+
+    def timed_moves(self, targets):
+        # Seconds taken to move to each target in turn, None if any of
+        # them stalled or missed
+        controller = self.controller
+        taken = 0.0
+        for target in targets:
+            start = self.clock()
+            controller.goto(target)
+            while controller.tick():
+                if self.clock() - start > self.move_time:
+                    controller.halt()
+                    return None
+                self.wait(controller.tick_period)
+            taken += self.clock() - start
+            # Still there once it has really stopped?
+            self.pulses()
+            self.rest()
+            if controller.motor_stalled or \
+               controller.encoder.position != target:
+                return None
+        return taken
+
+    def calibrate(self):
+        # Run every measurement, returns the _Config values as strings, or
+        # None if nothing learned beats the settings the antenna has now
+        self.say('Calibrating %s between %d and %d' % (
+            self.controller.antenna, self.low, self.high))
+        current = self.current()
+        self.centre()
+        self.find_min_duty()
+        self.measure_duties()
+        top = max(self.rates.values())
+        full = min(d for d, rate in self.rates.items()
+                   if rate >= self.full_rate * top)
+        # The fastest slow speeds the antenna stops well from
+        slows = sorted([d for d, coast in self.coasts.items()
+                        if coast < self.coast_limit and d < full],
+                       reverse=True)[:self.candidates] or [self.min_duty]
+        for slow in slows:
+            self.measure_slowing(full, slow)
+        self.measure_range()
+        # The longest wait for a pulse at any duty it may be driven at,
+        # scaled the way the stall check scales stall_time
+        longest = max(max(run.scaled(), default=0.0)
+                      for run in self.runs if run.duty >= self.min_duty)
+        stall_time = max(10, 10 * math.ceil(100 * self.stall_margin *
+                                            longest))
+        passed = []
+        for slow in slows:
+            for fraction in self.ramps:
+                settings = {'min_duty': '%d' % self.min_duty,
+                            'full_speed': '%d' % full,
+                            'slow_speed': '%d' % slow,
+                            'coast_counts': '%.2f' % (self.coasts[slow] + 0.5),
+                            'ramp_time': '%.2f' % max(0.1, min(
+                                3.0, fraction * self.slowing[slow])),
+                            'stall_time': '%d' % stall_time}
+                taken = self.try_moves(settings)
+                # Keep the coast the moves have learned
+                settings['coast_counts'] = '%.2f' % self.controller.motion.coast
+                self.say('slow speed %3d%%  ramp %s s  test moves %s' % (
+                    slow, settings['ramp_time'], 'missed' if taken is None
+                    else '%.2f s' % taken))
+                if taken is not None:
+                    passed.append((taken, settings))
+        # The quickest that goes to every preset, and quicker than now
+        before = self.try_presets(current)
+        self.say('current settings  presets %s' % (
+            'missed' if before is None else '%.2f s' % before))
+        for _taken, settings in sorted(passed, key=lambda item: item[0]):
+            taken = self.try_presets(settings)
+            settings['coast_counts'] = '%.2f' % self.controller.motion.coast
+            self.say('slow speed %3s%%  ramp %s s  presets %s' % (
+                settings['slow_speed'], settings['ramp_time'],
+                'missed' if taken is None else '%.2f s' % taken))
+            if taken is not None and (before is None or taken < before):
+                return settings
+        self.say('Nothing learned beats the current settings, keeping them')
+        self.use(current)
+        return None
+
+    def apply(self, settings, save=True):
+        # Write the values into the antenna's _Config section and use them
+        controller = self.controller
+        store = controller.store
+        sect = controller.ant_config_sect
+        with controller.lock:
+            if save:
+                store.refresh()
+            if not store.config.has_section(sect):
+                store.config.add_section(sect)
+            for key, value in settings.items():
+                store.set(sect, key, value)
+            if save:
+                store.save()
+            controller.ant_refresh()
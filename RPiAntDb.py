@@ -0,0 +1,275 @@
+#! /usr/bin/python3
+##################################################################
+#
+# Raspberry Pi Antenna Driver preset database (RPiAntDb.py)
+#
+# Presets kept in an sqlite3 database instead of the _Preset
+# sections of RPiAntDrv.ini, for antennas with thousands of them,
+# e.g. one every kHz for each of several whip and hat combinations.
+# Every preset is a row of its own:
+#
+#   antenna  text     antenna name
+#   label    text     preset name as shown, e.g. '20m 14.200 (038)'
+#   band     text     '20m', '' if the label doesn't start with one
+#   freq     real     MHz from the label, NULL if it hasn't got one
+#   count    integer  encoder count
+#   notes    text     anything else worth knowing, '' if nothing
+#   seq      integer  order of the presets, as in the _Preset section
+#
+# Indexes on antenna with seq, freq and band mean picking an antenna
+# reads nothing and a preset search only reads the rows it returns.
+# Turned on by the [Settings] key preset_db, a new database starts
+# with a copy of the _Preset sections.
+#
+# Run on its own to move presets in and out:
+#   RPiAntDb.py --import FILE    _Preset sections of an ini file in,
+#                                replacing those antennas' presets
+#   RPiAntDb.py --export FILE    every antenna's presets out to an
+#                                ini file of _Preset sections
+#   RPiAntDb.py --search TEXT    presets of an antenna matching TEXT
+#
+##################################################################
+
+import argparse
+from collections.abc import Mapping
+import configparser
+import os
+import sqlite3
+import threading
+
+from RPiAntDrv import FrequencyIndex, PresetQuery, preset_fields
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS presets (
+    antenna TEXT NOT NULL,
+    label TEXT NOT NULL,
+    band TEXT NOT NULL,
+    freq REAL,
+    count INTEGER NOT NULL,
+    notes TEXT NOT NULL DEFAULT '',
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (antenna, label));
+CREATE INDEX IF NOT EXISTS presets_seq ON presets (antenna, seq);
+CREATE INDEX IF NOT EXISTS presets_freq ON presets (antenna, freq);
+CREATE INDEX IF NOT EXISTS presets_band ON presets (antenna, band, seq);
+'''
+
+def like_pattern(word):
+    # LIKE pattern for a word anywhere in a column, '_' and '%' in preset
+    # names are taken literally
+    return '%' + word.replace('\\', '\\\\').replace('%', '\\%').replace(
+        '_', '\\_') + '%'
+
+class PresetDb:
+    # The database file. One connection shared by the GUI, control and
+    # network threads, a query at a time.
+    def __init__(self, path):
+        self.path = path
+        self.created = not os.path.exists(path)
+        self.lock = threading.Lock()
+        try:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            with self.lock, self.connection:
+                self.connection.executescript(SCHEMA)
+        except sqlite3.Error as e:
+            raise ValueError('Preset database %s: %s' % (path, e))
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def table(self, antenna):
+        return PresetTable(self, antenna)
+
+    def antennas(self):
+        return [row[0] for row in self.query(
+            'SELECT DISTINCT antenna FROM presets ORDER BY antenna')]
+
+    def replace(self, antenna, presets, notes=None):
+        # Make (label, count) pairs, in order, the antenna's presets.
+        # notes maps labels to their notes.
+        notes = notes or {}
+        rows = []
+        for seq, (label, count) in enumerate(presets):
+            band, freq = preset_fields(label)
+            rows.append((antenna, label, band, freq, int(count),
+                         notes.get(label, ''), seq))
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM presets WHERE antenna = ?',
+                                    (antenna,))
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO presets VALUES (?, ?, ?, ?, ?, ?, ?)',
+                rows)
+
+    def import_config(self, config):
+        # Every NAME_Preset section of a ConfigParser, with the notes of an
+        # optional NAME_Notes section. Returns the antennas imported.
+        antennas = []
+        for sect in config.sections():
+            if not sect.endswith('_Preset'):
+                continue
+            antenna = sect[:-len('_Preset')]
+            notes = (dict(config.items(antenna + '_Notes'))
+                     if config.has_section(antenna + '_Notes') else None)
+            self.replace(antenna, config.items(sect), notes)
+            antennas.append(antenna)
+        return antennas
+
+    def export_config(self, config):
+        # Every antenna's presets into NAME_Preset sections, and any notes
+        # into NAME_Notes, replacing those already there
+        for antenna in self.antennas():
+            for sect in (antenna + '_Preset', antenna + '_Notes'):
+                if config.has_section(sect):
+                    config.remove_section(sect)
+            config.add_section(antenna + '_Preset')
+            for label, count, notes in self.query(
+                    'SELECT label, count, notes FROM presets WHERE antenna = ? '
+                    'ORDER BY seq', (antenna,)):
+                config.set(antenna + '_Preset', label, str(count))
+                if notes:
+                    if not config.has_section(antenna + '_Notes'):
+                        config.add_section(antenna + '_Notes')
+                    config.set(antenna + '_Notes', label, notes)
+
+class PresetTable(Mapping):
+    # One antenna's presets in the database, label to encoder count in
+    # preset order, with the same search as RPiAntDrv.Presets. Each use
+    # is a query, nothing is loaded up front.
+    def __init__(self, db, antenna):
+        self.db = db
+        self.antenna = antenna
+
+    def __getitem__(self, label):
+        rows = self.db.query('SELECT count FROM presets WHERE antenna = ? '
+                             'AND label = ?', (self.antenna, label))
+        if not rows:
+            raise KeyError(label)
+        return rows[0][0]
+
+    def __len__(self):
+        return self.db.query('SELECT COUNT(*) FROM presets WHERE antenna = ?',
+                             (self.antenna,))[0][0]
+
+    def __iter__(self):
+        return iter([label for label, _count in self.items()])
+
+    def items(self):
+        return self.db.query('SELECT label, count FROM presets WHERE '
+                             'antenna = ? ORDER BY seq', (self.antenna,))
+
+    def values(self):
+        return [count for _label, count in self.items()]
+
+    def notes(self, label):
+        rows = self.db.query('SELECT notes FROM presets WHERE antenna = ? '
+                             'AND label = ?', (self.antenna, label))
+        return rows[0][0] if rows else ''
+
+    def search(self, text, limit=None):
+        # Labels matching PresetQuery text, in order, at most limit of them
+        where = ['antenna = ?']
+        params = [self.antenna]
+        for kind, value, band_prefix in PresetQuery(text).terms:
+            if kind == 'freq':
+                ranges = ['(freq >= ? AND freq < ?)'] * len(value)
+                for low, high in value:
+                    params += [low, high]
+                if band_prefix:
+                    ranges.append('band GLOB ?')
+                    params.append(band_prefix + '*')
+                where.append('(' + ' OR '.join(ranges) + ')')
+            elif kind == 'band':
+                where.append('band GLOB ?')
+                params.append(value + '*')
+            else:
+                where.append("(label LIKE ? ESCAPE '\\' OR "
+                             "notes LIKE ? ESCAPE '\\')")
+                params += [like_pattern(value)] * 2
+        sql = ('SELECT label FROM presets WHERE ' + ' AND '.join(where) +
+               ' ORDER BY seq')
+        if limit is not None:
+            sql += ' LIMIT %d' % limit
+        return [row[0] for row in self.db.query(sql, params)]
+
+    def first(self, prefix):
+        # The preset of that name, or else the first starting with it
+        rows = self.db.query(
+            'SELECT label FROM presets WHERE antenna = ? AND (label = ? OR '
+            'substr(label, 1, ?) = ?) ORDER BY label != ?, seq LIMIT 1',
+            (self.antenna, prefix, len(prefix), prefix, prefix))
+        return rows[0][0] if rows else None
+
+    def count_range(self):
+        # Lowest and highest preset encoder counts, None if there are none
+        low, high = self.db.query('SELECT MIN(count), MAX(count) FROM presets '
+                                  'WHERE antenna = ?', (self.antenna,))[0]
+        return None if low is None else (low, high)
+
+    def frequency_index(self):
+        return FrequencyIndex(None, self.db.query(
+            'SELECT freq, count FROM presets WHERE antenna = ? AND freq IS '
+            'NOT NULL', (self.antenna,)))
+
+def main():
+    import RPiAntDrv
+    parser = argparse.ArgumentParser(
+        description='Move presets in and out of the RPiAntDrv preset '
+        'database.')
+    parser.add_argument('--ini', default=os.path.join(os.path.dirname(
+        os.path.abspath(__file__)), 'RPiAntDrv.ini'),
+        help='ini file naming the database in preset_db (default '
+        'RPiAntDrv.ini next to this script)')
+    parser.add_argument('--db', help='database file (default preset_db '
+                        'from the ini file, or RPiAntDrv.presets)')
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--import', dest='import_file', metavar='FILE',
+                        help='import the _Preset and _Notes sections of an '
+                        'ini file')
+    action.add_argument('--export', metavar='FILE',
+                        help='export to _Preset and _Notes sections of an '
+                        'ini file, other sections in it are kept')
+    action.add_argument('--search', metavar='TEXT',
+                        help='list the presets matching TEXT, e.g. "20m 14.2"')
+    parser.add_argument('--antenna', help='antenna for --search (default '
+                        'last_antenna from the ini file)')
+    args = parser.parse_args()
+    store = RPiAntDrv.ConfigStore(args.ini)
+    store.refresh()
+    path = args.db or os.path.join(os.path.dirname(os.path.abspath(args.ini)),
+                                   store.preset_db or 'RPiAntDrv.presets')
+    try:
+        db = PresetDb(path)
+    except ValueError as e:
+        print (e)
+        return 1
+    if args.import_file is not None:
+        config = configparser.ConfigParser(interpolation=None)
+        if not config.read(args.import_file):
+            print ('Can\'t read %s' % args.import_file)
+            return 1
+        for antenna in db.import_config(config):
+            print ('%s: %d presets' % (antenna, len(db.table(antenna))))
+        if not store.preset_db:
+            print ('Set preset_db = %s in [Settings] to use them' %
+                   os.path.basename(path))
+    elif args.export is not None:
+        config = configparser.ConfigParser(interpolation=None)
+        config.read(args.export)
+        db.export_config(config)
+        with open(args.export, 'w') as f:
+            config.write(f)
+    else:
+        table = db.table(args.antenna or store.last_antenna)
+        for label in table.search(args.search):
+            notes = table.notes(label)
+            print ('%-24s %5d  %s' % (label, table[label], notes))
+    db.close()
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
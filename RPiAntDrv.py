@@ -5,304 +5,1592 @@
 #
 # Python GUI script to control H-Bridge via RPi.
 # H-Bridge drives single DC motor tuned antenna.
+# Run without arguments for the GUI (RPiAntGui.py), or see
+# RPiAntDrv.py --help for one-shot command line control.
 #
 #            Name          Call  Date(s)
 # Authors:   Bill Peterson N7IFC Mar-May2020
 #
 ##################################################################
 
-from tkinter import Tk, ttk, messagebox, Frame, Menu, Label, Button
-from tkinter import Scale, IntVar, StringVar, Toplevel
-from tkinter import RAISED, HORIZONTAL, LEFT, S, W, SW, NW
-from pathlib import Path
+from array import array
+from bisect import bisect_right
+import collections
 import configparser
-import RPi.GPIO as GPIO
+import contextlib
+import math
+import os
+import re
+import sys
+import threading
+import time
+import RPiAntLog
+try:
+    import RPi.GPIO as GPIO
+    GPIO_ERROR = None
+except (ImportError, RuntimeError) as e:
+    # Not running on a Raspberry Pi, or not allowed at the GPIO. Only a
+    # simulated antenna, asked for with --sim, can be driven.
+    GPIO = None
+    GPIO_ERROR = e
 
-class Window(Frame):
-    # Define settings upon initialization
-    def __init__(self, master=None):
+# Default ini file contents, written out by ini_new
+DEFAULT_INI = {}
+# User configurable program settings
+DEFAULT_INI['Settings'] = {'pwm_pin':'19',
+                           'dir1_pin':'13',
+                           'dir2_pin':'15',
+                           'encoder_pin':'11',
+                           'antennas':'Antenna 1, Antenna 2',                              
+                           'last_position':'0',
+                           'last_antenna':'Antenna 1',
+                           'last_preset':'20m 14.400 (037)',
+                           'server_host':'127.0.0.1',
+                           'server_port':'0',
+                           'rig_host':'127.0.0.1',
+                           'rig_port':'4532',
+                           'rig_poll':'0.1',
+                           'telemetry_dir':'telemetry',
+                           'telemetry_files':'2',
+                           'telemetry_size':'1024',
+                           'journal_file':'RPiAntDrv.journal',
+                           'gui_fps':'10',
+                           'chart_seconds':'60',
+                           'preset_db':'',
+                           'rt_priority':'0',
+                           'rt_cpu':'-1',
+                           'rt_lock_memory':'no',
+                           'watchdog_heartbeat':'0.5',
+                           'watchdog_margin':'1.5'}
+
+# Set up default antennas
+DEFAULT_INI['Antenna 1_Config'] = {'pwm_freq':'4000',
+                                   'full_speed':'100',
+                                   'slow_speed':'25',
+                                   'min_duty':'1',
+                                   'stall_time':'250',
+                                   'coast_counts':'0',
+                                   'ramp_time':'0.5',
+                                   'follow_deadband':'1',
+                                   'follow_dwell':'0.25',
+                                   'debounce_min':'5',
+                                   'debounce_max':'40',
+                                   'debounce_ratio':'0.4',
+                                   'stall_detect':'interval',
+                                   'stall_margin':'2.0',
+                                   'binding_ratio':'1.6'}
+
+DEFAULT_INI['Antenna 1_Preset'] = {'maximum    (270)':'270',
+                                   '80m _3.500 (226)':'226',
+                                   '80m _3.580 (221)':'221',
+                                   '80m _3.800 (206)':'206',
+                                   '80m _3.900 (199)':'199',
+                                   '80m _4.000 (192)':'192',
+                                   '60m _5.300 (130)':'130',
+                                   '60m _5.400 (127)':'127',
+                                   '40m _7.035 (091)':'91',
+                                   '40m _7.175 (089)':'89',
+                                   '40m _7.300 (087)':'87',
+                                   '30m 10.000 (056)':'56',
+                                   '30m 10.100 (055)':'55',
+                                   '30m 10.200 (054)':'54',
+                                   '20m 14.000 (039)':'39',
+                                   '20m 14.200 (038)':'38',
+                                   '20m 14.400 (037)':'37',
+                                   '15m 21.275 (019)':'19',
+                                   '12m 24.930 (014)':'14',
+                                   '10m 28.000 (008)':'8',
+                                   '10m 29.700 (006)':'6',
+                                   'minimum    (000)':'0'}        
+
+DEFAULT_INI['Antenna 2_Config'] = {'pwm_freq':'4000',
+                                   'full_speed':'95',
+                                   'slow_speed':'20',
+                                   'min_duty':'1',
+                                   'stall_time':'250',
+                                   'coast_counts':'0',
+                                   'ramp_time':'0.5',
+                                   'follow_deadband':'1',
+                                   'follow_dwell':'0.25',
+                                   'debounce_min':'5',
+                                   'debounce_max':'40',
+                                   'debounce_ratio':'0.4',
+                                   'stall_detect':'interval',
+                                   'stall_margin':'2.0',
+                                   'binding_ratio':'1.6'}
+
+DEFAULT_INI['Antenna 2_Preset'] = {'maximum    (270)':'270',
+                                   '80m _3.700 (200)':'200',
+                                   '60m _5.350 (129)':'129',
+                                   '40m _7.250 (090)':'90',
+                                   '30m 10.100 (055)':'55',
+                                   '20m 14.200 (038)':'38',
+                                   'minimum    (000)':'0'}
+
+# H-bridge and encoder pins, in the order gpioconfig wants them
+PIN_KEYS = ('pwm_pin', 'dir1_pin', 'dir2_pin', 'encoder_pin')
+DEFAULT_PINS = (19, 13, 15, 11)
+
+class EncoderCounter:
+    # Lock free antenna position counter fed by the RPi.GPIO callback thread.
+    # The callback thread is the only writer of count and pulses, everybody
+    # else (GUI, motor_move, motor_stall) only reads them, so no lock or Tk
+    # call is needed on the hot path. Each pulse is also stamped into a
+    # preallocated ring buffer so pulse rate can be worked out later.
+    #
+    # Reed switch bounce is filtered here from the edge timestamps rather
+    # than by RPi.GPIO bouncetime, whose fixed 40 mS lockout limited the
+    # antenna to 25 pulses/s. An edge within window seconds of the last
+    # accepted pulse is a bounce. The window is ratio times the last pulse
+    # interval, kept between window_min and window_cap, so it is long
+    # while the antenna turns slowly and short when it turns fast.
+    def __init__(self, size=1024, clock=time.monotonic):
+        if size & (size - 1):
+            raise ValueError('Ring size must be a power of two')
+        self.clock = clock
+        self.mask = size - 1
+        self.stamps = array('d', bytes(8 * size)) # Pulse monotonic timestamps
+        self.dirs = array('b', bytes(size))       # Pulse direction +1 / -1
+        self.direction = 1                        # Set by motor_up / motor_down
+        self.pulses = 0                           # Total pulses, ring write index
+        self.count = 0                            # Raw signed pulse count
+        self.offset = 0                           # Sync offset applied to count
+        self.trip = None                          # Position that calls on_trip
+        self.on_trip = None                       # Stop callback for trip
+        self.rejected = 0                         # Edges thrown away as bounce
+        self.last_edge = float('-inf')            # Time of the last accepted edge
+        self.debounce(0.005, 0.040, 0.4)
+        
+    def debounce(self, minimum, maximum, ratio):
+        # Debounce window limits in seconds, and the fraction of the pulse
+        # interval it follows. minimum == maximum is a fixed lockout.
+        self.window_min = minimum
+        self.window_max = maximum
+        self.window_cap = maximum     # Lowered by the controller at speed
+        self.window = maximum         # Current window
+        self.ratio = ratio
+        
+    @property
+    def accepted(self):
+        return self.pulses
+    
+    def motor_start(self, now):
+        # Motor started from rest, time the first pulse interval from here.
+        # The last pulse could be long ago and would make the window far
+        # too long for an antenna that is speeding up.
+        self.last_edge = now
+        self.window = self.window_min
+    
+    def edge(self, _channel=None):
+        # Encoder edge callback, throw away bounces then count the pulse
+        now = self.clock()
+        gap = now - self.last_edge
+        if gap < self.window:
+            self.rejected += 1
+            return
+        self.last_edge = now
+        self.window = min(max(self.ratio * gap, self.window_min),
+                          self.window_cap)
+        self.record(now)
+        
+    def pulse(self, _channel=None):
+        # Count a pulse without debouncing
+        self.record(self.clock())
+        
+    def record(self, now):
+        # Do as little as possible in the ISR, get in and get out!
+        i = self.pulses
+        d = self.direction
+        self.stamps[i & self.mask] = now
+        self.dirs[i & self.mask] = d
+        self.count += d
+        # Publish the pulse last so readers never see a half written slot
+        self.pulses = i + 1
+        # Stop right here if a move asked to be tripped at this position
+        if self.count + self.offset == self.trip:
+            self.on_trip()
+        
+    @property
+    def position(self):
+        return self.count + self.offset
+    
+    def sync(self, value):
+        # Only the offset changes, the callback thread still owns count
+        self.offset = value - self.count
+        
+    def last_pulse(self):
+        # Timestamp of the most recent pulse, None if nothing seen yet
+        i = self.pulses
+        if i == 0:
+            return None
+        return self.stamps[(i - 1) & self.mask]
+    
+    def recent(self, n):
+        # Copy of the last n (timestamp, direction) pairs, oldest first
+        end = self.pulses
+        n = min(n, end, self.mask + 1)
+        return [(self.stamps[i & self.mask], self.dirs[i & self.mask])
+                for i in range(end - n, end)]
+
+class MotionController:
+    # Predictive closed loop move to a target encoder count. Duty is ramped
+    # down along a velocity profile worked out from the live pulse rate, and
+    # the stop is issued early from the encoder callback itself, by the
+    # antenna's learned coast distance, so the antenna coasts onto target.
+    def __init__(self, encoder, drive, stop, clock=time.monotonic):
+        self.encoder = encoder
+        self.drive = drive          # drive(direction, duty) callback
+        self.stop = stop            # stop(since) callback, may run in the ISR
+        self.clock = clock
+        self.full_speed = 100       # Cruise PWM duty cycle
+        self.slow_speed = 25        # Final approach PWM duty cycle
+        self.coast = 0.0            # Learned coast distance in counts
+        self.coast_gain = 0.5       # How fast coast learning follows changes
+        self.ramp_time = 0.5        # Seconds of travel spent ramping down
+        self.ramp_min = 5           # Shortest ramp in counts
+        self.slow_counts = 2        # Counts run at slow speed before stopping
+        self.settle_time = 0.3      # No pulses for this long means at rest
+        self.settle = 0.3           # Settle time stretched for slow pulses
+        self.max_retries = 2        # Slow corrections after a miss
+        self.state = 'idle'         # idle, driving or coasting
+        self.status = 'Ready'       # Status text for the GUI
+        self.target = 0             # Target encoder count
+        self.direction = 0          # Direction of the current leg
+        self.ramp = 0               # Ramp length of the current leg
+        self.retries = 0            # Corrections made so far
+        self.tripped = False        # Encoder callback issued the stop
+        self.stop_time = 0.0        # When the stop was issued
+        self.stop_position = 0      # Position when the stop was issued
+        
+    @property
+    def busy(self):
+        return self.state != 'idle'
+    
+    def start(self, target):
+        self.target = target
+        self.retries = 0
+        self.begin_leg()
+        
+    def begin_leg(self):
+        remaining = self.target - self.encoder.position
+        if remaining == 0:
+            self.state = 'idle'
+            self.status = 'We have arrived'
+            return
+        self.direction = 1 if remaining > 0 else -1
+        # Stop point is the target less the coast, but at least one pulse
+        # away so the encoder callback is sure to see it
+        coast = max(0, min(int(self.coast), abs(remaining) - 1))
+        self.ramp = self.ramp_min
+        self.tripped = False
+        self.encoder.on_trip = self.trip
+        self.encoder.trip = self.target - self.direction * coast
+        self.state = 'driving'
+        
+    def trip(self):
+        # Runs on the GPIO callback thread the moment the stop point passes.
+        # The stop is given the stamp of the pulse that tripped it, stops
+        # from tick() are not given one.
+        since = self.encoder.last_pulse()
+        self.stop(self.clock() if since is None else since)
+        self.encoder.trip = None
+        self.stop_time = self.clock()
+        self.stop_position = self.encoder.position
+        self.tripped = True
+        
+    def retarget(self, target):
+        # Change the target of a move in progress without stopping the
+        # motor if it can be helped. Further on in the same direction just
+        # moves the stop point, turning round stops the antenna and the
+        # next leg sets off for the new target.
+        self.target = target
+        self.retries = 0
+        if self.state == 'idle':
+            self.begin_leg()
+            return
+        remaining = (target - self.encoder.position) * self.direction
+        if self.state == 'driving':
+            if remaining > 0:
+                coast = max(0, min(int(self.coast), remaining - 1))
+                self.encoder.trip = target - self.direction * coast
+            else:
+                self.encoder.trip = None   # step() stops the motor
+        elif remaining > int(self.coast) + 1:
+            # Coasting but still well short of the new target, carry on
+            self.begin_leg()
+            
+    def cancel(self):
+        if self.state == 'driving':
+            self.encoder.trip = None
+            self.stop()
+        self.state = 'idle'
+        
+    def rate(self, now):
+        # Pulse rate in pulses/s from the last few encoder timestamps,
+        # falling off as soon as pulses stop arriving
+        recent = self.encoder.recent(4)
+        if len(recent) < 2:
+            return 0.0
+        span = recent[-1][0] - recent[0][0]
+        if span <= 0:
+            return 0.0
+        rate = (len(recent) - 1) / span
+        gap = now - recent[-1][0]
+        if gap * rate > 1.0:
+            rate = 1.0 / gap
+        return rate
+    
+    def step(self, now=None):
+        # Advance the move, returns False once the move has finished
+        if now is None:
+            now = self.clock()
+        if self.state == 'driving':
+            position = self.encoder.position
+            stop_point = self.encoder.trip
+            if self.tripped or stop_point is None or \
+               (stop_point - position) * self.direction <= 0:
+                if not self.tripped:
+                    # Missed pulses or a sync jumped us past the stop point
+                    self.encoder.trip = None
+                    self.stop()
+                    self.stop_time = now
+                    self.stop_position = position
+                # A slow antenna needs longer without pulses to be at rest
+                rate = self.rate(now)
+                self.settle = max(self.settle_time, 2.0 / rate if rate else 0)
+                self.state = 'coasting'
+                self.status = 'Coasting'
+                return True
+            remaining = (stop_point - position) * self.direction
+            # Ramp length follows the fastest pulse rate seen this leg
+            self.ramp = max(self.ramp, self.rate(now) * self.ramp_time)
+            if self.retries:
+                duty = self.slow_speed
+            else:
+                fraction = max(0.0, min(1.0, (remaining - self.slow_counts)
+                                        / self.ramp))
+                duty = int(round(self.slow_speed + fraction *
+                                 (self.full_speed - self.slow_speed)))
+            self.status = 'Full speed' if duty >= self.full_speed \
+                          else 'Slowing down'
+            self.drive(self.direction, duty)
+            if self.tripped:
+                # The callback stopped the motor while we were driving it
+                self.stop()
+            return True
+        if self.state == 'coasting':
+            last = self.encoder.last_pulse() or 0.0
+            if now - max(last, self.stop_time) < self.settle:
+                return True
+            position = self.encoder.position
+            coasted = (position - self.stop_position) * self.direction
+            if self.retries == 0 and coasted >= 0:
+                # Pulses only show whole counts, the antenna actually
+                # stopped somewhere inside the last one
+                coasted += 0.5
+                self.coast += self.coast_gain * (coasted - self.coast)
+            error = self.target - position
+            if error == 0:
+                self.state = 'idle'
+                self.status = 'We have arrived'
+                return False
+            if self.retries >= self.max_retries:
+                self.state = 'idle'
+                self.status = 'Missed by %d' % error
+                return False
+            self.retries += 1
+            self.begin_leg()
+            return self.busy
+        return False
+    
+class StallDetector:
+    # Watches the encoder pulse intervals of a running motor. Intervals
+    # are scaled by duty, so one learned figure covers all speeds, and
+    # kept as an EWMA mean and variance. The motor has stalled once the
+    # time since the last pulse is well past what the statistics allow
+    # at the present duty, or well past the last interval while the motor
+    # is still speeding up or slowing down. Intervals growing at a steady
+    # duty mean the antenna is binding, flagged before it actually stalls.
+    def __init__(self, encoder):
+        self.encoder = encoder
+        self.alpha = 0.3            # EWMA weight of each new interval
+        self.sigma = 4.0            # Standard deviations allowed for
+        self.margin = 2.0           # Allowance for slowing on a duty change
+        self.floor = 0.05           # Shortest bound, callback latency
+        self.binding_ratio = 1.6    # Interval growth that means binding
+        self.mean = None            # EWMA of interval * duty / 100
+        self.var = 0.0              # EWMA variance of the same
+        self.seen = 0               # Encoder pulses taken in so far
+        self.since = 0.0            # Last pulse, or when the motor started
+        self.starting = 0           # Pulses still to come from the start
+        self.last = 0.0             # Last interval, the first from the start
+        self.duty = None            # Duty of the current steady run
+        self.steady = 0             # Pulses in the current steady run
+        self.total = 0.0            # Interval sum for the baseline
+        self.baseline = None        # Mean interval early in the steady run
+        self.fast = 0.0             # Fast EWMA of the interval
+        self.binding = False        # Intervals growing at a steady duty
+        
+    def start(self, now):
+        # Motor started. Spinning up to the first pulse isn't a pulse
+        # interval, nor is the second when the motor was reversed while
+        # the antenna coasted, the first pulse is from the old direction.
+        self.seen = self.encoder.pulses
+        self.since = now
+        self.starting = 2
+        self.duty = None
+        self.binding = False
+        
+    def update(self, duty):
+        # Take in the pulses counted since the last update
+        encoder = self.encoder
+        end = encoder.pulses
+        first = max(self.seen, end - encoder.mask)
+        for i in range(first, end):
+            stamp = encoder.stamps[i & encoder.mask]
+            self.last = stamp - self.since
+            if self.starting:
+                self.starting -= 1
+            else:
+                self.interval(self.last, duty)
+            self.since = stamp
+        self.seen = end
+        
+    def interval(self, dt, duty):
+        scaled = dt * duty / 100.0
+        if self.mean is None:
+            self.mean = scaled
+        else:
+            diff = scaled - self.mean
+            self.mean += self.alpha * diff
+            self.var = (1 - self.alpha) * (self.var + self.alpha * diff * diff)
+        # Binding is only judged at a steady duty, against the intervals
+        # seen early in the run
+        if duty != self.duty:
+            self.duty = duty
+            self.steady = 0
+            self.total = 0.0
+            self.baseline = None
+        self.steady += 1
+        if self.baseline is None:
+            self.total += dt
+            if self.steady == 4:
+                self.baseline = self.fast = self.total / 4
+        else:
+            self.fast += 0.5 * (dt - self.fast)
+            if self.fast > self.binding_ratio * self.baseline:
+                self.binding = True
+            elif self.fast < 1.2 * self.baseline:
+                self.binding = False
+                
+    def bound(self, duty, longest):
+        # Seconds without a pulse that mean a stall, never more than longest
+        if self.starting or self.mean is None or duty <= 0:
+            return longest
+        expected = (self.mean + self.sigma * math.sqrt(self.var)) * 100 / duty
+        return min(longest, max(self.floor, self.margin * expected,
+                                self.margin * self.last))
+    
+    def stalled(self, now, duty, longest):
+        self.update(duty)
+        return now - self.since > self.bound(duty, longest)
+    
+# Preset names carry their frequency in MHz, e.g. '20m 14.200 (038)',
+# and usually start with the band
+FREQ_PATTERN = re.compile(r'(\d+\.\d+)')
+BAND_PATTERN = re.compile(r'\s*(\d+c?m)\b')
+NUMBER_PATTERN = re.compile(r'\d+\.?\d*')
+
+def preset_fields(name):
+    # (band, MHz) from a preset name, '' and None for what it hasn't got
+    band = BAND_PATTERN.match(name)
+    freq = FREQ_PATTERN.search(name)
+    return (band.group(1).lower() if band else '',
+            float(freq.group(1)) if freq else None)
+
+class PresetQuery:
+    # Filter-as-you-type text for picking a preset. Every word narrows the
+    # list down: a band ('20m'), a frequency as far as it has been typed
+    # ('14.2' is 14.200 up to 14.299 MHz, '1' any frequency whose MHz
+    # start with 1 or a band starting with 1), or else any part of the
+    # name. A frequency is a list of (low, high) MHz ranges.
+    def __init__(self, text):
+        self.terms = []
+        for word in text.lower().split():
+            if NUMBER_PATTERN.fullmatch(word):
+                whole, dot, decimals = word.partition('.')
+                low = float(whole + dot + decimals) if decimals else float(whole)
+                if dot:
+                    high = round(low + 10 ** -len(decimals), len(decimals))
+                    self.terms.append(('freq', [(low, high)], None))
+                else:
+                    # 1 is 1 MHz, 10-19 MHz, 100-199 MHz and so on
+                    self.terms.append(('freq', [(low * 10 ** k,
+                                                 (low + 1) * 10 ** k)
+                                                for k in range(5)], whole))
+            elif BAND_PATTERN.fullmatch(word):
+                self.terms.append(('band', word, None))
+            else:
+                self.terms.append(('word', word, None))
+                
+    def matches(self, name, band, freq):
+        for kind, value, band_prefix in self.terms:
+            if kind == 'freq':
+                if not ((freq is not None and
+                         any(low <= freq < high for low, high in value)) or
+                        (band_prefix and band.startswith(band_prefix))):
+                    return False
+            elif kind == 'band':
+                if not band.startswith(value):
+                    return False
+            elif value not in name:
+                return False
+        return True
+    
+class Presets(dict):
+    # Preset name to encoder count, in ini file order, for an antenna with
+    # its presets in its _Preset section. RPiAntDb.PresetTable does the
+    # same for presets kept in the preset database.
+    def __init__(self, *args):
+        dict.__init__(self, *args)
+        self.fields = None         # (name, band, MHz) of each, for search
+        
+    def search(self, text, limit=None):
+        # Names matching PresetQuery text, in order, at most limit of them
+        query = PresetQuery(text)
+        if self.fields is None:
+            self.fields = [(name,) + preset_fields(name) for name in self]
+        names = []
+        for name, band, freq in self.fields:
+            if query.matches(name, band, freq):
+                names.append(name)
+                if len(names) == limit:
+                    break
+        return names
+    
+    def first(self, prefix):
+        # The preset of that name, or else the first starting with it
+        if prefix in self:
+            return prefix
+        return next((name for name in self if name.startswith(prefix)), None)
+    
+    def count_range(self):
+        # Lowest and highest preset encoder counts, None if there are none
+        if not self:
+            return None
+        return min(self.values()), max(self.values())
+    
+    def frequency_index(self):
+        return FrequencyIndex(self)
+    
+
+class FrequencyIndex:
+    # Preset frequencies sorted for bisection, so the encoder count for
+    # any frequency between presets can be interpolated in O(log n),
+    # piecewise linear or with a monotone (Fritsch-Carlson) cubic spline
+    def __init__(self, presets, points=None):
+        # From preset names and counts, or else (MHz, count) pairs
+        if points is None:
+            points = []
+            for name, count in presets.items():
+                match = FREQ_PATTERN.search(name)
+                if match:
+                    points.append((float(match.group(1)), count))
+        grouped = {}
+        for mhz, count in points:
+            grouped.setdefault(mhz, []).append(count)
+        points = grouped
+        self.freqs = sorted(points)
+        # Presets repeated at the same frequency are averaged
+        self.counts = [sum(points[f]) / len(points[f]) for f in self.freqs]
+        self.tangents = None   # Spline slopes, worked out on first use
+        
+    def __len__(self):
+        return len(self.freqs)
+    
+    def segment(self, mhz):
+        # Index i of the preset pair freqs[i] <= mhz <= freqs[i+1]
+        freqs = self.freqs
+        if not freqs or not freqs[0] <= mhz <= freqs[-1]:
+            raise ValueError('%.3f MHz is outside the preset range' % mhz)
+        return max(0, min(bisect_right(freqs, mhz) - 1, len(freqs) - 2))
+    
+    def count(self, mhz, spline=False):
+        # Encoder count for a frequency in MHz
+        if len(self.freqs) == 1:
+            self.segment(mhz)
+            return int(round(self.counts[0]))
+        return int(round(self.value(self.segment(mhz), mhz, spline)))
+    
+    def value(self, i, mhz, spline):
+        f0, f1 = self.freqs[i], self.freqs[i + 1]
+        c0, c1 = self.counts[i], self.counts[i + 1]
+        h = f1 - f0
+        t = (mhz - f0) / h
+        if not spline:
+            return c0 + t * (c1 - c0)
+        if self.tangents is None:
+            self.tangents = self.spline_tangents()
+        m0, m1 = self.tangents[i], self.tangents[i + 1]
+        # Cubic Hermite basis
+        t2 = t * t
+        t3 = t2 * t
+        return ((2 * t3 - 3 * t2 + 1) * c0 + (t3 - 2 * t2 + t) * h * m0 +
+                (-2 * t3 + 3 * t2) * c1 + (t3 - t2) * h * m1)
+    
+    def spline_tangents(self):
+        # Fritsch-Carlson slopes, the curve never overshoots the presets
+        freqs, counts = self.freqs, self.counts
+        n = len(freqs)
+        secants = [(counts[i + 1] - counts[i]) / (freqs[i + 1] - freqs[i])
+                   for i in range(n - 1)]
+        tangents = [secants[0]] + [
+            0.0 if secants[i - 1] * secants[i] <= 0 else
+            (secants[i - 1] + secants[i]) / 2 for i in range(1, n - 1)] + \
+            [secants[-1]]
+        for i, secant in enumerate(secants):
+            if secant == 0:
+                tangents[i] = tangents[i + 1] = 0.0
+                continue
+            a = tangents[i] / secant
+            b = tangents[i + 1] / secant
+            scale = a * a + b * b
+            if scale > 9:
+                scale = 3 / scale ** 0.5
+                tangents[i] = scale * a * secant
+                tangents[i + 1] = scale * b * secant
+        return tangents
+    
+    def counts_for(self, freqs, spline=False):
+        # Encoder counts for a whole list of frequencies at once. Linear
+        # lookups use numpy when it is installed, otherwise the sorted
+        # queries are merged against the presets in a single pass.
+        if not self.freqs and len(freqs):
+            self.segment(freqs[0])    # No presets, ValueError as count()
+        if not spline and len(self.freqs) > 1:
+            try:
+                import numpy
+            except ImportError:
+                numpy = None
+            if numpy is not None:
+                query = numpy.asarray(freqs, dtype=float)
+                if query.size and (query.min() < self.freqs[0] or
+                                   query.max() > self.freqs[-1]):
+                    raise ValueError('Frequency outside the preset range')
+                result = numpy.rint(numpy.interp(query, self.freqs,
+                                                 self.counts))
+                return [int(c) for c in result]
+        order = sorted(range(len(freqs)), key=freqs.__getitem__)
+        result = [0] * len(freqs)
+        i = 0
+        for k in order:
+            mhz = freqs[k]
+            if len(self.freqs) == 1:
+                result[k] = self.count(mhz)
+                continue
+            if not self.freqs[0] <= mhz <= self.freqs[-1]:
+                raise ValueError('%.3f MHz is outside the preset range' % mhz)
+            while i < len(self.freqs) - 2 and self.freqs[i + 1] < mhz:
+                i += 1
+            result[k] = int(round(self.value(i, mhz, spline)))
+        return result
+    
+class AntennaProfile:
+    # Typed copy of one antenna's _Config and _Preset ini file sections.
+    # Presets given are from the preset database and the _Preset section
+    # is left alone.
+    def __init__(self, name, config, presets=None):
+        self.name = name
+        self.config_sect = name + '_Config'
+        self.preset_sect = name + '_Preset'
+        sect = self.config_sect
+        # An antenna with its own H-bridge and encoder has its own pins,
+        # any not given are the [Settings] ones. None for an antenna on
+        # the [Settings] pins, which it shares with any others there.
+        if any(config.has_option(sect, key) for key in PIN_KEYS):
+            self.pins = tuple(config.getint(sect, key, fallback=config.getint(
+                'Settings', key, fallback=default))
+                for key, default in zip(PIN_KEYS, DEFAULT_PINS))
+        else:
+            self.pins = None
+        # Where an antenna with its own pins was left
+        self.last_position = (config.getint (sect,'last_position',fallback=0))
+        self.journal_sequence = (config.getint (sect,'journal_sequence',fallback=0))
+        self.last_preset = (config.get (sect,'last_preset',fallback='None'))
+        self.pwm_freq = (config.getint (sect,'pwm_freq',fallback=4000))
+        self.full_speed = (config.getint (sect,'full_speed',fallback=100))
+        self.slow_speed = (config.getint (sect,'slow_speed',fallback=25))
+        self.min_duty = (config.getint (sect,'min_duty',fallback=1))
+        self.stall_time = (config.getint (sect,'stall_time',fallback=250))
+        self.coast_counts = (config.getfloat (sect,'coast_counts',fallback=0))
+        self.ramp_time = (config.getfloat (sect,'ramp_time',fallback=0.5))
+        # Radio frequency follow, see FrequencyFollower
+        self.follow_deadband = (config.getint (sect,'follow_deadband',fallback=1))
+        self.follow_dwell = (config.getfloat (sect,'follow_dwell',fallback=0.25))
+        # Encoder debounce window limits in mS, see EncoderCounter
+        self.debounce_min = (config.getfloat (sect,'debounce_min',fallback=5))
+        self.debounce_max = (config.getfloat (sect,'debounce_max',fallback=40))
+        self.debounce_ratio = (config.getfloat (sect,'debounce_ratio',fallback=0.4))
+        # 'interval' or 'period' stall detection, see StallDetector
+        self.stall_detect = (config.get (sect,'stall_detect',fallback='interval'))
+        self.stall_margin = (config.getfloat (sect,'stall_margin',fallback=2.0))
+        self.binding_ratio = (config.getfloat (sect,'binding_ratio',fallback=1.6))
+        # 'linear' or 'spline' interpolation between preset frequencies
+        self.interpolation = (config.get (sect,'interpolation',fallback='linear'))
+        # Preset name to encoder count, in ini file order
+        if presets is not None:
+            self.presets = presets
+        elif config.has_section(self.preset_sect):
+            self.presets = Presets((name, int(value)) for name, value
+                                   in config.items(self.preset_sect))
+        else:
+            self.presets = Presets()
+        self.index = None    # FrequencyIndex, built on first use
         
-        # parameters to send through the Frame class. 
-        Frame.__init__(self, master)   
+    def frequency_index(self):
+        if self.index is None:
+            self.index = self.presets.frequency_index()
+        return self.index
+    
+class ConfigStore:
+    # RPiAntDrv.ini parsed once and kept in memory. The file is only parsed
+    # again when its mtime or size changes, and is written back through a
+    # temporary file, fsync and rename so a power cut can't truncate it.
+    def __init__(self, path):
+        self.path = path
+        self.config = configparser.ConfigParser()
+        self.stamp = None          # (mtime, size) of the file last parsed
+        self.profiles = {}         # AntennaProfile cache by antenna name
+        self.preset_store = None   # RPiAntDb.PresetDb once opened
+        self.use(self.config)
         
-        #reference to the master widget, which is the tk window                 
-        self.master = master
+    def refresh(self):
+        # Parse the file again if it has changed, returns True if it was
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self.stamp:
+            return False
+        config = configparser.ConfigParser()
+        config.read (self.path)
+        self.use(config)
+        self.stamp = stamp
+        return True
+    
+    def use(self, config):
+        # Take the settings from a parsed ConfigParser
+        self.config = config
+        self.profiles = {}
+        self.read_settings()
         
-        # Retrieve parent script directory for absolute addressing
-        self.base_path = Path(__file__).parent
-        self.ini_path = str(self.base_path)+'/RPiAntDrv.ini'
-        #print (self.ini_path)
+    def read_settings(self):
+        config = self.config
+        # Retrieve I/O pin assignments
+        self.pwm_pin = (config.getint ('Settings','pwm_pin',fallback=19))
+        self.dir1_pin = (config.getint ('Settings','dir1_pin',fallback=13))
+        self.dir2_pin = (config.getint ('Settings','dir2_pin',fallback=15))
+        self.encoder_pin = (config.getint ('Settings','encoder_pin',fallback=11))
+        # Grab CSV list of antennas
+        # The .strip method removes leading and trailing spaces from .split list
+        _antennas = (config.get('Settings','antennas',fallback="Antenna 1"))
+        self.antennas = [item.strip() for item in _antennas.split(',')]
+        self.last_position = (config.getint('Settings','last_position',fallback=0))
+        # Journal record last_position was also written in, 0 if not known
+        self.journal_sequence = (config.getint('Settings','journal_sequence',fallback=0))
+        self.last_antenna = (config.get('Settings','last_antenna',fallback="Antenna 1"))
+        self.last_preset = (config.get('Settings','last_preset',fallback='None'))
+        # Network control server (RPiAntNet.py), port 0 leaves it off
+        self.server_host = (config.get('Settings','server_host',fallback='127.0.0.1'))
+        self.server_port = (config.getint('Settings','server_port',fallback=0))
+        # rigctld to follow the radio's frequency from
+        self.rig_host = (config.get('Settings','rig_host',fallback='127.0.0.1'))
+        self.rig_port = (config.getint('Settings','rig_port',fallback=4532))
+        self.rig_poll = (config.getfloat('Settings','rig_poll',fallback=0.1))
+        # Telemetry capture files (RPiAntLog.py), 0 files leaves them off
+        self.telemetry_dir = (config.get('Settings','telemetry_dir',fallback='telemetry'))
+        self.telemetry_files = (config.getint('Settings','telemetry_files',fallback=2))
+        self.telemetry_size = (config.getint('Settings','telemetry_size',fallback=1024))
+        # Position journal (RPiAntLog.py), blank leaves it off
+        self.journal_file = (config.get('Settings','journal_file',fallback='RPiAntDrv.journal'))
+        # GUI display refresh rate and strip chart length, 0 seconds leaves
+        # the chart off
+        self.gui_fps = (config.getfloat('Settings','gui_fps',fallback=10.0))
+        self.chart_seconds = (config.getfloat('Settings','chart_seconds',fallback=60.0))
+        # Preset database (RPiAntDb.py), blank keeps the presets in the
+        # _Preset sections
+        self.preset_db = (config.get('Settings','preset_db',fallback=''))
+        # Control thread SCHED_FIFO priority (0 leaves it off), CPU to pin
+        # it to (-1 for any) and whether to lock the program in memory
+        self.rt_priority = (config.getint('Settings','rt_priority',fallback=0))
+        self.rt_cpu = (config.getint('Settings','rt_cpu',fallback=-1))
+        self.rt_lock_memory = (config.getboolean('Settings','rt_lock_memory',fallback=False))
+        # Motor watchdog deadlines, 0 turns either off: seconds without a
+        # tick while the motor runs, and how many times the expected run
+        # time a move may take
+        self.watchdog_heartbeat = (config.getfloat('Settings','watchdog_heartbeat',fallback=0.5))
+        self.watchdog_margin = (config.getfloat('Settings','watchdog_margin',fallback=1.5))
+        
+    def profile(self, name):
+        # Typed settings and presets for an antenna, built on first use
+        profile = self.profiles.get(name)
+        if profile is None:
+            profile = self.profiles[name] = AntennaProfile(
+                name, self.config, self.preset_table(name))
+        return profile
+    
+    def preset_table(self, name):
+        # The antenna's presets from the preset database, None if they are
+        # in its _Preset section. A new database starts off with a copy of
+        # every _Preset section. Raises ValueError if it can't be opened.
+        if not self.preset_db:
+            return None
+        path = os.path.join(os.path.dirname(os.path.abspath(self.path)),
+                            self.preset_db)
+        if self.preset_store is None or self.preset_store.path != path:
+            import RPiAntDb
+            if self.preset_store is not None:
+                self.preset_store.close()
+            self.preset_store = RPiAntDb.PresetDb(path)
+            if self.preset_store.created:
+                self.preset_store.import_config(self.config)
+        return self.preset_store.table(name)
+    
+    def set(self, section, key, value):
+        # Note: Anything written must be a string value
+        self.config.set(section, key, value)
+        self.changed(section)
+        
+    def remove(self, section, key):
+        if self.config.remove_option(section, key):
+            self.changed(section)
+            
+    def changed(self, section):
+        # Parsed settings from a section that has been changed are stale
+        if section == 'Settings':
+            self.read_settings()
+        else:
+            self.profiles.pop(section.rsplit('_', 1)[0], None)
+            
+    def write_defaults(self):
+        config = configparser.ConfigParser()
+        config.read_dict(DEFAULT_INI)
+        self.use(config)
+        self.save()
+        
+    def save(self):
+        # Write a complete new file then rename it over the old one
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as configfile:
+            self.config.write(configfile)
+            configfile.flush()
+            os.fsync(configfile.fileno())
+        os.replace(tmp_path, self.path)
+        # Make the rename itself stick
+        try:
+            dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)),
+                             os.O_RDONLY)
+        except OSError:
+            pass
+        else:
+            try:
+                os.fsync(dir_fd)
+            except OSError:
+                pass
+            os.close(dir_fd)
+        stat = os.stat(self.path)
+        self.stamp = (stat.st_mtime_ns, stat.st_size)
+        
+class AntennaController:
+    # Everything needed to drive one antenna without a GUI: ini file,
+    # GPIO, encoder count, stall detection and preset moves. The GUI and
+    # the command line both wrap this. tick() does the periodic control
+    # work and has to be called every tick_period seconds while busy.
+    # Given an antenna, it drives only that one, on the pins from its
+    # _Config section, otherwise the antennas on the [Settings] pins.
+    def __init__(self, ini_path=None, gpio=None, clock=time.monotonic,
+                 simulate=False, antenna=None):
+        if ini_path is None:
+            # Default to the ini file next to this script
+            ini_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    'RPiAntDrv.ini')
+        self.ini_path = ini_path
+        self.store = ConfigStore(ini_path) # Parsed ini file
+        self.gpio = gpio if gpio is not None else GPIO
+        self.simulate = simulate          # Use RPiAntSim when there's no GPIO
+        self.own_pins = antenna           # Antenna with pins of its own, if any
+        self.clock = clock
         
         # Raspberry Pi I/O pins get reassigned when ini file is read
+        self.pwm_pin = 19
+        self.dir1_pin = 13
+        self.dir2_pin = 15
+        self.encoder_pin = 11
         self.pwm_freq = 4000   # PWM Freq in Hz
         self.pwm_duty = 0      # PWM Duty in percent, default to 0%
         self.stall_time = 250  # Motor stall time in mS
+        self.pwm_set = None    # GPIO PWM channel once gpioconfig has run
         
-        self.encoder_count = IntVar()     # Antenna reed switch count
-        self.encoder_count.set(0)
+        self.encoder = EncoderCounter(clock=clock) # Antenna reed switch counter
+        self.tick_period = 0.02           # Control period in seconds
         self.motor_running = False        # Motor running flag
         self.motor_stalled = False        # Motor stalled flag
-        self.stall_active = False         # Stall detection active
         self.stall_count = 0              # Encoder count during stall detection
+        self.stall_deadline = 0.0         # When the next stall check is due
+        self.stall_since = 0.0            # When stall_count was taken
+        self.full_rate = 0.0              # Learned pulses/s at 100% duty
+        self.stall_detect = 'interval'    # Pulse interval or period stall check
+        self.stall = StallDetector(self.encoder) # Pulse interval stall check
+        self.stall_monitor = None         # StallMonitor thread once started
+        self.watchdog = None              # MotorWatchdog thread once started
+        self.heartbeat = 0.0              # Last tick(), for the watchdog
+        self.run_deadline = math.inf      # When the running motor must be off
+        self.cut_reason = None            # Deadline the watchdog cut the motor on
+        self.binding = False              # Antenna binding warning
+        self.telemetry = RPiAntLog.Telemetry(self.encoder) # Flight recorder
+        self.telemetry_writer = None      # TelemetryWriter once started
+        self.journal_writer = None        # JournalWriter once started
+        self.journal_behind = False       # Journal to catch up with the ini file
         self.full_speed = 100             # Full speed PWM duty cycle
         self.slow_speed = 25              # Slow speed PWM duty cycle
+        self.min_duty = 1                 # Lowest duty that turns the motor
         self.antenna_raising = False      # Motor direction flag
+        self.antennas = []                # Antenna names from the ini file
+        self.antenna = 'Antenna 1'        # Selected antenna
+        self.presets = Presets()          # Preset name to encoder count
+        self.profile = None               # AntennaProfile of the antenna
+        self.spline = False               # Spline rather than linear lookup
+        self.follow_deadband = 1          # Counts off target ignored when following
+        self.follow_dwell = 0.25          # VFO still time before small moves
+        self.follower = None              # FrequencyFollower when following the radio
+        self.preset = 'None'              # Selected preset
         self.ant_config_sect = ("null")   # Active ini file config section
         self.ant_preset_sect = ("null")   # Active ini file preset section
         self.ant_preset_val = 0           # Preset encoder target value from ini presets
-        self.status_message = StringVar() # Status message text for text_2
-        
-        # Run init_window, which doesn't yet exist
-        self.init_window()
-        
-    #Creation of init_window
-    def init_window(self):
-        self.master.title('RPi Antenna Driver (v1.6)')
-        # Set up root window & size (width x height + x_offset + y_offset)
-        self.bg_color = 'azure'
-        self.master.geometry("350x275+150+100")
-        self.master.configure(bg= self.bg_color)
-        
-        # Create menu entry and sub-options
-        menubar = Menu(self.master)
-        self.master.config(menu=menubar)        
-        filemenu = Menu(menubar, tearoff=0)
-        filemenu.add_command(label="Open", command=self.about)
-        filemenu.add_command(label="Save", command=self.about)
-        filemenu.add_command(label="Save as...", command=self.about)
-        filemenu.add_separator()
-        filemenu.add_command(label="Quit", command=self.close)
-        menubar.add_cascade(label="File", menu=filemenu)
-        
-        editmenu = Menu(menubar, tearoff=0)
-        editmenu.add_command(label="Default ini", command=self.confirm_newini)
-        editmenu.add_command(label="Sync Count", command=self.confirm_sync)
-        editmenu.add_command(label="Undefined 2", command=self.about)
-        menubar.add_cascade(label="Edit", menu=editmenu)
-        
-        helpmenu = Menu(menubar, tearoff=0)
-        helpmenu.add_command(label="About", command=self.about)
-        menubar.add_cascade(label="Help", menu=helpmenu)
-        
-        text_1 = Label(textvariable=self.encoder_count, font = ('Helvetica', 30),
-                       bg = self.bg_color, fg='black', pady=5, height=1)
-        text_1.grid(row=0, column=0, rowspan=2, pady=1, sticky=S)
-        
-        text_2 = Label(text='Status:', font = ('Helvetica', 14),
-                       bg = self.bg_color, fg='black', height=1,
-                       anchor=SW, width=22, justify=LEFT)
-        text_2.grid(row=0, column=1, columnspan=1, sticky=SW)
-        
-        text_3 = Label(textvariable=self.status_message, font = ('Helvetica', 12),
-                       bg='white', fg='black', height=1, anchor=NW, width=22,
-                       borderwidth=1, relief="solid")
-        text_3.grid(row=1, column=1, sticky=NW)
-        
-        text_4 = Label(text='Motor Speed (%):', font = ('Helvetica', 14),
-                       bg = self.bg_color, fg='black', padx=1, height=1,
-                       anchor=SW, width=22, justify=LEFT)
-        text_4.grid(row=2, column=1, columnspan=1, sticky=S)
-        
-        text_5 = Label(text='Antenna Selection:', font = ('Helvetica', 14),
-                       bg = self.bg_color, fg='black', padx=1, height=1,
-                       anchor=SW, width=22, justify=LEFT)
-        text_5.grid(row=4, column=1, columnspan=1, sticky=S)
-        
-        text_6 = Label(text='Preset Selection:',  font = ('Helvetica', 14),
-                       bg = self.bg_color, fg='black', padx=1, height=1,
-                       anchor=W, width=22, justify=LEFT)
-        text_6.grid(row=6, column=1, columnspan=1, sticky=S)
-        
-        self.raise_button = Button(text='Raise', relief=RAISED, bd=4, padx=1,
-               pady=1, height=2, width=6, font=('Helvetica', 14))
-        self.raise_button.grid(row=2, column=0, padx=20, pady=5, rowspan=2)
-        self.raise_button.bind("<ButtonPress>", self.raise_button_press)
-        self.raise_button.bind("<ButtonRelease>", self.RL_button_release)
-        
-        self.lower_button = Button(text='Lower', relief=RAISED, bd=4, padx=1,
-               pady=1, height=2, width=6, font=('Helvetica', 14))
-        self.lower_button.grid(row=4, column=0, padx=20, pady=5, rowspan=2)
-        self.lower_button.bind("<ButtonPress>", self.lower_button_press)
-        self.lower_button.bind("<ButtonRelease>", self.RL_button_release)
-        
-        self.preset_button = Button(text='Preset', relief=RAISED, bd=4, padx=1,
-               pady=1, height=2, width=6, font=('Helvetica', 14))
-        self.preset_button.grid(row=6, column=0, padx=5, pady=5, rowspan=2)
-        self.preset_button.bind("<ButtonPress>", self.preset_button_press)
-        
-        self.duty_scale = Scale(from_=1, to=100, orient = HORIZONTAL,
-                                resolution = 1, length=200,
-                                command = self.update_pwm_duty)
-        self.duty_scale.grid(row=3,column=1, sticky=NW)
-        
-        # Antenna preset combo box is populated with values from ini file
-        self.antenna_combobox = ttk.Combobox(width=19, font=('Helvetica', 14),
-                                            state='readonly')
-        self.antenna_combobox.grid(row=5, column=1, sticky=NW)
-        self.antenna_combobox.bind("<<ComboboxSelected>>", self.get_antenna_val)
-        
-        # Antenna preset combo box is populated with values from ini file
-        self.preset_combobox = ttk.Combobox(width=19, font=('Helvetica', 14),
-                                            state='readonly')
-        self.preset_combobox.grid(row=7, column=1, sticky=NW)
-        self.preset_combobox.bind("<<ComboboxSelected>>", self.get_preset_val)
-        
-        self.ini_test ()  # Check for ini file existence
-        self.ini_read()   # Retrieve ini file settings       
-        self.gpioconfig() # Set up GPIO for antenna control
-        
-        return
-        
-    def raise_button_press(self, _unused):
-        self.motor_stalled = 0
-        self.motor_up ()
-        
-    def lower_button_press(self, _unused):
-        self.motor_stalled = 0
-        self.motor_down ()
-        
-    def RL_button_release(self, _unused):
-        self.motor_stop ()
-        self.status_message.set ("Ready")
-        
-    def preset_button_press(self, _unused):
-        self.motor_stalled = 0
-        self.motor_move()
-        
-    def confirm_newini(self):
-        okay = messagebox.askokcancel('RPiAntDrv',
-                                        'Overwrite Configuration File?',
-                                        detail='This will overwrite the '
-                                      'RPiAntDrv.ini file with default '
-                                      'values.', icon='question')
-        if okay:
-            # Overwrite the ini file and refresh values
-            self.ini_new()
-            self.ini_read()
-            self.status_message.set ("RPiAntDrv.ini written")
+        self.status = 'Ready'             # Status message text
+        self.lock = threading.RLock()     # Held by commands and tick()
+        self.requested = None             # When the command being run was given
+        self.command_latency = RPiAntLog.LatencyHistogram('Command') # To GPIO
+        self.stop_latency = RPiAntLog.LatencyHistogram('Stop') # To motor off
+        # Preset moves are run by the predictive motion controller
+        self.motion = MotionController(self.encoder, self.motion_drive,
+                                       self.motion_stop, clock=clock)
+        
+    def load(self, config=None):
+        # Read the ini file, creating it first if need be, and restore the
+        # last antenna, preset and position. A ConfigParser may be given
+        # instead of reading the file.
+        store = self.store
+        if config is None:
+            self.ini_test()
+            store.refresh()
         else:
-            self.status_message.set ("Operation cancelled")
+            store.use(config)
+        if self.own_pins is None:
+            # Retrieve I/O pin assignments
+            self.pwm_pin = store.pwm_pin
+            self.dir1_pin = store.dir1_pin
+            self.dir2_pin = store.dir2_pin
+            self.encoder_pin = store.encoder_pin
+            self.antennas = self.pin_antennas()
+            self.antenna = store.last_antenna
+            if self.antenna not in self.antennas and self.antennas:
+                self.antenna = self.antennas[0]
+            position = store.last_position
+            sequence = store.journal_sequence
+            self.preset = store.last_preset
+        else:
+            profile = store.profile(self.own_pins)
+            if profile.pins is None:
+                raise ValueError('%s has no pins of its own' % self.own_pins)
+            (self.pwm_pin, self.dir1_pin, self.dir2_pin,
+             self.encoder_pin) = profile.pins
+            self.antennas = self.pin_antennas()
+            self.antenna = self.own_pins
+            position = profile.last_position
+            sequence = profile.journal_sequence
+            self.preset = profile.last_preset
+        # Restore the encoder count to preset value
+        self.encoder.sync (position)
+        if config is None:
+            self.recover(position, sequence)
+        self.ant_preset_val = self.encoder.position
+        # refresh antenna settings and presets
+        self.ant_refresh()
+        
+    def start(self, monitor=True, record=True):
+        # Claim the GPIO pins, falling back to a simulated antenna if asked.
+        # Stalls and the watchdog deadlines are watched for on threads of
+        # their own unless monitor is False, when tick() has to keep up with
+        # stalls and there is no watchdog. The position journal
+        # and telemetry are written unless record is False or they are
+        # turned off.
+        if self.gpio is None:
+            if not self.simulate:
+                raise RuntimeError('RPi.GPIO is not available (%s)' %
+                                   GPIO_ERROR)
+            from RPiAntSim import simulated_gpio
+            self.gpio = simulated_gpio(self.pins,
+                                       position=self.encoder.position)
+        self.gpioconfig()
+        if monitor and self.stall_monitor is None:
+            self.stall_monitor = StallMonitor(self)
+            self.stall_monitor.start()
+        if monitor and self.watchdog is None and (
+                self.store.watchdog_heartbeat > 0 or
+                self.store.watchdog_margin > 0):
+            self.watchdog = MotorWatchdog(self)
+            self.watchdog.start()
+        if record and self.telemetry_writer is None:
+            self.record()
             
-    def confirm_sync(self):
-        okay = messagebox.askokcancel('RPiAntDrv',
-                                        'Proceed with Sync?',
-                                        detail='This will sychronize the '
-                                      'antenna encoder count to the preset '
-                                      'value selected.', icon='question')
-        if okay:
-            # Sychronize encoder count with current preset value
-            self.encoder_count.set(self.ant_preset_val)
-            self.status_message.set ("Encoder syncronized")
+    def pin_antennas(self):
+        # The antennas driven on this controller's pins. Antennas with pins
+        # of their own have controllers of their own.
+        store = self.store
+        if self.own_pins is not None:
+            return [self.own_pins]
+        return [name for name in store.antennas
+                if store.profile(name).pins is None]
+    
+    @property
+    def pins(self):
+        return (self.pwm_pin, self.dir1_pin, self.dir2_pin, self.encoder_pin)
+    
+    @property
+    def freq_index(self):
+        # Preset frequency lookup of the antenna, built on first use so
+        # an antenna with thousands of presets is quick to pick
+        if self.profile is None:
+            return FrequencyIndex({})
+        return self.profile.frequency_index()
+    
+    def journal_path(self):
+        # Position journal next to the ini file, None if it's turned off.
+        # An antenna with its own pins has its own journal.
+        name = self.store.journal_file
+        if not name:
+            return None
+        if self.own_pins is not None:
+            root, ext = os.path.splitext(name)
+            name = '%s-%s%s' % (root, self.own_pins, ext)
+        return os.path.join(os.path.dirname(os.path.abspath(self.ini_path)),
+                            name)
+    
+    def recover(self, position, sequence):
+        # The ini file has the position from the last clean close, along
+        # with the sequence number of the journal record that has it too.
+        # The journal has it from the last time the antenna came to rest.
+        # If the journal has gone on past that record the antenna moved
+        # after the ini file was saved, and the journal has the last word
+        # unless the position in the ini file has been edited by hand.
+        # Saving the ini file for anything else, a calibration or a new
+        # antenna, leaves both alone. An ini file from before the sequence
+        # was kept wins if it is newer than the journal.
+        path = self.journal_path()
+        if path is None:
+            return
+        journal = RPiAntLog.PositionJournal(path)
+        if sequence:
+            found = journal.since(sequence)
+            if found is None:
+                return
+            newest, count, antenna, saved = found
+            if newest <= sequence or saved not in (None, position):
+                # The ini file wins. Once the journal is open it is brought
+                # into line with the ini file, or next time it would look
+                # as if the antenna had moved since.
+                self.journal_behind = (count != position or antenna !=
+                                       RPiAntLog.antenna_key(self.antenna))
+                return
         else:
-            self.status_message.set ("Encoder sync canceled")
+            try:
+                if os.stat(path).st_mtime_ns < \
+                   os.stat(self.ini_path).st_mtime_ns:
+                    return
+            except OSError:
+                return
+            found = journal.recover()
+            if found is None:
+                return
+            count, antenna = found
+        for name in self.antennas:
+            if RPiAntLog.antenna_key(name) == antenna:
+                self.antenna = name
+                break
+        if count != self.encoder.position:
+            self.encoder.sync(count)
+            self.status = "Position %d recovered" % count
+            
+    def journal_state(self):
+        # (count, antenna, moving) for the journal writer, still moving
+        # until the pulses have stopped for half a second after the motor
+        last = self.encoder.last_pulse() or 0.0
+        moving = bool(self.motor_running or self.motion.busy or
+                      self.clock() - last < 0.5)
+        return self.encoder.position, self.antenna, moving
+    
+    def record(self):
+        # Start writing the position journal, and telemetry to the capture
+        # files in telemetry_dir next to the ini file
+        store = self.store
+        path = self.journal_path()
+        if path is not None and self.journal_writer is None:
+            journal = RPiAntLog.PositionJournal(path)
+            try:
+                journal.open()
+            except OSError as e:
+                self.status = "Journal: %s" % (e.strerror or e)
+            else:
+                self.journal_writer = RPiAntLog.JournalWriter(
+                    journal, self.journal_state, clock=self.clock)
+                self.journal_writer.start()
+                if self.journal_behind:
+                    self.journal_behind = False
+                    self.ini_update()
+        if store.telemetry_files < 1:
+            return
+        directory = os.path.join(os.path.dirname(os.path.abspath(
+            self.ini_path)), store.telemetry_dir)
+        if self.own_pins is not None:
+            directory = os.path.join(directory, self.own_pins)
+        try:
+            files = RPiAntLog.TelemetryFiles(directory, store.telemetry_files,
+                                             store.telemetry_size * 1024)
+        except OSError as e:
+            self.status = "Telemetry: %s" % (e.strerror or e)
+            return
+        self.telemetry_writer = RPiAntLog.TelemetryWriter(self.telemetry,
+                                                          files)
+        self.telemetry_writer.start()
+        
+    def select_antenna(self, name):
+        # fetch new antenna configuration and presets, stopping anything
+        # that is moving first as the settings it runs on are changing
+        if name not in self.antennas:
+            raise ValueError('%s is not on pins %s' % (
+                name, ', '.join(map(str, self.pins))))
+        with self.lock:
+            if self.motor_running or self.motion.busy:
+                self.halt()
+            self.store.refresh()
+            self.antenna = name
+            self.ant_refresh()
+            if self.pwm_set is not None:
+                self.pwm_set.ChangeFrequency(self.pwm_freq)
+                
+    def select_preset(self, name):
+        # get the preset value from the ini file, re-read only if edited
+        with self.lock:
+            if self.store.refresh():
+                self.antennas = self.pin_antennas()
+                self.ant_refresh()
+            self.ant_preset_val = self.presets[name]
+            self.preset = name
+        
+    def ant_refresh (self):
+        # Using selected antenna refresh antenna settings and presets
+        profile = self.profile = self.store.profile(self.antenna)
+        self.ant_config_sect = profile.config_sect
+        self.ant_preset_sect = profile.preset_sect
+        self.pwm_freq = profile.pwm_freq
+        self.full_speed = profile.full_speed
+        self.slow_speed = profile.slow_speed
+        self.min_duty = profile.min_duty
+        self.stall_time = profile.stall_time
+        self.motion.full_speed = self.full_speed
+        self.motion.slow_speed = self.slow_speed
+        self.motion.coast = profile.coast_counts
+        self.motion.ramp_time = profile.ramp_time
+        self.presets = profile.presets
+        self.spline = profile.interpolation.lower() == 'spline'
+        self.follow_deadband = profile.follow_deadband
+        self.follow_dwell = profile.follow_dwell
+        self.encoder.debounce(profile.debounce_min / 1000,
+                              profile.debounce_max / 1000,
+                              profile.debounce_ratio)
+        self.full_rate = 0.0
+        self.stall_detect = profile.stall_detect.lower()
+        self.stall = StallDetector(self.encoder)   # Forget the old antenna
+        self.stall.margin = profile.stall_margin
+        self.stall.binding_ratio = profile.binding_ratio
+        if self.follower is not None:
+            self.follower.reset()   # Counts differ between antennas
+        
+    @contextlib.contextmanager
+    def command(self, since=None):
+        # Commands may come from the GUI, the network server or the command
+        # line, each takes the lock so they can't interleave with tick().
+        # The first GPIO write of the command is timed from since, when it
+        # was queued, or else from here, waiting for the lock included.
+        # A command run by another is timed from the outer one.
+        if since is None:
+            since = self.clock()
+        with self.lock:
+            outer = self.requested is not None
+            if not outer:
+                self.requested = since
+            try:
+                yield
+            finally:
+                if not outer:
+                    self.requested = None
+                
+    def raise_antenna(self):
+        with self.command():
+            self.motor_stalled = 0
+            self.cut_reason = None
+            self.motion.cancel ()  # Manual control overrides a preset move
+            # Below min_duty the motor would sit powered but not turning
+            self.pwm_duty = max(self.pwm_duty, self.min_duty)
+            self.telemetry.event(RPiAntLog.MANUAL, self.encoder.position,
+                                 self.pwm_duty, 1)
+            self.motor_up ()
+            
+    def lower_antenna(self):
+        with self.command():
+            self.motor_stalled = 0
+            self.cut_reason = None
+            self.motion.cancel ()
+            self.pwm_duty = max(self.pwm_duty, self.min_duty)
+            self.telemetry.event(RPiAntLog.MANUAL, self.encoder.position,
+                                 self.pwm_duty, -1)
+            self.motor_down ()
+            
+    def release(self):
+        # Raise or Lower let go, a preset move started since carries on
+        with self.command():
+            if self.motion.busy:
+                return
+            self.motor_stop ()
+            self.status = "Ready"
+            
+    def halt(self):
+        # Stop whatever is moving the antenna, preset move or manual
+        with self.command():
+            self.telemetry.event(RPiAntLog.HALT, self.encoder.position)
+            self.motion.cancel()
+            self.motor_stop()
+            self.status = "Stopped"
+            
+    def goto(self, count):
+        # Start a move to an encoder count, tick() carries it out. A move
+        # already under way is retargeted rather than stopped and started
+        # again, so pressing Preset twice is the same as pressing it once.
+        with self.command():
+            self.ant_preset_val = count
+            if self.motion.busy and not self.motor_stalled and \
+               self.cut_reason is None:
+                if count != self.motion.target:
+                    self.retarget(count)
+                return
+            self.motor_stalled = 0
+            self.cut_reason = None
+            self.telemetry.event(RPiAntLog.GOTO, count)
+            self.motion.start(count)
+            self.tick()
+            
+    def retarget(self, count):
+        # Move the stop point of the move under way. The watchdog's run
+        # time is worked out again for the distance now ahead.
+        self.ant_preset_val = count
+        self.telemetry.event(RPiAntLog.RETARGET, count)
+        self.motion.retarget(count)
+        if self.motor_running:
+            self.run_deadline = self.clock() + self.run_limit()
+            
+    def goto_preset(self, name):
+        with self.lock:
+            self.select_preset(name)
+            self.goto(self.ant_preset_val)
+            
+    def band_preset(self, band):
+        # Preset for a band, the one of that name or else the first whose
+        # name starts with it, None if there isn't one
+        return self.presets.first(band)
+    
+    def goto_frequency(self, mhz):
+        # Move to any frequency between presets, raises ValueError if the
+        # frequency is outside the presets of this antenna
+        with self.lock:
+            self.goto(self.freq_index.count(mhz, self.spline))
+            
+    def follow(self, on=True):
+        # Keep the antenna tuned to the radio's frequency, which is passed
+        # to follower.update() by whatever is watching the radio
+        with self.lock:
+            if on:
+                if self.follower is None:
+                    self.follower = FrequencyFollower(self)
+            else:
+                self.follower = None
+                
+    def sync(self, count):
+        # Sychronize encoder count with a known position
+        with self.lock:
+            self.encoder.sync(count)
+            self.telemetry.event(RPiAntLog.SYNC, count)
+            self.status = "Encoder syncronized"
         
     def motor_up(self):
+        if self.cut_reason is not None:
+            return          # Watchdog cut it, wait for the next command
         # We can change speed on the fly
         self.pwm_set.ChangeDutyCycle(self.pwm_duty)
         # If motor is not already running and in correct direction
         if not(self.motor_running and self.antenna_raising):
             # check reverse motor lead flag
-            GPIO.output(self.dir1_pin, GPIO.HIGH) # Run motor FWD
-            GPIO.output(self.dir2_pin, GPIO.LOW)
+            self.encoder.direction = 1            # Count pulses up
+            self.gpio.output(self.dir1_pin, self.gpio.HIGH) # Run motor FWD
+            self.gpio.output(self.dir2_pin, self.gpio.LOW)
             self.antenna_raising = 1
             self.motor_running = 1
             # Initialize stall counter and start stall timer
-            self.motor_stall()
+            self.stall_start()
+            self.telemetry.motor(RPiAntLog.UP, self.encoder.position,
+                                 self.pwm_duty)
+        else:
+            self.telemetry.change_duty(self.encoder.position, self.pwm_duty, 1)
+        self.debounce_cap()
+        self.command_done()
         
     def motor_down(self):
+        if self.cut_reason is not None:
+            return
         # We can change speed on the fly
         self.pwm_set.ChangeDutyCycle(self.pwm_duty)
         # If motor is not running and in correct direction
         if not(self.motor_running and not self.antenna_raising):
-            GPIO.output(self.dir1_pin, GPIO.LOW) # Run motor
-            GPIO.output(self.dir2_pin, GPIO.HIGH)
+            self.encoder.direction = -1          # Count pulses down
+            self.gpio.output(self.dir1_pin, self.gpio.LOW) # Run motor
+            self.gpio.output(self.dir2_pin, self.gpio.HIGH)
             self.motor_running = 1
             self.antenna_raising = 0
             # Initialize stall detection
-            self.motor_stall()
+            self.stall_start()
+            self.telemetry.motor(RPiAntLog.DOWN, self.encoder.position,
+                                 self.pwm_duty)
+        else:
+            self.telemetry.change_duty(self.encoder.position, self.pwm_duty, -1)
+        self.debounce_cap()
+        self.command_done()
         
-    def motor_stop(self):
-        GPIO.output(self.dir1_pin, GPIO.LOW) # Stop motor
-        GPIO.output(self.dir2_pin, GPIO.LOW)
+    def motor_stop(self, since=None):
+        # since is when the reason to stop arose, the command if not given
+        running = self.motor_running
+        if running:
+            self.telemetry.event(RPiAntLog.STOP, self.encoder.position)
+        self.gpio.output(self.dir1_pin, self.gpio.LOW) # Stop motor
+        self.gpio.output(self.dir2_pin, self.gpio.LOW)
         self.pwm_set.ChangeDutyCycle(0)      # Kill PWM
         self.motor_running = 0
-        #self.ini_update()
-
-    def motor_stall(self):
-        # Set stall period proportional to motor speed
-        self.stall_period = int((100 / self.duty_scale.get())* self.stall_time)
-        # If motor is still running, perform stall check
-        if (self.motor_running):
-            # If stall detection is not already active
-            if not(self.stall_active):
-                self.stall_count = self.encoder_count.get()
-                self.stall_active = 1
-                self.master.after(self.stall_period, self.motor_stall)
-            # Otherwise see if we stalled
-            elif (self.stall_count == self.encoder_count.get()):
-                self.motor_stalled = 1
-                self.motor_stop()
-                self.stall_active = 0
-                self.status_message.set ("! Antenna Stalled !")
-            # Else reset stall count and timer
-            else:
-                self.stall_count = self.encoder_count.get()
-                self.master.after(self.stall_period, self.motor_stall)
-        else:
-            self.stall_active = 0
+        self.encoder.window_cap = self.encoder.window_max  # Slowing down now
+        if since is None:
+            since = self.command_done()
+        if running and since is not None:
+            self.stop_latency.record(self.latency(RPiAntLog.STOP_LATENCY,
+                                                  since))
             
-    def motor_move(self):
-        # If motor is stalled, exit
-        if (self.motor_stalled == 1):
-            return
-        # If encoder count = preset, stop and exit
-        if self.encoder_count.get() == (self.ant_preset_val):
-            self.motor_stop()
-            self.status_message.set ("We have arrived")
+    def watchdog_cut(self, deadline=None, since=None):
+        # Hard stop from the watchdog thread, without the lock. The deadline
+        # missed is latched before the pins go off, so nothing drives the
+        # motor again until the next Raise, Lower or move. Called again
+        # with no deadline if something started the motor regardless.
+        if deadline is not None:
+            self.cut_reason = deadline
+        self.gpio.output(self.dir1_pin, self.gpio.LOW)
+        self.gpio.output(self.dir2_pin, self.gpio.LOW)
+        self.pwm_set.ChangeDutyCycle(0)
+        self.motor_running = 0
+        if deadline is None:
             return
-        # If encoder count within 5 counts of preset, slow down
-        Lval= (self.ant_preset_val -5)
-        Hval= (self.ant_preset_val +6)
-        if self.encoder_count.get() in range(Lval, Hval):
-            self.status_message.set ("Slowing down")
-            self.duty_scale.set(self.slow_speed)
-        # Else run full speed    
+        self.telemetry.event(RPiAntLog.WATCHDOG, self.encoder.position,
+                             self.pwm_duty, deadline)
+        self.stop_latency.record(self.latency(RPiAntLog.STOP_LATENCY, since))
+        if deadline == RPiAntLog.HEARTBEAT_DEADLINE:
+            self.status = "! Watchdog: heartbeat !"
         else:
-            self.status_message.set ("Full speed")
-            self.duty_scale.set(self.full_speed)
+            self.status = "! Watchdog: run time !"
             
-        # If encoder count > preset drive antenna down
-        if self.encoder_count.get() > (self.ant_preset_val):
-            self.motor_down()
-        # Else drive antenna up
-        else:
-            self.motor_up()
-        # after 100mS, call this function again
-        self.master.after(100, self.motor_move)
-        
-    def get_antenna_val(self, _unused):
-        # fetch new antenna configuration and presets
-        config = configparser.ConfigParser()
-        config.read (self.ini_path)
-        self.last_antenna = self.antenna_combobox.get()
-        self.ant_refresh(config)
-        self.pwm_set.ChangeFrequency(self.pwm_freq)
+    def command_done(self):
+        # GPIO written, the first write of a command is its latency.
+        # Returns when that command was given, None if there wasn't one.
+        since = self.requested
+        if since is not None:
+            self.requested = None
+            self.command_latency.record(self.latency(
+                RPiAntLog.COMMAND_LATENCY, since))
+        return since
+    
+    def latency(self, which, since):
+        # Seconds since then, recorded in the telemetry
+        seconds = max(0.0, self.clock() - since)
+        self.telemetry.event(RPiAntLog.LATENCY, int(seconds * 1e6), 0, which)
+        return seconds
+    
+    def motion_stop(self, since=None):
+        # Motion controller stops the motor. From the encoder callback when
+        # the stop point passes since is that pulse, and the stop is timed
+        # from it. The callback doesn't hold the lock, so it mustn't touch
+        # requested, which belongs to whichever command does. From tick()
+        # since is None and the stop is timed like any other, under the lock.
+        self.motor_stop(since)
         
-    def get_preset_val(self, _unused):
-        # get the preset value stored in the ini file
-        config = configparser.ConfigParser()
-        config.read (self.ini_path)
-        self.ant_preset_val = (config.getint(self.ant_preset_sect,
-                                             self.preset_combobox.get()))
-        #print (self.ant_preset_val)
+    def motion_drive(self, direction, duty):
+        # Motion controller sets speed and direction
+        self.pwm_duty = duty
+        if direction > 0:
+            self.motor_up()
+        else:
+            self.motor_down()
+            
+    def stall_period(self):
+        # Stall period in seconds, proportional to motor speed
+        return (100 / max(1, self.pwm_duty)) * self.stall_time / 1000
+    
+    def stall_start(self):
+        self.stall_count = self.encoder.position
+        self.stall_since = self.clock()
+        self.encoder.motor_start(self.stall_since)
+        self.stall_deadline = self.stall_since + self.stall_period()
+        self.stall.start(self.stall_since)
+        self.binding = False
+        # Watchdog deadlines start afresh with each run of the motor
+        self.heartbeat = self.stall_since
+        self.run_deadline = self.stall_since + self.run_limit()
         
-    def update_pwm_duty(self, _unused):
-        self.pwm_duty = self.duty_scale.get()
-        #print (_unused)
+    def expected_rate(self, duty):
+        # Pulses/s expected at a duty, as learned, or else the slowest
+        # stall_time lets by
+        duty = max(1, duty)
+        if self.full_rate:
+            return self.full_rate * duty / 100.0
+        return 10.0 * duty / self.stall_time
+    
+    def run_limit(self):
+        # Longest the motor may run before the watchdog cuts it: the time
+        # the distance ahead should take at the expected pulse rate, times
+        # watchdog_margin, plus a second to get going. A preset move goes
+        # to its target, ramping down to slow_speed at the end. Raise and
+        # Lower go to the end of the presets in that direction, and a
+        # tenth of their span further.
+        margin = self.store.watchdog_margin
+        if margin <= 0:
+            return math.inf
+        position = self.encoder.position
+        motion = self.motion
+        if motion.busy:
+            distance = abs(motion.target - position)
+            fast = self.expected_rate(motion.full_speed)
+            slow = self.expected_rate(motion.slow_speed)
+            ramp = motion.ramp_time * fast + motion.slow_counts
+            seconds = distance / fast + min(distance, ramp) / slow
+        else:
+            low, high = self.presets.count_range() or (position, position)
+            if self.antenna_raising:
+                distance = high - position
+            else:
+                distance = position - low
+            distance = max(0, distance) + max(10, (high - low) / 10)
+            seconds = distance / self.expected_rate(self.pwm_duty)
+        return margin * seconds + 1.0
         
+    def stall_check(self, now):
+        # See if the running motor has stalled or the antenna is binding
+        if self.stall_detect == 'period':
+            self.stall_check_period(now)
+            return
+        stall = self.stall
+        longest = self.stall_period()
+        if stall.stalled(now, self.pwm_duty, longest):
+            self.telemetry.event(RPiAntLog.STALL, self.encoder.position,
+                                 self.pwm_duty)
+            self.motor_stalled = 1
+            # Timed from when the stall was due to be noticed
+            self.motor_stop(stall.since + stall.bound(self.pwm_duty, longest))
+            self.status = "! Antenna Stalled !"
+            return
+        if stall.binding and not self.binding:
+            self.telemetry.event(RPiAntLog.BINDING, self.encoder.position,
+                                 self.pwm_duty)
+        self.binding = stall.binding
+        if stall.mean:
+            # Pulses/s at 100% duty for the debounce window
+            self.full_rate = 1.0 / stall.mean
+            self.debounce_cap()
+            
+    def stall_check_period(self, now):
+        # Every stall period see if the encoder count has moved
+        if now < self.stall_deadline:
+            return
+        if (self.stall_count == self.encoder.position):
+            self.telemetry.event(RPiAntLog.STALL, self.encoder.position,
+                                 self.pwm_duty)
+            self.motor_stalled = 1
+            self.motor_stop(self.stall_deadline)
+            self.status = "! Antenna Stalled !"
+        # Else reset stall count and timer
+        else:
+            # Learn how fast the antenna turns for the debounce window
+            moved = abs(self.encoder.position - self.stall_count)
+            if moved >= 2 and self.pwm_duty:
+                rate = moved / (now - self.stall_since) * 100 / self.pwm_duty
+                self.full_rate += 0.5 * (rate - self.full_rate)
+            self.stall_count = self.encoder.position
+            self.stall_since = now
+            self.stall_deadline = now + self.stall_period()
+            self.debounce_cap()
+            
+    def debounce_cap(self):
+        # Cap the encoder debounce window at a fraction of the pulse period
+        # expected for this duty, so it closes up as soon as the motor is
+        # sped up rather than a few pulses later
+        encoder = self.encoder
+        if self.motor_running and self.full_rate and self.pwm_duty:
+            period = 100.0 / (self.full_rate * self.pwm_duty)
+            encoder.window_cap = min(encoder.window_max, max(
+                encoder.window_min, encoder.ratio * period))
+        else:
+            encoder.window_cap = encoder.window_max
+            
+    def tick(self, now=None):
+        # Periodic control work, returns True while there is more to do
+        with self.lock:
+            if now is None:
+                now = self.clock()
+            self.heartbeat = now
+            if self.motor_running:
+                self.stall_check(now)
+            if self.follower is not None:
+                self.follower.step(now)
+            if self.motion.busy:
+                # If motor is stalled or cut by the watchdog, abandon the move
+                if (self.motor_stalled == 1) or self.cut_reason is not None:
+                    self.motion.cancel()
+                else:
+                    # Let the motion controller ramp, stop and correct the move
+                    self.motion.step(now)
+                    self.status = self.motion.status
+            if self.binding and self.motor_running:
+                self.status = "! Antenna Binding !"
+            return bool(self.motor_running or self.motion.busy or
+                        self.follower is not None)
+    
+    def run_until_idle(self, timeout=None):
+        # Call tick() until the antenna is idle, for use without a GUI
+        start = self.clock()
+        while self.tick():
+            if timeout is not None and self.clock() - start > timeout:
+                self.halt()
+                self.status = "Timed out"
+                break
+            time.sleep(self.tick_period)
+            
     def gpioconfig(self): # Configure GPIO pins
+        GPIO = self.gpio
         GPIO.setwarnings(False)
-        GPIO.cleanup()                 # In case user changes running configuration
+        GPIO.cleanup(list(self.pins))  # In case user changes running configuration
         
         GPIO.setmode(GPIO.BOARD)                   # Refer to IO as Board header pins
         GPIO.setup(self.dir1_pin, GPIO.OUT)        # Direction output 1 to H-bridge
@@ -310,11 +1598,12 @@ class Window(Frame):
         GPIO.output(self.dir1_pin, GPIO.LOW)       # Turn direction output 1 off
         GPIO.output(self.dir2_pin, GPIO.LOW)       # Turn direction output 2 off
         GPIO.setup(self.pwm_pin, GPIO.OUT)         # PWM output to H-bridge
-        # Set up the simple encoder switch input and add de-bounce time in mS
+        # Set up the simple encoder switch input, de-bounced in software by
+        # EncoderCounter.edge from the edge times rather than bouncetime
         # GPIO.RISING interrupts on both edges, GPIO.FALLING seems better behaved
         GPIO.setup(self.encoder_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
         GPIO.add_event_detect(self.encoder_pin, GPIO.FALLING,
-                              bouncetime=40, callback=self.encoder_ISR)
+                              callback=self.encoder.edge)
         # Note GPIO.PWM is software not hardware PWM
         self.pwm_set = GPIO.PWM(self.pwm_pin, self.pwm_freq) # Set up PWM for use
         #self.pwm_set.stop()                       # Stop pwm output
@@ -322,169 +1611,645 @@ class Window(Frame):
         
         GPIO.setwarnings(True)
         
-    def encoder_ISR(self, _channel):
-        # Do as little as possible in the ISR, get in and get out!
-        # Increment the encoder count and jump out
-        if self.antenna_raising == 1:
-            self.encoder_count.set (self.encoder_count.get()+1)
-        else:
-            self.encoder_count.set (self.encoder_count.get()-1)
-            
     def ini_new(self): # Set up an ini file if it does not exist
-        # Configuration file parser to read and write ini file
-        config = configparser.ConfigParser()
-        # User configurable program settings
-        config['Settings'] = {'pwm_pin':'19',
-                              'dir1_pin':'13',
-                              'dir2_pin':'15',
-                              'encoder_pin':'11',
-                              'antennas':'Antenna 1, Antenna 2',                              
-                              'last_position':'0',
-                              'last_antenna':'Antenna 1',
-                              'last_preset':'20m 14.400 (037)'}
-        
-        # Set up default antennas
-        config['Antenna 1_Config'] = {'pwm_freq':'4000',
-                                      'full_speed':'100',
-                                      'slow_speed':'25',
-                                      'stall_time':'250'}
-        
-        config['Antenna 1_Preset'] = {'maximum    (270)':'270',
-                                      '80m _3.500 (226)':'226',
-                                      '80m _3.580 (221)':'221',
-                                      '80m _3.800 (206)':'206',
-                                      '80m _3.900 (199)':'199',
-                                      '80m _4.000 (192)':'192',
-                                      '60m _5.300 (130)':'130',
-                                      '60m _5.400 (127)':'127',
-                                      '40m _7.035 (091)':'91',
-                                      '40m _7.175 (089)':'89',
-                                      '40m _7.300 (087)':'87',
-                                      '30m 10.000 (056)':'56',
-                                      '30m 10.100 (055)':'55',
-                                      '30m 10.200 (054)':'54',
-                                      '20m 14.000 (039)':'39',
-                                      '20m 14.200 (038)':'38',
-                                      '20m 14.400 (037)':'37',
-                                      '15m 21.275 (019)':'19',
-                                      '12m 24.930 (014)':'14',
-                                      '10m 28.000 (008)':'8',
-                                      '10m 29.700 (006)':'6',
-                                      'minimum    (000)':'0'}        
-        
-        config['Antenna 2_Config'] = {'pwm_freq':'4000',
-                                      'full_speed':'95',
-                                      'slow_speed':'20',
-                                      'stall_time':'250'}
-        
-        config['Antenna 2_Preset'] = {'maximum    (270)':'270',
-                                      '80m _3.700 (200)':'200',
-                                      '60m _5.350 (129)':'129',
-                                      '40m _7.250 (090)':'90',
-                                      '30m 10.100 (055)':'55',
-                                      '20m 14.200 (038)':'38',
-                                      'minimum    (000)':'0'}
-        
-        # Save the default configuration file
-        with open(self.ini_path, 'w') as configfile:
-            config.write(configfile)
+        self.store.write_defaults()
             
     def ini_test(self):
         # Test to see if configuration file exists
-        try:
-            with open(self.ini_path) as _file:
-                # pass condition
-                self.status_message.set ("Configuration file loaded")
-        except IOError as _e:
-            #Does not exist OR no read permissions
-            self.status_message.set ("Configuration file created")
+        if os.path.isfile(self.ini_path):
+            self.status = "Configuration file loaded"
+        else:
+            self.status = "Configuration file created"
             self.ini_new ()
             
-    def ini_read(self):
-        # Read ini file and set up parameters
-        config = configparser.ConfigParser()
-        config.read (self.ini_path)
-        # Retrieve I/O pin assignments
-        self.pwm_pin = (config.getint ('Settings','pwm_pin',fallback=19))
-        self.dir1_pin = (config.getint ('Settings','dir1_pin',fallback=13))
-        self.dir2_pin = (config.getint ('Settings','dir2_pin',fallback=15))
-        self.encoder_pin = (config.getint ('Settings','encoder_pin',fallback=11))
-        # Restore the encoder count to preset value
-        self.encoder_count.set (config.getint('Settings','last_position',fallback=0))
-        self.ant_preset_val = self.encoder_count.get()       
-        # Retrieve the last antenna used and restore saved state
-        # Grab CSV list of antennas to act as combobox values and keys
-        # The .strip method removes leading and trailing spaces from .split list
-        _antennas = (config.get('Settings','antennas',fallback="Antenna 1"))
-        self.antenna_combobox['values']=[item.strip() for item in _antennas.split(',')]         
-        self.last_antenna = (config.get('Settings','last_antenna',fallback="Antenna 1"))
-        self.antenna_combobox.set(self.last_antenna)
-        self.preset_combobox.set(config.get('Settings','last_preset',fallback='None'))
+    def ini_update(self):
+        store = self.store
+        # Perform read-modify-write of ini file, only re-read if edited
+        store.refresh()
+        has_config = store.config.has_section(self.ant_config_sect)
+        # The position goes in the journal as well, and the ini file notes
+        # which record, for recover() to tell whether the antenna has moved
+        # since and whether the ini file has been edited
+        position = self.encoder.position
+        sequence = None
+        if self.journal_writer is not None:
+            sequence, position = self.journal_writer.checkpoint()
+        if self.own_pins is None:
+            sect = 'Settings'
+            store.set ('Settings','last_antenna',self.antenna)
+        elif has_config:
+            # An antenna on its own pins keeps its position in its section
+            sect = self.ant_config_sect
+        else:
+            sect = None
+        if sect is not None:
+            store.set (sect,'last_position',str(position))
+            store.set (sect,'last_preset',self.preset)
+            if sequence is not None:
+                store.set (sect,'journal_sequence',str(sequence))
+            else:
+                store.remove (sect,'journal_sequence')
+        # Keep the coast distance learned by the motion controller
+        if has_config:
+            store.set (self.ant_config_sect,'coast_counts','%.2f' % self.motion.coast)
+        # Save modified configuration file
+        store.save()
+        self.status = "ini file updated"
         
-        # refresh antenna settings and presets
-        self.ant_refresh(config)
+    def close(self): # Save settings and cleanup the GPIO
+        if self.stall_monitor is not None:
+            self.stall_monitor.stop()
+            self.stall_monitor = None
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            self.watchdog = None
+        with self.lock:
+            self.motion.cancel()
+            if self.pwm_set is not None:
+                self.motor_stop()
+            self.ini_update()   # Save current settings
+            if self.gpio is not None:
+                self.gpio.cleanup(list(self.pins))
+        if self.journal_writer is not None:
+            self.journal_writer.stop()     # Where the antenna ended up
+            self.journal_writer = None
+        if self.telemetry_writer is not None:
+            self.telemetry_writer.stop()   # Last of the records out
+            self.telemetry_writer = None
+                
+class FrequencyFollower:
+    # Keeps the antenna tuned to a radio. While the VFO knob is spinning,
+    # frequency updates come in many times a second. update() only keeps
+    # the latest one. step(), run from the controller tick, turns it into
+    # at most one new target. A target further on just moves the stop
+    # point of the move in progress. Small moves and turning round wait
+    # until the VFO has been still for follow_dwell seconds, so slow
+    # tuning doesn't start and stop the motor for every count.
+    def __init__(self, controller):
+        self.controller = controller
+        self.frequency = None     # Latest frequency from the radio in MHz
+        self.updates = 0          # Frequency updates received
+        self.moves = 0            # Moves started or retargeted
+        self.reset()
         
-    def ant_refresh (self,config):
-        # Using selected antenna refresh antenna settings and presets
-        self.ant_config_sect = (self.last_antenna + '_Config')
-        self.ant_preset_sect = (self.last_antenna + '_Preset')
-        self.pwm_freq = (config.getint (self.ant_config_sect,'pwm_freq',fallback=4000))
-        self.full_speed = (config.getint (self.ant_config_sect,'full_speed',fallback=100))
-        self.slow_speed = (config.getint (self.ant_config_sect,'slow_speed',fallback=25))
-        self.stall_time = (config.getint (self.ant_config_sect,'stall_time',fallback=250))
-        self.preset_combobox['values']=(config.options(self.ant_preset_sect))
+    def reset(self):
+        self.seen = None          # Frequency last looked at by step()
+        self.wanted = None        # Encoder count for that frequency
+        self.changed = 0.0        # When wanted last changed
+        self.target = None        # Count last sent to the motion controller
         
-    def ini_update(self):
-        config = configparser.ConfigParser()
-        # Perform read-modify-write of ini file
-        # Note: Anytyhing written must be a string value
-        config.read (self.ini_path)
-        config.set ('Settings','last_position',str(self.encoder_count.get()))
-        config.set ('Settings','last_antenna',self.antenna_combobox.get())
-        config.set ('Settings','last_preset',self.preset_combobox.get())     
-        # Save modified configuration file
-        with open(self.ini_path, 'w') as configfile:
-            config.write(configfile)
-        self.status_message.set ("ini file updated")
-        
-    def close(self): # Cleanly close the GUI and cleanup the GPIO
-        self.ini_update()   # Save current settings
-        GPIO.cleanup()
-        #print ("GPIO cleanup executed")        
-        self.master.destroy()
-        #print ("master window destroyed")
-        
-    def about(self):
-        popup = Toplevel()
-        popup.title("About RPiAntDrv")
-        popup.geometry("325x225+162+168")
-        popup.configure(bg= 'snow')
-        
-        popup_text1 = Label(popup, text='RPiAntDrv.py   v1.6',
-                           font = ('Helvetica', 12), wraplength=300, justify=LEFT,
-                           bg = 'snow', fg='black', padx=10, pady=10)
-        popup_text1.grid(row=0, column=0, columnspan=1)
-        
-        popup_text2 = Label(popup, text='This Python script is used to control '
-                            'a motor tuned antenna like a screwdriver antenna or '
-                            'tuned loop. Feedback from the antenna is provided by '
-                            'a simple dry contact or pulse output relative to the '
-                            'output shaft turning.',
-                           font = ('Helvetica', 12), wraplength=300, justify=LEFT,
-                           bg = 'snow', fg='black', padx=10, pady=10)
-        popup_text2.grid(row=1, column=0, columnspan=1)
-        
-        popup.mainloop()
+    def update(self, mhz):
+        # From any thread, as often as the radio reports
+        self.frequency = mhz
+        self.updates += 1
         
-def main():
+    def step(self, now):
+        controller = self.controller
+        mhz = self.frequency
+        if mhz is not None and mhz != self.seen:
+            self.seen = mhz
+            try:
+                count = controller.freq_index.count(mhz, controller.spline)
+            except ValueError:
+                controller.status = "%.3f MHz out of range" % mhz
+            else:
+                if count != self.wanted:
+                    self.wanted = count
+                    self.changed = now
+        wanted = self.wanted
+        if wanted is None or wanted == self.target or \
+           controller.motor_stalled or controller.cut_reason is not None:
+            return
+        motion = controller.motion
+        if controller.motor_running and not motion.busy:
+            return                # Raise or Lower is held down
+        position = controller.encoder.position
+        still = now - self.changed >= controller.follow_dwell
+        if motion.busy:
+            ahead = (wanted - position) * motion.direction > 0
+            if ahead or still:
+                self.target = wanted
+                self.moves += 1
+                controller.retarget(wanted)
+        elif abs(wanted - position) > controller.follow_deadband or still:
+            self.target = wanted  # Before goto(), which ticks
+            if wanted != position:
+                self.moves += 1
+                controller.goto(wanted)
+                
+class AntennaGroup:
+    # Every antenna in the ini file. Each antenna with pins of its own
+    # gets an AntennaController of its own, with its own encoder count,
+    # stall detection and PWM. Antennas on the [Settings] pins share one
+    # controller and are selected on it one at a time as before. All of
+    # them share the one parsed ini file. tick() runs them all, so a band
+    # change moves every antenna at once and takes as long as the slowest.
+    def __init__(self, ini_path=None, gpio=None, clock=time.monotonic,
+                 simulate=False):
+        self.shared = AntennaController(ini_path, gpio, clock, simulate)
+        self.ini_path = self.shared.ini_path
+        self.store = self.shared.store
+        self.gpio = gpio
+        self.clock = clock
+        self.simulate = simulate
+        self.tick_period = self.shared.tick_period
+        self.controllers = []      # One per set of pins
+        self.started = []          # Those start() has claimed the pins of
+        self.antennas = []         # Every antenna name, in ini file order
+        self.selected = None       # Antenna last picked by controller_for()
+        
+    def load(self, config=None):
+        # Read the ini file and set up a controller for each set of pins,
+        # raises ValueError if two antennas' pins overlap
+        self.shared.load(config)
+        store = self.store
+        self.antennas = store.antennas
+        self.selected = store.last_antenna
+        self.controllers = [self.shared] if self.shared.antennas else []
+        for name in self.antennas:
+            if store.profile(name).pins is None:
+                continue
+            controller = AntennaController(self.ini_path, self.gpio,
+                                           self.clock, self.simulate, name)
+            controller.store = store
+            controller.load(config)
+            self.controllers.append(controller)
+        used = {}
+        for controller in self.controllers:
+            for pin in controller.pins:
+                if pin in used:
+                    raise ValueError('%s and %s both use pin %d' % (
+                        used[pin], controller.antenna, pin))
+                used[pin] = controller.antenna
+        if self.selected not in self.antennas:
+            self.selected = self.antennas[0]
+            
+    def controller_for(self, name):
+        # The controller driving an antenna, with the antenna selected on
+        # it if it is on the [Settings] pins
+        for controller in self.controllers:
+            if name in controller.antennas:
+                if controller.antenna != name:
+                    controller.select_antenna(name)
+                self.selected = name
+                return controller
+        raise ValueError('unknown antenna %r' % name)
+    
+    def start(self, monitor=True, record=True, controllers=None):
+        # Claim the pins of all the controllers, or just some of them. A
+        # simulated antenna is wired up for each if there's no GPIO.
+        if controllers is None:
+            controllers = self.controllers
+        if self.gpio is None and self.simulate:
+            from RPiAntSim import simulated_antennas
+            self.gpio = simulated_antennas(self.controllers)
+            for controller in self.controllers:
+                controller.gpio = self.gpio
+        for controller in controllers:
+            if controller not in self.started:
+                controller.start(monitor, record)
+                self.started.append(controller)
+                
+    def goto_band(self, band):
+        # Send every antenna to its preset for a band, the preset of that
+        # name or else the first whose name starts with it. Returns the
+        # controllers that were given a move.
+        moved = []
+        for controller in self.started:
+            name = controller.band_preset(band)
+            if name is not None:
+                controller.goto_preset(name)
+                moved.append(controller)
+        return moved
+    
+    def goto_frequency(self, mhz):
+        # Tune every antenna whose presets cover the frequency to it
+        moved = []
+        for controller in self.started:
+            try:
+                controller.goto_frequency(mhz)
+            except ValueError:
+                continue
+            moved.append(controller)
+        return moved
     
-    # root window created. Here, that would be the only window, but
-    # you can later have windows within windows.
-    root = Tk()
-    app = Window(root) #creation of an instance
-    root.protocol("WM_DELETE_WINDOW", app.close) # cleanup GPIO when X closes window
-    root.mainloop() # Loops forever
+    def halt(self):
+        for controller in self.started:
+            controller.halt()
+            
+    def tick(self, now=None):
+        # Tick every controller, True while any of them is busy
+        busy = False
+        for controller in self.started:
+            if controller.tick(now):
+                busy = True
+        return busy
+    
+    def run_until_idle(self, timeout=None):
+        start = self.clock()
+        while self.tick():
+            if timeout is not None and self.clock() - start > timeout:
+                self.halt()
+                for controller in self.started:
+                    controller.status = "Timed out"
+                break
+            time.sleep(self.tick_period)
+            
+    def close(self):
+        # Close every controller, then remember the antenna last picked
+        for controller in self.started:
+            controller.close()
+        self.started = []
+        store = self.store
+        if store.last_antenna != self.selected and \
+           store.config.has_section('Settings'):
+            store.set('Settings', 'last_antenna', self.selected)
+            store.save()
+            
+class StallMonitor(threading.Thread):
+    # Runs the stall check every period seconds whether or not anything is
+    # calling tick(), so a busy GUI can't hold up stopping a stalled motor
+    def __init__(self, controller, period=0.01):
+        threading.Thread.__init__(self, name='RPiAntDrv stall', daemon=True)
+        self.controller = controller
+        self.period = period
+        self.stopping = threading.Event()
+        
+    def run(self):
+        controller = self.controller
+        while not self.stopping.wait(self.period):
+            if controller.motor_running:
+                with controller.lock:
+                    if controller.motor_running:
+                        controller.stall_check(controller.clock())
+                        
+    def stop(self):
+        self.stopping.set()
+        self.join()
+        
+def lock_memory():
+    # mlockall(MCL_CURRENT | MCL_FUTURE), so the control thread is never
+    # held up by a page fault. Raises OSError if it isn't allowed.
+    import ctypes, ctypes.util
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    if libc.mlockall(1 | 2) != 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+    
+class MotorWatchdog(threading.Thread):
+    # Cuts the motor pins when a deadline is missed: the motor running and
+    # no tick() for watchdog_heartbeat seconds, or running past the
+    # run_deadline worked out from the distance when it was started. It
+    # never takes the controller lock, which whatever has stopped the
+    # ticks may be holding, and needs neither the GUI, the control thread
+    # nor the stall monitor to be running.
+    def __init__(self, controller, period=0.01):
+        threading.Thread.__init__(self, name='RPiAntDrv watchdog', daemon=True)
+        self.controller = controller
+        self.period = period
+        self.stopping = threading.Event()
+        self.cuts = 0              # Times a deadline was missed
+        
+    def run(self):
+        controller = self.controller
+        store = controller.store
+        while not self.stopping.wait(self.period):
+            if not controller.motor_running:
+                continue
+            if controller.cut_reason is not None:
+                # Started again after the cut, before the latch was seen
+                controller.watchdog_cut()
+                continue
+            now = controller.clock()
+            due = controller.heartbeat + store.watchdog_heartbeat
+            if store.watchdog_heartbeat > 0 and now > due:
+                controller.watchdog_cut(RPiAntLog.HEARTBEAT_DEADLINE, due)
+                self.cuts += 1
+            elif now > controller.run_deadline:
+                controller.watchdog_cut(RPiAntLog.RUN_DEADLINE,
+                                        controller.run_deadline)
+                self.cuts += 1
+                
+    def stop(self):
+        self.stopping.set()
+        self.join()
+        
+class ControlThread(threading.Thread):
+    # Calls controller.tick() every tick_period on its own thread. Ticks
+    # are scheduled from the start time so they don't drift, a late tick
+    # is followed by the next one on schedule rather than a burst. How
+    # late each tick woke up is kept in wake. The GUI only reads state
+    # and send()s its commands here, to be run at once on this thread,
+    # so a blocked mainloop holds up neither the ticks nor a Stop sent
+    # from elsewhere, and so does the network server. kick() ticks at
+    # once after a command given directly.
+    #
+    # The thread can ask for SCHED_FIFO priority, a CPU of its own and
+    # the program locked in memory, from rt_priority, rt_cpu and
+    # rt_lock_memory in [Settings] unless given. Each falls back to
+    # running as before if it isn't allowed, rt_status says what took.
+    # Python threads still take turns holding the interpreter lock, so
+    # with a priority the lock is handed over every 1 mS instead of 5.
+    def __init__(self, controller, priority=None, cpu=None,
+                 lock_memory=None):
+        threading.Thread.__init__(self, name='RPiAntDrv control', daemon=True)
+        store = controller.store
+        self.controller = controller
+        self.priority = store.rt_priority if priority is None else priority
+        self.cpu = store.rt_cpu if cpu is None else cpu
+        self.lock_memory = (store.rt_lock_memory if lock_memory is None
+                            else lock_memory)
+        self.stopping = threading.Event()
+        self.woken = threading.Event()  # Set by kick(), send() and stop()
+        self.commands = collections.deque() # (sent, command, args, done)
+        self.ticks = 0             # Ticks run so far
+        self.worst_late = 0.0      # Worst lateness of a tick in seconds
+        self.wake = RPiAntLog.LatencyHistogram('Wake up') # Tick lateness
+        self.rt_status = []        # What realtime() managed, or why not
+        
+    def realtime(self):
+        # Ask for each of priority, CPU and locked memory that is set
+        status = []
+        if self.priority > 0:
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO,
+                                      os.sched_param(self.priority))
+                status.append('SCHED_FIFO %d' % self.priority)
+                if sys.getswitchinterval() > 0.001:
+                    sys.setswitchinterval(0.001)
+            except (AttributeError, OSError) as e:
+                status.append('normal priority (%s)' % (
+                    getattr(e, 'strerror', None) or 'not supported'))
+        if self.cpu >= 0:
+            try:
+                os.sched_setaffinity(0, {self.cpu})
+                status.append('CPU %d' % self.cpu)
+            except (AttributeError, OSError) as e:
+                status.append('any CPU (%s)' % (
+                    getattr(e, 'strerror', None) or 'not supported'))
+        if self.lock_memory:
+            try:
+                lock_memory()
+                status.append('memory locked')
+            except (AttributeError, OSError, TypeError) as e:
+                status.append('memory not locked (%s)' % (
+                    getattr(e, 'strerror', None) or 'not supported'))
+        self.rt_status = status or ['normal priority']
+        
+    def run(self):
+        self.realtime()
+        controller = self.controller
+        period = controller.tick_period
+        due = time.monotonic()
+        kicked = False
+        while not self.stopping.is_set():
+            if not kicked:
+                late = time.monotonic() - due
+                self.wake.record(late)
+                if late > self.worst_late:
+                    self.worst_late = late
+            try:
+                self.run_commands()
+                controller.tick()
+            except Exception:
+                # Don't leave the motor running without control
+                controller.halt()
+                raise
+            self.ticks += 1
+            due += period
+            delay = due - time.monotonic()
+            if delay < 0:
+                due -= delay   # Fell behind, skip the missed ticks
+                delay = 0
+            kicked = self.woken.wait(delay)
+            if kicked:
+                self.woken.clear()
+        # Anyone waiting on a command that will never run is told so
+        while self.commands:
+            _since, _command, _args, done = self.commands.popleft()
+            if done is not None:
+                done(None, ValueError('Antenna control stopped'))
+                
+    def run_commands(self):
+        while self.commands:
+            since, command, args, done = self.commands.popleft()
+            antenna = command.__self__
+            result = error = None
+            try:
+                with antenna.command(since):
+                    result = command(*args)
+            except (ValueError, KeyError) as e:
+                # Bad frequency or unknown preset
+                antenna.status = str(e)
+                error = e
+            if done is not None:
+                done(result, error)
+                
+    def send(self, command, *args, done=None):
+        # Run an AntennaController command, e.g. send(controller.halt), on
+        # this thread. Its latency is timed from now. done, if given, is
+        # called on this thread with what the command returned and the
+        # ValueError or KeyError it raised, or None.
+        self.commands.append((command.__self__.clock(), command, args, done))
+        self.woken.set()
+        
+    def kick(self):
+        # Tick now rather than at the next tick, after a command
+        self.woken.set()
+        
+    def stop(self):
+        self.stopping.set()
+        self.woken.set()
+        self.join()
+        
+def cli_main(argv):
+    # One-shot command line control for station automation. Only what is
+    # needed gets imported, tkinter never is.
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='RPiAntDrv.py',
+        description='Drive a motor tuned antenna without the GUI.')
+    parser.add_argument('--ini', help='ini file (default RPiAntDrv.ini '
+                        'next to this script)')
+    parser.add_argument('--antenna', help='select this antenna first')
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--goto', metavar='PRESET', help='move to a preset')
+    action.add_argument('--count', type=int, help='move to an encoder count')
+    action.add_argument('--freq', type=float, metavar='MHZ',
+                        help='move to a frequency between presets')
+    action.add_argument('--sync', type=int, metavar='COUNT',
+                        help='set the encoder count without moving')
+    action.add_argument('--list', action='store_true',
+                        help='list antennas and presets')
+    action.add_argument('--calibrate', action='store_true',
+                        help='learn the speed, stall and coast settings of '
+                        'the antenna (RPiAntCal.py) and save them, takes '
+                        'several minutes')
+    action.add_argument('--serve', type=int, nargs='?', const=0,
+                        metavar='PORT', help='run the network control '
+                        'server (RPiAntNet.py), on server_port from the ini '
+                        'file or 4533 if no PORT is given')
+    parser.add_argument('--host', help='address to serve on (default '
+                        'server_host from the ini file)')
+    parser.add_argument('--follow', nargs='?', const='', metavar='HOST:PORT',
+                        help='keep the antenna tuned to the radio, polling '
+                        'rigctld (default rig_host and rig_port from the '
+                        'ini file), with or without --serve')
+    parser.add_argument('--timeout', type=float, default=120.0,
+                        help='give up on a move after this many seconds')
+    parser.add_argument('--group', action='store_true',
+                        help='move every antenna at once, to the band of '
+                        '--goto (e.g. 20m) or the frequency of --freq')
+    parser.add_argument('--sim', action='store_true',
+                        help='drive a simulated antenna (RPiAntSim.py)')
+    args = parser.parse_args(argv)
+    
+    group = AntennaGroup(args.ini, simulate=args.sim)
+    try:
+        group.load()
+    except ValueError as e:
+        parser.error(str(e))
+    if args.antenna and args.antenna not in group.antennas:
+        parser.error('unknown antenna %r' % args.antenna)
+    controller = group.controller_for(args.antenna or group.selected)
+    if args.list:
+        for name in group.antennas:
+            pins = group.store.profile(name).pins
+            print (('* ' if name == group.selected else '  ') + name +
+                   (' (pins %s)' % ', '.join(map(str, pins)) if pins else ''))
+        for name, count in controller.presets.items():
+            print ('    %-20s %5d' % (name, count))
+        return 0
+    if args.group:
+        # Band change, every antenna at once
+        if args.goto is None and args.freq is None:
+            parser.error('--group needs --goto BAND or --freq MHZ')
+        try:
+            group.start()
+        except RuntimeError as e:
+            parser.error('%s, use --sim to simulate' % e)
+        if args.goto is not None:
+            moved = group.goto_band(args.goto.lower())
+        else:
+            moved = group.goto_frequency(args.freq)
+        group.run_until_idle(args.timeout)
+        for antenna in moved:
+            print ('%s %s: %d' % (antenna.antenna, antenna.status,
+                                  antenna.encoder.position))
+        group.close()
+        if not moved:
+            print ('No antenna has a preset for %s' % (
+                args.goto if args.goto is not None else args.freq))
+            return 1
+        return 0 if all(antenna.encoder.position == antenna.ant_preset_val
+                        for antenna in moved) else 1
+    if args.goto is not None:
+        args.goto = args.goto.lower()   # ini file keys are lower case
+        if args.goto not in controller.presets:
+            parser.error('unknown preset %r for %s' % (args.goto,
+                                                       controller.antenna))
+    if args.freq is not None:
+        try:
+            args.count = controller.freq_index.count(args.freq,
+                                                     controller.spline)
+        except ValueError as e:
+            parser.error('%s for %s' % (e, controller.antenna))
+    if args.calibrate:
+        import RPiAntCal
+        try:
+            calibrator = RPiAntCal.Calibrator(
+                controller, progress=lambda text: print (text, flush=True))
+        except ValueError as e:
+            parser.error(str(e))
+        try:
+            # The calibrator times stalls itself
+            group.start(monitor=False, controllers=[controller])
+        except RuntimeError as e:
+            parser.error('%s, use --sim to simulate' % e)
+        home = controller.encoder.position
+        try:
+            settings = calibrator.calibrate()
+        except (RuntimeError, KeyboardInterrupt) as e:
+            controller.halt()
+            group.close()
+            print ('Calibration abandoned %s' % (e or ''))
+            return 1
+        if settings is None:
+            print ('Kept the settings in [%s]' % controller.ant_config_sect)
+        else:
+            calibrator.apply(settings)
+            print ('Saved to [%s]' % controller.ant_config_sect)
+            for key, value in settings.items():
+                print ('  %s = %s' % (key, value))
+        # Back to where it started
+        controller.goto(home)
+        controller.run_until_idle(args.timeout)
+        group.close()
+        return 0
+    if args.serve is not None or args.follow is not None:
+        import RPiAntNet
+        store = controller.store
+        try:
+            group.start(controllers=[controller])
+        except RuntimeError as e:
+            parser.error('%s, use --sim to simulate' % e)
+        poller = None
+        if args.follow is not None:
+            host, _sep, port = args.follow.partition(':')
+            controller.follow()
+            poller = RPiAntNet.RigPoller(controller, host or store.rig_host,
+                                         int(port or store.rig_port),
+                                         store.rig_poll)
+            poller.start()
+            print ('Following rigctld on %s port %d' % (poller.host,
+                                                         poller.port),
+                   flush=True)
+        try:
+            if args.serve is None:
+                RPiAntNet.follow(controller)
+            else:
+                port = args.serve or store.server_port or \
+                    RPiAntNet.DEFAULT_PORT
+                try:
+                    RPiAntNet.serve(controller, args.host or store.server_host,
+                                    port)
+                except OSError as e:
+                    print ('Cannot serve on port %d: %s' % (port, e))
+                    return 1
+        finally:
+            if poller is not None:
+                poller.stop()
+            group.close()
+        return 0
+    if args.sync is not None:
+        controller.sync(args.sync)
+    elif args.goto is not None or args.count is not None:
+        try:
+            group.start(controllers=[controller])
+        except RuntimeError as e:
+            parser.error('%s, use --sim to simulate' % e)
+        if args.goto is not None:
+            controller.goto_preset(args.goto)
+        else:
+            controller.goto(args.count)
+        controller.run_until_idle(args.timeout)
+        status = controller.status
+        group.close()
+        print ('%s: %d' % (status, controller.encoder.position))
+        return 0 if controller.encoder.position == controller.ant_preset_val \
+            else 1
+    if args.antenna or args.sync is not None:
+        controller.ini_update()
+        group.close()   # Remember the antenna
+    print (controller.encoder.position)
+    return 0
+
+def main():
+    if len(sys.argv) > 1:
+        return cli_main(sys.argv[1:])
+    # No arguments, run the GUI
+    import RPiAntGui
+    return RPiAntGui.main([])
     
 if __name__ == '__main__':
-    main()
-    
\ No newline at end of file
+    raise SystemExit(main())
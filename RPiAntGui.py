@@ -0,0 +1,680 @@
+#! /usr/bin/python3
+##################################################################
+#
+# Raspberry Pi Antenna Driver GUI (RPiAntGui.py)
+#
+# Tkinter GUI for RPiAntDrv.py, started by running RPiAntDrv.py
+# without arguments. The antenna itself is driven by the
+# AntennaController in RPiAntDrv.py.
+#
+#            Name          Call  Date(s)
+# Authors:   Bill Peterson N7IFC Mar-May2020
+#
+##################################################################
+
+from tkinter import Tk, ttk, messagebox, simpledialog, Frame, Menu, Label, Button
+from tkinter import Scale, IntVar, StringVar, BooleanVar, Toplevel, Canvas
+from tkinter import RAISED, HORIZONTAL, LEFT, S, E, W, SW, NW
+from array import array
+import RPiAntDrv
+
+class ChartBuffer:
+    # Strip chart history, decimated to pixel resolution as it arrives.
+    # Every pixel column covers a fixed slice of time and keeps the first,
+    # lowest, highest and last position and pulse rate seen in it, in
+    # arrays allocated once. A sample only touches the newest column, and
+    # the chart never holds more than two points per column however many
+    # samples it has seen. The pixels of a column are worked out once,
+    # and again only if the chart has to be rescaled.
+    def __init__(self, columns, span):
+        self.columns = columns            # Pixel columns across the chart
+        self.step = span / columns        # Seconds covered by each column
+        self.stamps = array('q', [-1]) * columns # Column number held in a slot
+        self.pos_first = array('d', [0.0]) * columns
+        self.pos_low = array('d', [0.0]) * columns
+        self.pos_high = array('d', [0.0]) * columns
+        self.pos_last = array('d', [0.0]) * columns
+        self.rate_first = array('d', [0.0]) * columns
+        self.rate_high = array('d', [0.0]) * columns
+        self.rate_low = array('d', [0.0]) * columns
+        self.rate_last = array('d', [0.0]) * columns
+        self.pixels = [None] * columns    # Points of each slot, once scaled
+        self.scale = None                 # Scale the pixels were worked out to
+        self.newest = None                # Column of the latest sample
+        self.changed = True               # Lines differ from the last ones
+        self.reset()
+        
+    def clear(self, slot):
+        # An empty slot, left out of the lines and the scale
+        self.stamps[slot] = -1
+        self.pos_low[slot] = float('inf')
+        self.pos_high[slot] = float('-inf')
+        self.rate_high[slot] = 0.0
+        self.pixels[slot] = None
+        
+    def reset(self):
+        # Forget the history, e.g. when another antenna is selected
+        for slot in range(self.columns):
+            self.clear(slot)
+        self.newest = None
+        self.changed = True
+        
+    def add(self, now, position, rate):
+        column = int(now / self.step)
+        newest = self.newest
+        if newest is not None and column <= newest:
+            if column < newest:
+                return                    # Clock stepped back, drop it
+            slot = column % self.columns
+            if position == self.pos_last[slot] and \
+               rate == self.rate_last[slot]:
+                return
+            self.pos_last[slot] = position
+            if position < self.pos_low[slot]:
+                self.pos_low[slot] = position
+            elif position > self.pos_high[slot]:
+                self.pos_high[slot] = position
+            self.rate_last[slot] = rate
+            if rate < self.rate_low[slot]:
+                self.rate_low[slot] = rate
+            elif rate > self.rate_high[slot]:
+                self.rate_high[slot] = rate
+            self.pixels[slot] = None
+            self.changed = True
+            return
+        # First sample in a new column. Columns skipped over while the
+        # display was held up are emptied, older ones are left alone.
+        if newest is None or column - newest > self.columns:
+            newest = column - self.columns
+        for skipped in range(newest + 1, column):
+            self.clear(skipped % self.columns)
+        slot = column % self.columns
+        self.stamps[slot] = column
+        self.pos_first[slot] = self.pos_low[slot] = position
+        self.pos_high[slot] = self.pos_last[slot] = position
+        self.rate_first[slot] = self.rate_low[slot] = rate
+        self.rate_high[slot] = self.rate_last[slot] = rate
+        self.pixels[slot] = None
+        self.newest = column
+        self.changed = True
+        
+    def lines(self, height, low, high):
+        # Flat canvas coordinate lists for the position and rate lines up
+        # to the latest sample, plus the position range and top rate they
+        # are scaled to. Position is scaled to at least low to high, the
+        # rate to a multiple of 5 pulses/s.
+        low = min(low, min(self.pos_low))
+        high = max(high, max(self.pos_high))
+        if high <= low:
+            high = low + 1
+        top = 5.0 * (int(1.1 * max(self.rate_high) / 5.0) + 1)
+        scale = (height, low, high, top)
+        pixels = self.pixels
+        if scale != self.scale:
+            self.scale = scale
+            pixels[:] = [None] * self.columns
+        bottom = height - 3
+        pos_scale = (height - 6) / (high - low)
+        rate_scale = (height - 6) / top
+        columns = self.columns
+        stamps = self.stamps
+        position_line = []
+        rate_line = []
+        first = (self.newest + 1) % columns
+        for x in range(columns):
+            slot = (first + x) % columns
+            if stamps[slot] < 0:
+                continue
+            points = pixels[slot]
+            if points is None:
+                points = pixels[slot] = (
+                    self.column_points(bottom, pos_scale, low,
+                                       self.pos_first[slot],
+                                       self.pos_low[slot],
+                                       self.pos_high[slot],
+                                       self.pos_last[slot]),
+                    self.column_points(bottom, rate_scale, 0.0,
+                                       self.rate_first[slot],
+                                       self.rate_low[slot],
+                                       self.rate_high[slot],
+                                       self.rate_last[slot]))
+            position_y, rate_y = points
+            position_line += (x, position_y[0])
+            if len(position_y) > 1:
+                position_line += (x, position_y[1])
+            rate_line += (x, rate_y[0])
+            if len(rate_y) > 1:
+                rate_line += (x, rate_y[1])
+        self.changed = False
+        return position_line, rate_line, low, high, top
+    
+    @staticmethod
+    def column_points(bottom, scale, base, first, lowest, highest, last):
+        # Pixel heights of a column, one for a flat column, otherwise the
+        # low and high in the order the line passed through them
+        y_low = round(bottom - (lowest - base) * scale)
+        y_high = round(bottom - (highest - base) * scale)
+        if y_low == y_high:
+            return (y_low,)
+        if last >= first:
+            return (y_low, y_high)
+        return (y_high, y_low)
+            
+class StripChart:
+    # Position (blue) and pulse rate (red) over the last span seconds on a
+    # Canvas. The lines are created once and moved with coords(), which is
+    # skipped altogether while the chart looks the same, as it does once
+    # the antenna has been still for the whole span.
+    def __init__(self, canvas, span):
+        self.canvas = canvas
+        self.width = int(canvas['width'])
+        self.height = int(canvas['height'])
+        self.buffer = ChartBuffer(self.width, span)
+        self.position_item = canvas.create_line(0, 0, 0, 0, fill='blue')
+        self.rate_item = canvas.create_line(0, 0, 0, 0, fill='red')
+        self.label_item = canvas.create_text(3, 1, anchor=NW, text='',
+                                             font=('Helvetica', 8))
+        self.drawn = None                 # Coordinates currently shown
+        self.label = ''                   # Scale text currently shown
+        self.frames = 0                   # Frames sampled
+        self.redraws = 0                  # Frames that moved the lines
+        
+    def reset(self):
+        self.buffer.reset()
+        self.drawn = None
+        
+    def update(self, controller, now, low, high):
+        # Sample the controller once per display frame and redraw only what
+        # has changed. The rate estimate tails off slowly once the pulses
+        # stop, the chart shows none as soon as the motor is off.
+        self.frames += 1
+        rate = controller.motion.rate(now) if controller.motor_running else 0.0
+        self.buffer.add(now, controller.encoder.position, rate)
+        if not self.buffer.changed and self.drawn is not None:
+            return
+        position_line, rate_line, low, high, top = \
+            self.buffer.lines(self.height, low, high)
+        if (position_line, rate_line) != self.drawn:
+            self.drawn = (position_line, rate_line)
+            self.redraws += 1
+            self.canvas.coords(self.position_item, *self.points(position_line))
+            self.canvas.coords(self.rate_item, *self.points(rate_line))
+        label = '%d-%d  %.0f p/s' % (low, high, top)
+        if label != self.label:
+            self.label = label
+            self.canvas.itemconfigure(self.label_item, text=label)
+            
+    @staticmethod
+    def points(line):
+        # A line item needs two points at least, an empty one is parked
+        # off the canvas
+        if len(line) >= 4:
+            return line
+        return (line * 2 or [-1, -1, -1, -1])
+
+class Window(Frame):
+    # Define settings upon initialization
+    def __init__(self, master=None, group=None):
+        
+        # parameters to send through the Frame class. 
+        Frame.__init__(self, master)   
+        
+        #reference to the master widget, which is the tk window                 
+        self.master = master
+        
+        # The antenna controllers do the work, the GUI only drives them.
+        # The buttons drive the selected antenna's controller, the others
+        # carry on with whatever they were doing.
+        if group is None:
+            group = RPiAntDrv.AntennaGroup()
+        self.group = group
+        self.controller = None            # Controller of the selected antenna
+        
+        self.encoder_count = IntVar()     # Displayed copy of encoder position
+        self.encoder_count.set(0)
+        self.shown_count = 0              # Last value pushed to the display
+        self.shown_duty = None            # Last duty pushed to the slider
+        self.shown_status = None          # Last status pushed to text_3
+        self.preset_text = None           # Preset search text last listed
+        self.preset_limit = 100           # Most presets listed at once
+        self.display_period = 100         # Display refresh period in mS
+        self.chart = None                 # Strip chart, None when turned off
+        self.chart_low = 0                # Position range the chart shows
+        self.chart_high = 0               # at the least
+        self.control_thread = None        # Ticks the antennas off the Tk thread
+        self.timing_text = StringVar()    # Help > Timing contents
+        self.server_thread = None         # Network control server
+        self.rig_poller = None            # Reads the radio's frequency
+        self.follow_radio = BooleanVar()  # Edit > Follow Radio ticked
+        self.status_message = StringVar() # Status message text for text_2
+        
+        # Run init_window, which doesn't yet exist
+        self.init_window()
+        
+    #Creation of init_window
+    def init_window(self):
+        self.master.title('RPi Antenna Driver (v1.6)')
+        # Set up root window & size (width x height + x_offset + y_offset)
+        self.bg_color = 'azure'
+        self.master.geometry("350x275+150+100")
+        self.master.configure(bg= self.bg_color)
+        
+        # Create menu entry and sub-options
+        menubar = Menu(self.master)
+        self.master.config(menu=menubar)        
+        filemenu = Menu(menubar, tearoff=0)
+        filemenu.add_command(label="Open", command=self.about)
+        filemenu.add_command(label="Save", command=self.about)
+        filemenu.add_command(label="Save as...", command=self.about)
+        filemenu.add_separator()
+        filemenu.add_command(label="Quit", command=self.close)
+        menubar.add_cascade(label="File", menu=filemenu)
+        
+        editmenu = Menu(menubar, tearoff=0)
+        editmenu.add_command(label="Default ini", command=self.confirm_newini)
+        editmenu.add_command(label="Sync Count", command=self.confirm_sync)
+        editmenu.add_command(label="Tune Frequency", command=self.ask_frequency)
+        editmenu.add_command(label="Tune All Antennas", command=self.ask_band)
+        editmenu.add_checkbutton(label="Follow Radio", variable=self.follow_radio,
+                                 command=self.toggle_follow)
+        menubar.add_cascade(label="Edit", menu=editmenu)
+        
+        helpmenu = Menu(menubar, tearoff=0)
+        helpmenu.add_command(label="Timing", command=self.timing)
+        helpmenu.add_command(label="About", command=self.about)
+        menubar.add_cascade(label="Help", menu=helpmenu)
+        
+        text_1 = Label(textvariable=self.encoder_count, font = ('Helvetica', 30),
+                       bg = self.bg_color, fg='black', pady=5, height=1)
+        text_1.grid(row=0, column=0, rowspan=2, pady=1, sticky=S)
+        
+        text_2 = Label(text='Status:', font = ('Helvetica', 14),
+                       bg = self.bg_color, fg='black', height=1,
+                       anchor=SW, width=22, justify=LEFT)
+        text_2.grid(row=0, column=1, columnspan=1, sticky=SW)
+        
+        text_3 = Label(textvariable=self.status_message, font = ('Helvetica', 12),
+                       bg='white', fg='black', height=1, anchor=NW, width=22,
+                       borderwidth=1, relief="solid")
+        text_3.grid(row=1, column=1, sticky=NW)
+        
+        text_4 = Label(text='Motor Speed (%):', font = ('Helvetica', 14),
+                       bg = self.bg_color, fg='black', padx=1, height=1,
+                       anchor=SW, width=22, justify=LEFT)
+        text_4.grid(row=2, column=1, columnspan=1, sticky=S)
+        
+        text_5 = Label(text='Antenna Selection:', font = ('Helvetica', 14),
+                       bg = self.bg_color, fg='black', padx=1, height=1,
+                       anchor=SW, width=22, justify=LEFT)
+        text_5.grid(row=4, column=1, columnspan=1, sticky=S)
+        
+        text_6 = Label(text='Preset Selection:',  font = ('Helvetica', 14),
+                       bg = self.bg_color, fg='black', padx=1, height=1,
+                       anchor=W, width=22, justify=LEFT)
+        text_6.grid(row=6, column=1, columnspan=1, sticky=S)
+        
+        self.raise_button = Button(text='Raise', relief=RAISED, bd=4, padx=1,
+               pady=1, height=2, width=6, font=('Helvetica', 14))
+        self.raise_button.grid(row=2, column=0, padx=20, pady=5, rowspan=2)
+        self.raise_button.bind("<ButtonPress>", self.raise_button_press)
+        self.raise_button.bind("<ButtonRelease>", self.RL_button_release)
+        
+        self.lower_button = Button(text='Lower', relief=RAISED, bd=4, padx=1,
+               pady=1, height=2, width=6, font=('Helvetica', 14))
+        self.lower_button.grid(row=4, column=0, padx=20, pady=5, rowspan=2)
+        self.lower_button.bind("<ButtonPress>", self.lower_button_press)
+        self.lower_button.bind("<ButtonRelease>", self.RL_button_release)
+        
+        self.preset_button = Button(text='Preset', relief=RAISED, bd=4, padx=1,
+               pady=1, height=2, width=6, font=('Helvetica', 14))
+        self.preset_button.grid(row=6, column=0, padx=5, pady=5, rowspan=2)
+        self.preset_button.bind("<ButtonPress>", self.preset_button_press)
+        
+        self.duty_scale = Scale(from_=1, to=100, orient = HORIZONTAL,
+                                resolution = 1, length=200,
+                                command = self.update_pwm_duty)
+        self.duty_scale.grid(row=3,column=1, sticky=NW)
+        
+        # Antenna preset combo box is populated with values from ini file
+        self.antenna_combobox = ttk.Combobox(width=19, font=('Helvetica', 14),
+                                            state='readonly')
+        self.antenna_combobox.grid(row=5, column=1, sticky=NW)
+        self.antenna_combobox.bind("<<ComboboxSelected>>", self.get_antenna_val)
+        
+        # Preset combo box lists the presets matching what is typed into it
+        self.preset_combobox = ttk.Combobox(width=19, font=('Helvetica', 14))
+        self.preset_combobox.grid(row=7, column=1, sticky=NW)
+        self.preset_combobox.bind("<<ComboboxSelected>>", self.get_preset_val)
+        self.preset_combobox.bind("<KeyRelease>", self.preset_filter)
+        self.preset_combobox.bind("<Return>", self.preset_enter)
+        
+        self.ini_load()         # Retrieve ini file settings and show them
+        
+        # Strip chart of position and pulse rate under the controls
+        span = self.group.store.chart_seconds
+        if span > 0:
+            canvas = Canvas(width=330, height=90, bg='white',
+                            highlightthickness=0)
+            canvas.grid(row=8, column=0, columnspan=2, padx=10, pady=5)
+            self.chart = StripChart(canvas, span)
+            self.master.geometry("350x375+150+100")
+            self.chart_reset()
+            
+        self.group.start()      # Set up GPIO for antenna control
+        # The control loop runs on a thread of its own, so a busy or
+        # blocked Tk mainloop can't hold up a ramp or a stop
+        self.control_thread = RPiAntDrv.ControlThread(self.group)
+        self.control_thread.start()
+        if self.group.store.server_port:
+            self.serve()        # Network control alongside the GUI
+        self.display_refresh()  # Start the display refresh timer
+        
+        return
+        
+    # Button commands are sent to the control thread and carried out there
+    def raise_button_press(self, _unused):
+        self.control_thread.send(self.controller.raise_antenna)
+        
+    def lower_button_press(self, _unused):
+        self.control_thread.send(self.controller.lower_antenna)
+        
+    def RL_button_release(self, _unused):
+        self.control_thread.send(self.controller.release)
+        
+    def preset_button_press(self, _unused):
+        self.control_thread.send(self.controller.goto,
+                                 self.controller.ant_preset_val)
+        
+    def confirm_newini(self):
+        okay = messagebox.askokcancel('RPiAntDrv',
+                                        'Overwrite Configuration File?',
+                                        detail='This will overwrite the '
+                                      'RPiAntDrv.ini file with default '
+                                      'values.', icon='question')
+        if okay:
+            # Overwrite the ini file and start again from it
+            self.group.halt()
+            self.group.close()
+            self.group.shared.ini_new()
+            self.ini_load()
+            self.group.start()
+            self.controller.status = "RPiAntDrv.ini written"
+        else:
+            self.controller.status = "Operation cancelled"
+            
+    def confirm_sync(self):
+        okay = messagebox.askokcancel('RPiAntDrv',
+                                        'Proceed with Sync?',
+                                        detail='This will sychronize the '
+                                      'antenna encoder count to the preset '
+                                      'value selected.', icon='question')
+        if okay:
+            # Sychronize encoder count with current preset value
+            self.controller.sync(self.controller.ant_preset_val)
+        else:
+            self.controller.status = "Encoder sync canceled"
+            
+    def ask_frequency(self):
+        # Go to any frequency, interpolated between the antenna's presets
+        freqs = self.controller.freq_index.freqs
+        if not freqs:
+            self.controller.status = "No preset frequencies"
+            return
+        mhz = simpledialog.askfloat('RPiAntDrv', 'Frequency in MHz:',
+                                    minvalue=freqs[0], maxvalue=freqs[-1],
+                                    parent=self.master)
+        if mhz is not None:
+            self.control_thread.send(self.controller.goto_frequency, mhz)
+            
+    def ask_band(self):
+        # Band change, every antenna with presets covering the frequency
+        # is tuned to it at once
+        mhz = simpledialog.askfloat('RPiAntDrv', 'Frequency in MHz for all '
+                                    'antennas:', parent=self.master)
+        if mhz is None:
+            return
+        moved = self.group.goto_frequency(mhz)
+        if moved:
+            self.control_start()
+        else:
+            self.controller.status = "%.3f MHz out of range" % mhz
+            
+    def toggle_follow(self):
+        # Keep the antenna tuned to the radio, read from rigctld
+        import RPiAntNet
+        if self.follow_radio.get():
+            store = self.controller.store
+            self.controller.follow()
+            self.rig_poller = RPiAntNet.RigPoller(self.controller,
+                                                  store.rig_host,
+                                                  store.rig_port,
+                                                  store.rig_poll)
+            self.rig_poller.start()
+            self.controller.status = "Following radio"
+            self.control_start()
+        else:
+            self.rig_poller.stop()
+            self.rig_poller = None
+            self.controller.follow(False)
+            self.controller.status = "Ready"
+            
+    def control_start(self):
+        # Tick at once after a command rather than at the next tick
+        self.control_thread.kick()
+            
+    def serve(self):
+        # Start the network server on the ini file host and port, the
+        # control thread carries out its moves as well
+        import RPiAntNet
+        store = self.controller.store
+        self.server_thread = RPiAntNet.start_server(self.controller,
+                                                    self.control_thread,
+                                                    store.server_host,
+                                                    store.server_port)
+        if self.server_thread.error is not None:
+            self.controller.status = ("Server: %s" %
+                                      self.server_thread.error.strerror)
+            self.server_thread = None
+            
+    def get_antenna_val(self, _unused):
+        # fetch new antenna configuration and presets. This stops any move
+        # of an antenna sharing the same pins, one on pins of its own
+        # carries on.
+        self.controller = self.group.controller_for(
+            self.antenna_combobox.get())
+        self.preset_combobox.set(self.controller.preset)
+        self.preset_text = None
+        self.preset_combobox['values'] = self.preset_list('')
+        self.shown_duty = None
+        self.chart_reset()
+        
+    def get_preset_val(self, _unused):
+        # get the preset value stored in the ini file
+        self.controller.select_preset(self.preset_combobox.get())
+        
+    def preset_list(self, text):
+        # Presets matching the search text, or with nothing typed those in
+        # the band of the selected preset, at most preset_limit of them
+        presets = self.controller.presets
+        if not text.strip():
+            band = RPiAntDrv.preset_fields(self.controller.preset)[0]
+            names = presets.search(band, self.preset_limit) if band else []
+            return names or presets.search('', self.preset_limit)
+        return presets.search(text, self.preset_limit)
+    
+    def preset_filter(self, event):
+        # Narrow the list down as a band or frequency is typed, e.g. 20m
+        # or 14.2
+        if event.keysym in ('Up', 'Down', 'Return', 'Escape', 'Tab'):
+            return
+        text = self.preset_combobox.get()
+        if text != self.preset_text:
+            self.preset_text = text
+            self.preset_combobox['values'] = self.preset_list(text)
+            
+    def preset_enter(self, _unused):
+        # Enter picks the preset typed, or else the first one matching
+        text = self.preset_combobox.get()
+        if text not in self.controller.presets:
+            names = self.preset_list(text)
+            if not names:
+                self.controller.status = "No preset matches %s" % text
+                return
+            text = names[0]
+            self.preset_combobox.set(text)
+        self.controller.select_preset(text)
+        
+    def update_pwm_duty(self, _unused):
+        self.controller.pwm_duty = self.duty_scale.get()
+        self.shown_duty = self.controller.pwm_duty
+        
+    def chart_reset(self):
+        # Start the chart afresh for the selected antenna, scaled to its
+        # presets
+        if self.chart is None:
+            return
+        self.chart_low, self.chart_high = (
+            self.controller.presets.count_range() or (0, 0))
+        self.chart.reset()
+        
+    def display_refresh(self):
+        # Copy controller state to the widgets once a frame, at gui_fps
+        # however fast the encoder counts, so the callback thread never
+        # touches Tk. Only redraw what has changed.
+        controller = self.controller
+        position = controller.encoder.position
+        if position != self.shown_count:
+            self.shown_count = position
+            self.encoder_count.set(position)
+        if controller.pwm_duty != self.shown_duty and controller.pwm_duty:
+            self.shown_duty = controller.pwm_duty
+            self.duty_scale.set(controller.pwm_duty)
+        if controller.status != self.shown_status:
+            self.shown_status = controller.status
+            self.status_message.set(controller.status)
+        if self.chart is not None:
+            self.chart.update(controller, controller.clock(), self.chart_low,
+                              self.chart_high)
+        self.master.after(self.display_period, self.display_refresh)
+        
+    def ini_load(self):
+        # Read the ini file, then fill the combo boxes from it
+        try:
+            self.group.load()
+        except ValueError as e:
+            messagebox.showerror('RPiAntDrv', 'RPiAntDrv.ini', detail=str(e))
+            raise SystemExit(1)
+        self.controller = self.group.controller_for(self.group.selected)
+        self.antenna_combobox['values'] = self.group.antennas
+        self.antenna_combobox.set(self.group.selected)
+        self.preset_combobox.set(self.controller.preset)
+        self.preset_text = None
+        self.preset_combobox['values'] = self.preset_list('')
+        fps = self.group.store.gui_fps
+        self.display_period = int(1000 / fps) if fps > 0 else 100
+        self.chart_reset()
+        
+    def close(self): # Cleanly close the GUI and cleanup the GPIO
+        if self.rig_poller is not None:
+            self.rig_poller.stop()
+        if self.server_thread is not None:
+            self.server_thread.stop()
+        if self.control_thread is not None:
+            self.control_thread.stop()
+        self.group.close()        # Save current settings
+        #print ("GPIO cleanup executed")        
+        self.master.destroy()
+        #print ("master window destroyed")
+        
+    def about(self):
+        popup = Toplevel()
+        popup.title("About RPiAntDrv")
+        popup.geometry("325x225+162+168")
+        popup.configure(bg= 'snow')
+        
+        popup_text1 = Label(popup, text='RPiAntDrv.py   v1.6',
+                           font = ('Helvetica', 12), wraplength=300, justify=LEFT,
+                           bg = 'snow', fg='black', padx=10, pady=10)
+        popup_text1.grid(row=0, column=0, columnspan=1)
+        
+        popup_text2 = Label(popup, text='This Python script is used to control '
+                            'a motor tuned antenna like a screwdriver antenna or '
+                            'tuned loop. Feedback from the antenna is provided by '
+                            'a simple dry contact or pulse output relative to the '
+                            'output shaft turning.',
+                           font = ('Helvetica', 12), wraplength=300, justify=LEFT,
+                           bg = 'snow', fg='black', padx=10, pady=10)
+        popup_text2.grid(row=1, column=0, columnspan=1)
+        
+    def timing(self):
+        # Wake up, command and stop latency of the control loop, kept up to
+        # date while the window is open
+        popup = Toplevel()
+        popup.title("RPiAntDrv Timing")
+        popup.geometry("+162+168")
+        popup.configure(bg= 'snow')
+        
+        popup_text = Label(popup, textvariable=self.timing_text,
+                           font = ('Courier', 10), justify=LEFT, anchor=NW,
+                           bg = 'snow', fg='black', padx=10, pady=10)
+        popup_text.grid(row=0, column=0, columnspan=2, sticky=NW)
+        
+        reset_button = Button(popup, text='Reset', command=self.timing_reset)
+        reset_button.grid(row=1, column=0, padx=10, pady=5, sticky=W)
+        close_button = Button(popup, text='Close', command=popup.destroy)
+        close_button.grid(row=1, column=1, padx=10, pady=5, sticky=E)
+        self.timing_refresh(popup)
+        
+    def timing_refresh(self, popup):
+        if not popup.winfo_exists():
+            return
+        control = self.control_thread
+        lines = ['Control thread: ' + ', '.join(control.rt_status),
+                 control.wake.summary()]
+        for controller in self.group.started:
+            lines += ['', controller.antenna,
+                      '  ' + controller.command_latency.summary(),
+                      '  ' + controller.stop_latency.summary()]
+        stop = self.controller.stop_latency
+        if stop.total:
+            lines += ['', '%s stop latency' % self.controller.antenna]
+            lines += ['  <= %8s %6d %s' % row for row in stop.rows(24)]
+        self.timing_text.set('\n'.join(lines))
+        self.master.after(1000, self.timing_refresh, popup)
+        
+    def timing_reset(self):
+        self.control_thread.wake.reset()
+        self.control_thread.worst_late = 0.0
+        for controller in self.group.started:
+            controller.command_latency.reset()
+            controller.stop_latency.reset()
+        
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='RPiAntGui.py', description='Drive a motor tuned antenna.')
+    parser.add_argument('--sim', action='store_true',
+                        help='drive simulated antennas (RPiAntSim.py) rather '
+                        'than the GPIO pins')
+    args = parser.parse_args(argv)
+    
+    # root window created. Here, that would be the only window, but
+    # you can later have windows within windows.
+    root = Tk()
+    # Without RPi.GPIO the antenna would only seem to move, say why
+    # rather than quietly simulating it
+    if RPiAntDrv.GPIO is None and not args.sim:
+        root.withdraw()
+        messagebox.showerror('RPiAntDrv', 'RPi.GPIO is not available',
+                             detail='%s\n\nRun RPiAntGui.py --sim to drive '
+                             'a simulated antenna.' % RPiAntDrv.GPIO_ERROR)
+        root.destroy()
+        return 1
+    app = Window(root, RPiAntDrv.AntennaGroup(simulate=args.sim)) #creation of an instance
+    root.protocol("WM_DELETE_WINDOW", app.close) # cleanup GPIO when X closes window
+    root.mainloop() # Loops forever
+    return 0
+    
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,885 @@
+#! /usr/bin/python3
+##################################################################
+#
+# Raspberry Pi Antenna Driver telemetry (RPiAntLog.py)
+#
+# Always on flight recorder for the antenna. Every encoder pulse,
+# motor start, stop, reversal and duty change, move and stall is kept
+# as a fixed size 16 byte record:
+#
+#   time     float64  controller clock, seconds
+#   kind     int8     PULSE, UP, DOWN, ... below
+#   dir      int8     +1 up, -1 down, 0 if it doesn't apply
+#   duty     int16    PWM duty in percent
+#   position int32    encoder count (target of GOTO and RETARGET,
+#                     microseconds for LATENCY)
+#
+# Commands are packed into a preallocated ring as they happen. Pulses
+# cost nothing extra, they are already stamped into the EncoderCounter
+# ring and are copied out of it in bulk. TelemetryWriter moves both
+# to a set of preallocated files, written through mmap and used round
+# robin, every quarter second.
+#
+# Run on its own to analyse a capture:
+#   RPiAntLog.py [FILE or DIRECTORY]     speed profile of each move,
+#                                        pulse intervals, overshoot,
+#                                        command and stop latency
+#   RPiAntLog.py --dump FILE             every record
+#
+# Also here is the position journal, which keeps the antenna's encoder
+# count safe through a power cut or crash (see PositionJournal).
+# Only what RPiAntDrv.py needs to record is imported up front, the
+# capture file and analysis modules are imported when they're used.
+#
+##################################################################
+
+from array import array
+import heapq
+import math
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+
+MAGIC = b'RPAT'
+VERSION = 1
+# File header: magic, version, record size, file sequence, records used
+HEADER = struct.Struct('<4sHHII')
+RECORD = struct.Struct('<dbbhi')
+PATTERN = 'RPiAntDrv-%d.rpat'
+
+# Record kinds
+PULSE = 1          # Encoder pulse
+UP = 2             # Motor started or reversed raising
+DOWN = 3           # Motor started or reversed lowering
+STOP = 4           # Motor switched off
+DUTY = 5           # Duty changed while running
+STALL = 6          # Stall detected, motor switched off
+BINDING = 7        # Antenna binding warning
+GOTO = 8           # Move started, position is the target
+RETARGET = 9       # Move in progress given a new target
+MANUAL = 10        # Raise or Lower pressed
+HALT = 11          # Stop pressed
+SYNC = 12          # Encoder count set, or start of a capture
+LOST = 13          # Pulses overwritten before they were copied out
+LATENCY = 14       # Command reached the GPIO pins, position is uS taken
+WATCHDOG = 15      # Watchdog cut the motor, dir is the deadline missed
+
+KIND_NAMES = {PULSE: 'pulse', UP: 'up', DOWN: 'down', STOP: 'stop',
+              DUTY: 'duty', STALL: 'stall', BINDING: 'binding',
+              GOTO: 'goto', RETARGET: 'retarget', MANUAL: 'manual',
+              HALT: 'halt', SYNC: 'sync', LOST: 'lost',
+              LATENCY: 'latency', WATCHDOG: 'watchdog'}
+
+# LATENCY records, in the dir field
+COMMAND_LATENCY = 0   # Button or network command to its first GPIO write
+STOP_LATENCY = 1      # Reason to stop (Stop pressed, stop point pulse,
+                      # stall deadline) to the motor pins switched off
+
+# WATCHDOG records, in the dir field
+HEARTBEAT_DEADLINE = 0  # Motor running and the control loop stopped ticking
+RUN_DEADLINE = 1        # Motor ran longer than the distance allowed for
+
+# Position journal header: magic, version, record size
+JOURNAL_MAGIC = b'RPAJ'
+JOURNAL_HEADER = struct.Struct('<4sHH')
+# Journal record: sequence, encoder count, CRC32 of the antenna name,
+# then a CRC32 of those three
+JOURNAL_ENTRY = struct.Struct('<QiI')
+JOURNAL_CRC = struct.Struct('<I')
+JOURNAL_RECORD_SIZE = JOURNAL_ENTRY.size + JOURNAL_CRC.size
+
+class LatencyHistogram:
+    # Latencies counted in log spaced buckets, four to a doubling from
+    # 1 uS up to about 16 s, in a preallocated array. record() is a few
+    # sums and a log2 so it can be called from the control thread and
+    # the encoder callback. Percentiles are the top of their bucket, so
+    # read high by at most a fifth, but never above the worst seen.
+    BUCKETS = 97
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = array('l', bytes(array('l').itemsize * self.BUCKETS))
+        self.reset()
+
+    def reset(self):
+        for i in range(self.BUCKETS):
+            self.counts[i] = 0
+        self.total = 0
+        self.worst = 0.0
+
+    def record(self, seconds):
+        us = seconds * 1e6
+        if us < 1.0:
+            i = 0
+        else:
+            i = min(self.BUCKETS - 1, 1 + int(4 * math.log2(us)))
+        self.counts[i] += 1
+        self.total += 1
+        if seconds > self.worst:
+            self.worst = seconds
+
+    def percentile(self, p):
+        # Seconds p percent of the latencies were within, None if empty
+        if not self.total:
+            return None
+        wanted = math.ceil(self.total * p / 100.0)
+        seen = 0
+        for i in range(self.BUCKETS):
+            seen += self.counts[i]
+            if seen >= wanted:
+                return min(self.worst, 2 ** (i / 4.0) * 1e-6)
+        return self.worst
+
+    def summary(self):
+        if not self.total:
+            return '%s: none yet' % self.name
+        return '%s: %d  p50 %s  p99 %s  max %s' % (
+            self.name, self.total, format_latency(self.percentile(50)),
+            format_latency(self.percentile(99)), format_latency(self.worst))
+
+    def rows(self, width=30):
+        # (label, count, bar) for each bucket from the first to the last
+        # used, two buckets to a row
+        used = [i for i in range(self.BUCKETS) if self.counts[i]]
+        if not used:
+            return []
+        first, last = used[0] // 2 * 2, used[-1] // 2 * 2
+        rows = []
+        for i in range(first, last + 1, 2):
+            rows.append((format_latency(2 ** ((i + 1) / 4.0) * 1e-6),
+                         self.counts[i] + self.counts[i + 1]))
+        widest = max(n for _label, n in rows)
+        return [(label, n, '#' * math.ceil(width * n / widest))
+                for label, n in rows]
+
+def format_latency(seconds):
+    if seconds < 0.001:
+        return '%.0f uS' % (seconds * 1e6)
+    if seconds < 1.0:
+        return '%.1f mS' % (seconds * 1e3)
+    return '%.2f s' % seconds
+
+class Telemetry:
+    # In memory side of the recorder. event() is called by the controller
+    # and, when a move trips its stop point, by the GPIO callback thread,
+    # so slots are claimed under a lock that is almost never contended.
+    # The encoder callback itself never calls in here.
+    def __init__(self, encoder, size=4096):
+        if size & (size - 1):
+            raise ValueError('Ring size must be a power of two')
+        self.encoder = encoder
+        self.clock = encoder.clock
+        self.mask = size - 1
+        self.ring = bytearray(RECORD.size * size) # Packed event records
+        self.lock = threading.Lock()
+        self.written = 0              # Events recorded, ring write index
+        self.flushed = 0              # Events taken by collect()
+        self.dropped = 0              # Events overwritten before collect()
+        self.copied = encoder.pulses  # Pulses taken from the encoder ring
+        self.count = encoder.count    # Raw encoder count at the last of them
+        self.lost = 0                 # Pulses overwritten before collect()
+        self.duty = 0                 # Duty in the last motor record
+
+    def event(self, kind, position, duty=0, direction=0):
+        with self.lock:
+            # Stamped under the lock so the ring is in time order
+            now = self.clock()
+            i = self.written
+            RECORD.pack_into(self.ring, (i & self.mask) * RECORD.size, now,
+                             kind, direction, duty, position)
+            self.written = i + 1
+
+    def motor(self, kind, position, duty):
+        # Motor started or reversed
+        self.duty = duty
+        self.event(kind, position, duty, 1 if kind == UP else -1)
+
+    def change_duty(self, position, duty, direction):
+        # Running motor sped up or slowed down, only recorded if it did
+        if duty != self.duty:
+            self.duty = duty
+            self.event(DUTY, position, duty, direction)
+
+    def collect(self):
+        # Records since the last call in time order, as tuples. Anything
+        # stamped after the call started waits for the next one, so one
+        # batch never overlaps the next. Only one thread may call this.
+        now = self.clock()
+        return list(heapq.merge(self.events(now), self.pulses(now)))
+
+    def events(self, now):
+        end = self.written
+        start = self.flushed
+        size = self.mask + 1
+        if end - start > size:
+            self.dropped += end - start - size
+            start = end - size
+        if start == end:
+            return []
+        rs = RECORD.size
+        a = (start & self.mask) * rs
+        b = (end & self.mask) * rs
+        ring = self.ring
+        if a < b:
+            data = bytes(ring[a:b])
+        else:
+            data = bytes(ring[a:]) + bytes(ring[:b])
+        records = list(RECORD.iter_unpack(data))
+        while records and records[-1][0] > now:
+            records.pop()
+            end -= 1
+        self.flushed = end
+        return records
+
+    def pulses(self, now):
+        # Copy new pulses out of the encoder ring, a slice at a time
+        encoder = self.encoder
+        mask = encoder.mask
+        end = encoder.pulses
+        start = self.copied
+        records = []
+        if end - start > mask + 1:
+            # Fell too far behind, pick up the count again from the encoder
+            missed = end - start - mask - 1
+            self.lost += missed
+            start = end - mask - 1
+            self.count = encoder.count - sum(encoder.dirs[i & mask]
+                                             for i in range(start, end))
+            records.append((encoder.stamps[start & mask], LOST, 0, 0, missed))
+        while end > start and encoder.stamps[(end - 1) & mask] > now:
+            end -= 1
+        if start == end:
+            self.copied = start
+            return records
+        a = start & mask
+        b = end & mask
+        if a < b:
+            stamps = encoder.stamps[a:b]
+            dirs = encoder.dirs[a:b]
+        else:
+            stamps = encoder.stamps[a:] + encoder.stamps[:b]
+            dirs = encoder.dirs[a:] + encoder.dirs[:b]
+        # Positions include the sync offset as it is now, a sync while
+        # these pulses waited would shift them, but the antenna is
+        # normally still when it is synchronised
+        count = self.count
+        offset = encoder.offset
+        for stamp, d in zip(stamps, dirs):
+            count += d
+            records.append((stamp, PULSE, d, 0, count + offset))
+        self.count = count
+        self.copied = end
+        return records
+
+class TelemetryFiles:
+    # A set of preallocated capture files in one directory, written
+    # through mmap and reused round robin, so the recorder runs forever
+    # in a fixed amount of disk and never waits on a file growing.
+    # Each file starts with a header giving its sequence number and how
+    # many of its records are in use.
+    def __init__(self, directory, files=2, size=1 << 20):
+        self.directory = directory
+        self.files = files
+        self.capacity = (size - HEADER.size) // RECORD.size # Records per file
+        self.size = HEADER.size + self.capacity * RECORD.size
+        self.map = None
+        self.file = None
+        self.used = 0
+        os.makedirs(directory, exist_ok=True)
+        # Carry on from the newest file already there
+        self.sequence = max([info[0] for info in
+                             map(read_header, capture_files(directory))
+                             if info is not None], default=-1)
+        self.rotate()
+
+    def rotate(self):
+        import mmap
+        self.close()
+        self.sequence += 1
+        path = os.path.join(self.directory,
+                            PATTERN % (self.sequence % self.files))
+        self.file = open(path, 'a+b')
+        self.file.truncate(self.size)
+        self.map = mmap.mmap(self.file.fileno(), self.size)
+        self.used = 0
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, RECORD.size,
+                         self.sequence, 0)
+
+    def write(self, records):
+        while records:
+            room = self.capacity - self.used
+            if room == 0:
+                self.rotate()
+                continue
+            chunk = records[:room]
+            records = records[room:]
+            data = b''.join([RECORD.pack(*record) for record in chunk])
+            offset = HEADER.size + self.used * RECORD.size
+            self.map[offset:offset + len(data)] = data
+            self.used += len(chunk)
+            # Records first, then the count that makes them part of the file
+            HEADER.pack_into(self.map, 0, MAGIC, VERSION, RECORD.size,
+                             self.sequence, self.used)
+
+    def close(self):
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.file.close()
+            self.map = None
+
+class TelemetryWriter(threading.Thread):
+    # Moves records from a Telemetry to TelemetryFiles every period seconds
+    def __init__(self, telemetry, files, period=0.25):
+        threading.Thread.__init__(self, name='RPiAntDrv telemetry', daemon=True)
+        self.telemetry = telemetry
+        self.files = files
+        self.period = period
+        self.stopping = threading.Event()
+        self.records = 0           # Records written so far
+        # Start the capture off from a known position
+        telemetry.event(SYNC, telemetry.encoder.position)
+
+    def run(self):
+        while not self.stopping.wait(self.period):
+            self.flush()
+        self.flush()
+        self.files.close()
+
+    def flush(self):
+        records = self.telemetry.collect()
+        self.files.write(records)
+        self.records += len(records)
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+def antenna_key(name):
+    # What the journal keeps of an antenna name
+    return zlib.crc32(name.encode('utf-8'))
+
+def sync_directory(path):
+    # Make a rename into the directory holding path stick
+    try:
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    os.close(dir_fd)
+
+# fdatasync skips the inode times, where there is one
+datasync = getattr(os, 'fdatasync', os.fsync)
+
+class PositionJournal:
+    # Append only file of where the antenna is, so a power cut, kill or
+    # crash doesn't lose the count the way saving it to the ini file on
+    # close does. Each record is 20 bytes with a CRC32, so one torn by a
+    # power cut is just passed over. The newest record is found by
+    # reading back from the end of the file, normally only the last
+    # record is read however big the file is. Once the file reaches
+    # max_size it is compacted to its newest record, through a new file
+    # renamed over the old one.
+    def __init__(self, path, max_size=64 << 10):
+        self.path = path
+        self.max_size = max_size
+        self.fd = None
+        self.size = 0              # Bytes in the file up to the newest record
+        self.sequence = 0          # Sequence number of the newest record
+        self.last = None           # (count, antenna) of the newest record
+        self.records = 0           # Records written since opened
+        self.syncs = 0             # fsyncs since opened
+        self.compactions = 0       # Times compacted since opened
+        self.written = 0           # Bytes written since opened
+
+    def recover(self):
+        # (count, antenna key) of the newest good record, None if there
+        # isn't one. Only reads the file.
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            found = self.newest(fd)
+        finally:
+            os.close(fd)
+        if found is None:
+            return None
+        return found[2], found[3]
+
+    def since(self, sequence):
+        # (sequence, count, antenna key) of the newest good record and the
+        # count in record sequence, None if that has been compacted away.
+        # None if there is no good record. Only reads the file, back from
+        # the end as far as sequence.
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            newest = None
+            for _end, number, count, antenna in self.backwards(fd):
+                if newest is None:
+                    newest = number, count, antenna
+                if number <= sequence:
+                    return newest + (count if number == sequence else None,)
+            return None if newest is None else newest + (None,)
+        finally:
+            os.close(fd)
+
+    def newest(self, fd):
+        # (end offset, sequence, count, antenna key) of the newest good
+        # record, read back from the end of the file
+        return next(self.backwards(fd), None)
+
+    def backwards(self, fd):
+        # (end offset, sequence, count, antenna key) of each good record,
+        # newest first
+        header = os.pread(fd, JOURNAL_HEADER.size, 0)
+        if len(header) < JOURNAL_HEADER.size:
+            return
+        magic, version, size = JOURNAL_HEADER.unpack(header)
+        if magic != JOURNAL_MAGIC or version != VERSION or \
+           size != JOURNAL_RECORD_SIZE:
+            return
+        records = (os.fstat(fd).st_size - JOURNAL_HEADER.size) // size
+        for i in range(records - 1, -1, -1):
+            offset = JOURNAL_HEADER.size + i * size
+            data = os.pread(fd, size, offset)
+            crc, = JOURNAL_CRC.unpack_from(data, JOURNAL_ENTRY.size)
+            if zlib.crc32(data[:JOURNAL_ENTRY.size]) == crc:
+                sequence, count, antenna = JOURNAL_ENTRY.unpack_from(data)
+                yield offset + size, sequence, count, antenna
+
+    def open(self):
+        # Open for writing, dropping anything after the newest good record
+        # so new records carry on from it. Returns its (count, antenna
+        # key) like recover().
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        found = self.newest(self.fd)
+        if found is None:
+            header = JOURNAL_HEADER.pack(JOURNAL_MAGIC, VERSION,
+                                         JOURNAL_RECORD_SIZE)
+            os.ftruncate(self.fd, 0)
+            os.pwrite(self.fd, header, 0)
+            self.size = len(header)
+            self.sync()
+            return None
+        self.size, self.sequence, count, antenna = found
+        if os.fstat(self.fd).st_size != self.size:
+            os.ftruncate(self.fd, self.size)
+        return count, antenna
+
+    def append(self, count, antenna):
+        # Add a record, not on disk until sync()
+        self.sequence += 1
+        entry = JOURNAL_ENTRY.pack(self.sequence, count, antenna_key(antenna))
+        record = entry + JOURNAL_CRC.pack(zlib.crc32(entry))
+        if self.size + len(record) > self.max_size:
+            self.compact(record)
+        else:
+            os.pwrite(self.fd, record, self.size)
+            self.size += len(record)
+            self.written += len(record)
+        self.last = (count, antenna)
+        self.records += 1
+
+    def sync(self):
+        datasync(self.fd)
+        self.syncs += 1
+
+    def compact(self, record):
+        # Start a new file with just this record in it
+        tmp_path = self.path + '.tmp'
+        data = JOURNAL_HEADER.pack(JOURNAL_MAGIC, VERSION,
+                                   JOURNAL_RECORD_SIZE) + record
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        sync_directory(self.path)
+        os.close(self.fd)
+        self.fd = os.open(self.path, os.O_RDWR)
+        self.size = len(data)
+        self.written += len(data)
+        self.compactions += 1
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+class JournalWriter(threading.Thread):
+    # Keeps a PositionJournal up to date from state(), which gives the
+    # (count, antenna, moving) of the antenna, looked at every period
+    # seconds. While the antenna moves its position is appended every
+    # move_interval seconds, which survives the program being killed, but
+    # only synced every sync_interval seconds. Once it has been at rest
+    # for rest_delay seconds the final position is synced, so a burst of
+    # short moves and nudges costs one fsync rather than one each.
+    # checkpoint() journals the position at once, for a save of the ini
+    # file, on another thread, to refer to.
+    def __init__(self, journal, state, period=0.5, move_interval=1.0,
+                 sync_interval=10.0, rest_delay=1.0, clock=time.monotonic):
+        threading.Thread.__init__(self, name='RPiAntDrv journal', daemon=True)
+        self.journal = journal
+        self.state = state
+        self.period = period
+        self.move_interval = move_interval
+        self.sync_interval = sync_interval
+        self.rest_delay = rest_delay
+        self.clock = clock
+        self.stopping = threading.Event()
+        self.lock = threading.Lock() # Between this thread and checkpoint()
+        self.due = 0.0             # When a record is due while moving
+        self.rested = None         # When the antenna came to rest
+        self.started = None        # When it started moving
+        self.synced = 0.0          # When the journal was last synced
+        self.dirty = False         # Records written since then
+
+    def run(self):
+        while not self.stopping.wait(self.period):
+            self.poll(self.clock())
+        self.flush()
+        self.journal.close()
+
+    def poll(self, now):
+        with self.lock:
+            self.update(now)
+
+    def update(self, now):
+        count, antenna, moving = self.state()
+        if moving:
+            if self.rested is not None or self.started is None:
+                self.started = now
+            self.rested = None
+            if now >= self.due:
+                self.due = now + self.move_interval
+                self.write(count, antenna)
+            if self.dirty and now - max(self.synced, self.started) >= \
+               self.sync_interval:
+                self.sync(now)
+            return
+        if self.rested is None:
+            self.rested = now
+        self.due = now + self.move_interval
+        self.write(count, antenna)
+        if self.dirty and now - self.rested >= self.rest_delay:
+            self.sync(now)
+
+    def write(self, count, antenna):
+        if (count, antenna) != self.journal.last:
+            self.journal.append(count, antenna)
+            self.dirty = True
+
+    def sync(self, now):
+        self.journal.sync()
+        self.synced = now
+        self.dirty = False
+
+    def flush(self):
+        # Record where the antenna is now, moving or not
+        self.checkpoint()
+
+    def checkpoint(self):
+        # Journal and sync where the antenna is now, returns the (sequence,
+        # count) of the record it is in
+        with self.lock:
+            count, antenna, _moving = self.state()
+            self.write(count, antenna)
+            if self.dirty:
+                self.sync(self.clock())
+            return self.journal.sequence, count
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+def capture_files(directory):
+    import glob
+    return glob.glob(os.path.join(directory, '*.rpat'))
+
+def read_header(path):
+    # (sequence, records) of a capture file, None if it isn't one
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(HEADER.size)
+    except OSError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, version, size, sequence, used = HEADER.unpack(data)
+    if magic != MAGIC or version != VERSION or size != RECORD.size:
+        return None
+    return sequence, used
+
+def record_columns(data):
+    # The fields of packed RECORDs as arrays (time, kind, direction, duty,
+    # position). Every field is aligned to its own size within the 16
+    # byte record, so a view of the data as that type, stepped one record
+    # at a time, is one column, copied out in C with no tuple per record.
+    view = memoryview(data)[:len(data) // RECORD.size * RECORD.size]
+    columns = []
+    offset = 0
+    for code in RECORD.format[1:]:
+        size = struct.calcsize('<' + code)
+        column = array(code)
+        column.frombytes(view.cast(code)[
+            offset // size::RECORD.size // size].tobytes())
+        if sys.byteorder == 'big':
+            column.byteswap()
+        columns.append(column)
+        offset += size
+    return columns
+
+class Capture:
+    # A capture loaded into columns, oldest record first. A directory
+    # is all of its capture files in sequence order.
+    def __init__(self, path):
+        if os.path.isdir(path):
+            paths = capture_files(path)
+        else:
+            paths = [path]
+        found = []
+        for name in paths:
+            info = read_header(name)
+            if info is None:
+                raise ValueError('%s is not a telemetry capture' % name)
+            found.append((info[0], name, info[1]))
+        self.times = array('d')
+        self.kinds = array('b')
+        self.dirs = array('b')
+        self.duties = array('h')
+        self.positions = array('i')
+        for _sequence, name, used in sorted(found):
+            with open(name, 'rb') as f:
+                f.seek(HEADER.size)
+                data = f.read(used * RECORD.size)
+            times, kinds, dirs, duties, positions = record_columns(data)
+            self.times.extend(times)
+            self.kinds.extend(kinds)
+            self.dirs.extend(dirs)
+            self.duties.extend(duties)
+            self.positions.extend(positions)
+
+    def __len__(self):
+        return len(self.times)
+
+    def records(self):
+        return zip(self.times, self.kinds, self.dirs, self.duties,
+                   self.positions)
+
+    def moves(self):
+        # Split the capture into moves. A move runs from GOTO to the next
+        # command, so pulses while it coasts to rest count towards it.
+        moves = []
+        move = None
+        position = None
+        for t, kind, _d, _duty, pos in self.records():
+            if kind == PULSE:
+                position = pos
+                if move is not None:
+                    move.pulse(t, pos)
+            elif kind == GOTO:
+                move = Move(t, position, pos)
+                moves.append(move)
+            elif kind == RETARGET:
+                if move is not None:
+                    move.target = pos
+                    move.retargets += 1
+            elif kind == LOST:
+                if move is not None:
+                    move.lost += pos
+            elif kind == LATENCY:
+                pass
+            else:
+                position = pos
+                if kind == STALL and move is not None:
+                    move.stalled = True
+                if kind == WATCHDOG and move is not None:
+                    move.cut = True
+                if kind in (MANUAL, HALT, SYNC, STALL, WATCHDOG):
+                    move = None
+        return moves
+
+    def latency(self):
+        # LATENCY records in a LatencyHistogram of each kind
+        latency = {COMMAND_LATENCY: LatencyHistogram('Command'),
+                   STOP_LATENCY: LatencyHistogram('Stop')}
+        for kind, which, us in zip(self.kinds, self.dirs, self.positions):
+            if kind == LATENCY and which in latency:
+                latency[which].record(us * 1e-6)
+        return latency
+
+    def intervals(self):
+        # Time between pulses while the motor was running, in seconds
+        intervals = []
+        running = False
+        last = None
+        for t, kind, _d, _duty, _pos in self.records():
+            if kind == PULSE:
+                if running and last is not None:
+                    intervals.append(t - last)
+                last = t
+            elif kind in (UP, DOWN):
+                running = True
+                last = None     # Spin up from rest isn't an interval
+            elif kind in (STOP, STALL, LOST, WATCHDOG):
+                running = False
+                last = None
+        return intervals
+
+class Move:
+    def __init__(self, start, position, target):
+        self.start = start
+        self.origin = position     # None if no position was known yet
+        self.target = target
+        self.times = []            # Pulse times
+        self.positions = []        # Count after each pulse
+        self.retargets = 0
+        self.lost = 0
+        self.stalled = False
+        self.cut = False           # Cut short by the watchdog
+
+    def pulse(self, t, position):
+        self.times.append(t)
+        self.positions.append(position)
+
+    @property
+    def final(self):
+        return self.positions[-1] if self.positions else self.origin
+
+    @property
+    def duration(self):
+        return self.times[-1] - self.start if self.times else 0.0
+
+    def overshoot(self):
+        # Furthest the antenna went past the target, 0 if it never did
+        if not self.positions or self.origin is None:
+            return 0
+        direction = 1 if self.target >= self.origin else -1
+        return max(0, max((p - self.target) * direction
+                          for p in self.positions))
+
+    def profile(self, step):
+        # Pulses/s in each step seconds of the move
+        bins = [0] * (int(self.duration / step) + 1)
+        for t in self.times:
+            bins[int((t - self.start) / step)] += 1
+        return [n / step for n in bins]
+
+# Pulse interval histogram bin edges in seconds
+INTERVAL_BINS = (0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+def histogram(values, edges):
+    counts = [0] * (len(edges) + 1)
+    for v in values:
+        i = 0
+        while i < len(edges) and v >= edges[i]:
+            i += 1
+        counts[i] += 1
+    return counts
+
+def report(capture, step=0.25, limit=20):
+    moves = capture.moves()
+    print ('%d records, %d moves' % (len(capture), len(moves)))
+    counts = {}
+    for kind in capture.kinds:
+        counts[kind] = counts.get(kind, 0) + 1
+    print ('  ' + '  '.join('%s %d' % (KIND_NAMES.get(k, k), n)
+                            for k, n in sorted(counts.items())))
+    if moves:
+        print ('\nMoves (pulses/s every %g s)' % step)
+        print ('  start s   from     to  final  over  time s  profile')
+        t0 = capture.times[0]
+        for move in moves[-limit:]:
+            flags = ' stalled' if move.stalled else ''
+            if move.cut:
+                flags += ' cut by watchdog'
+            if move.retargets:
+                flags += ' retargeted %d' % move.retargets
+            print ('  %7.2f  %5s  %5d  %5s  %4d  %6.2f  %s%s' % (
+                move.start - t0,
+                '-' if move.origin is None else move.origin, move.target,
+                '-' if move.final is None else move.final,
+                move.overshoot(), move.duration,
+                ' '.join('%.0f' % r for r in move.profile(step)), flags))
+        if len(moves) > limit:
+            print ('  (last %d of %d)' % (limit, len(moves)))
+    intervals = capture.intervals()
+    if intervals:
+        print ('\nPulse intervals while running, %d, median %.1f mS' % (
+            len(intervals), 1000 * sorted(intervals)[len(intervals) // 2]))
+        bins = histogram(intervals, INTERVAL_BINS)
+        widest = max(bins)
+        labels = (['< %g' % (1000 * INTERVAL_BINS[0])] +
+                  ['%g-%g' % (1000 * a, 1000 * b) for a, b
+                   in zip(INTERVAL_BINS, INTERVAL_BINS[1:])] +
+                  ['>= %g' % (1000 * INTERVAL_BINS[-1])])
+        for label, n in zip(labels, bins):
+            print ('  %10s mS %6d %s' % (label, n, '#' * round(40 * n / widest)))
+    finished = [m for m in moves if m.origin is not None and m.positions
+                and not m.stalled and not m.cut]
+    if finished:
+        overshoots = [m.overshoot() for m in finished]
+        errors = [m.final - m.target for m in finished]
+        print ('\nOvershoot over %d moves: mean %.2f  worst %d  past target %d'
+               % (len(finished), sum(overshoots) / len(finished),
+                  max(overshoots), sum(1 for o in overshoots if o)))
+        print ('Final error: off target %d  worst %d' % (
+            sum(1 for e in errors if e), max(abs(e) for e in errors)))
+    lost = sum(p for k, p in zip(capture.kinds, capture.positions)
+               if k == LOST)
+    print ('Stalls %d (%d during moves)  lost pulses %d' % (
+        counts.get(STALL, 0), sum(1 for m in moves if m.stalled), lost))
+    cuts = [d for k, d in zip(capture.kinds, capture.dirs) if k == WATCHDOG]
+    if cuts:
+        print ('Watchdog cuts %d  (heartbeat %d, run time %d)' % (
+            len(cuts), cuts.count(HEARTBEAT_DEADLINE), cuts.count(RUN_DEADLINE)))
+    latency = capture.latency()
+    if latency[COMMAND_LATENCY].total or latency[STOP_LATENCY].total:
+        print ('\nLatency to the GPIO pins')
+        for which in (COMMAND_LATENCY, STOP_LATENCY):
+            print ('  ' + latency[which].summary())
+
+def dump(capture):
+    t0 = capture.times[0] if len(capture) else 0.0
+    for t, kind, d, duty, pos in capture.records():
+        print ('%10.4f %-8s %2d %3d %6d' % (t - t0, KIND_NAMES.get(kind, kind),
+                                           d, duty, pos))
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Analyse RPiAntDrv telemetry captures.')
+    parser.add_argument('path', nargs='?', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'telemetry'),
+        help='capture file or directory (default the telemetry directory '
+        'next to this script)')
+    parser.add_argument('--dump', action='store_true',
+                        help='print every record')
+    parser.add_argument('--step', type=float, default=0.25,
+                        help='seconds per speed profile step')
+    parser.add_argument('--moves', type=int, default=20,
+                        help='most recent moves to list')
+    args = parser.parse_args()
+    try:
+        capture = Capture(args.path)
+    except (OSError, ValueError) as e:
+        print (e)
+        return 1
+    if args.dump:
+        dump(capture)
+    else:
+        report(capture, args.step, args.moves)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
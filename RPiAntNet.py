@@ -0,0 +1,397 @@
+#! /usr/bin/python3
+##################################################################
+#
+# Raspberry Pi Antenna Driver network server (RPiAntNet.py)
+#
+# asyncio TCP server for station software, in the style of Hamlib
+# rigctld/rotctld: one command per line, short or long (\) form,
+# RPRT n for the result of a set command.
+#
+#   p  \get_pos               encoder position
+#   s  \get_status            state, position and status text
+#   e  \get_encoder           pulses accepted, bounces rejected, window mS
+#   P  \set_pos COUNT         move to an encoder count
+#   G  \goto_preset NAME      move to a preset of the selected antenna
+#   F  \set_freq MHZ          move to a frequency between presets
+#   R  \raise   L  \lower     run the motor until stop, stall or hang up
+#   S  \stop                  stop any move
+#   W  \watch [1|0]           subscribe to "pos COUNT STATE" lines
+#   q  \quit                  close the connection
+#
+# Started with RPiAntDrv.py --serve, or from the GUI when server_port
+# is set in the ini file.
+#
+# RigPoller is the other way round, a client of rigctld that feeds the
+# radio's frequency to RPiAntDrv.FrequencyFollower.
+#
+##################################################################
+
+import asyncio
+import signal
+import socket
+import threading
+
+import RPiAntDrv
+
+DEFAULT_PORT = 4533      # Same as rotctld
+RIGCTLD_PORT = 4532
+
+# Hamlib style result codes
+RPRT_OK = 0
+RPRT_EINVAL = -1         # Bad argument
+RPRT_ENIMPL = -4         # Unknown command
+
+# Short command letters to long command names
+SHORT_COMMANDS = {'p': 'get_pos',
+                  's': 'get_status',
+                  'e': 'get_encoder',
+                  'P': 'set_pos',
+                  'G': 'goto_preset',
+                  'F': 'set_freq',
+                  'R': 'raise',
+                  'L': 'lower',
+                  'S': 'stop',
+                  'W': 'watch',
+                  'q': 'quit'}
+
+def antenna_state(controller):
+    # One word summary of what the antenna is doing
+    if controller.motor_stalled:
+        return 'stalled'
+    if controller.motor_running or controller.motion.busy:
+        return 'moving'
+    return 'idle'
+
+class Client:
+    # One connection. Replies are queued in order, position updates are
+    # not: a client that reads slowly only ever has the latest position
+    # waiting, so it can't back up the server or the encoder.
+    def __init__(self, writer):
+        self.writer = writer
+        self.replies = []          # Reply text not yet written
+        self.update = None         # Latest position line not yet written
+        self.watching = False      # Subscribed to position updates
+        self.manual = False        # Holding the motor on with raise/lower
+        self.closing = False
+        self.updates_sent = 0
+        self.ready = asyncio.Event()
+
+    def reply(self, text):
+        self.replies.append(text)
+        self.ready.set()
+
+    def post(self, line):
+        # Replaces any update the client hasn't been sent yet
+        self.update = line
+        self.ready.set()
+
+    async def send(self):
+        # The only writer for this connection, so drains never overlap
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            if self.replies:
+                self.writer.write(''.join(self.replies).encode())
+                self.replies = []
+            if self.update is not None:
+                self.writer.write(self.update.encode())
+                self.update = None
+                self.updates_sent += 1
+            if self.closing:
+                break
+            await self.writer.drain()
+
+class AntennaServer:
+    # Serves one AntennaController to any number of clients. Queries are
+    # answered on the event loop, commands are sent to the ControlThread
+    # that ticks the controller, as the GUI's are, and their RPRT waits
+    # for them to be carried out. The loop never takes the controller
+    # lock, so a client can't hold up a tick or a Stop from elsewhere.
+    def __init__(self, controller, control, host='127.0.0.1',
+                 port=DEFAULT_PORT, update_period=0.05):
+        self.controller = controller
+        self.control = control              # RPiAntDrv.ControlThread
+        self.host = host
+        self.port = port
+        self.update_period = update_period  # Seconds between position checks
+        self.clients = set()
+        self.handlers = set()               # Connection handler tasks
+        self.server = None
+        self.publisher = None
+        self.published = 0                  # Position changes broadcast
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host,
+                                                 self.port)
+        # Port 0 picks a free port, find out which
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.publisher = asyncio.create_task(self.publish())
+
+    async def stop(self):
+        if self.publisher is not None:
+            self.publisher.cancel()
+        if self.server is not None:
+            self.server.close()
+            # Hang up on the clients and let their handlers finish
+            for client in self.clients:
+                client.writer.close()
+            await asyncio.gather(*self.handlers, return_exceptions=True)
+            await self.server.wait_closed()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def publish(self):
+        # Poll the controller and broadcast changes. The encoder callback
+        # never waits on a client, it doesn't even know they are there.
+        last = None
+        while True:
+            controller = self.controller
+            state = (controller.encoder.position, antenna_state(controller))
+            if state != last:
+                last = state
+                line = 'pos %d %s\n' % state
+                self.published += 1
+                for client in self.clients:
+                    if client.watching:
+                        client.post(line)
+            await asyncio.sleep(self.update_period)
+
+    async def handle(self, reader, writer):
+        client = Client(writer)
+        self.clients.add(client)
+        handler = asyncio.current_task()
+        self.handlers.add(handler)
+        sender = asyncio.create_task(client.send())
+        try:
+            while not sender.done():
+                line = await reader.readline()
+                if not line:
+                    break
+                if not await self.command(client,
+                                          line.decode('ascii', 'replace')):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+            if client.manual and not self.controller.motion.busy:
+                # Don't leave the motor running for a client that's gone
+                self.control.send(self.controller.release)
+            client.closing = True
+            client.ready.set()
+            try:
+                await sender
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+            self.handlers.discard(handler)
+
+    async def run(self, command, *args):
+        # Send a controller command to the control thread and wait for it,
+        # raises what the command raised
+        loop = asyncio.get_running_loop()
+        result = loop.create_future()
+        def finish(value, error):
+            if result.done():
+                return             # Client gone and handler cancelled
+            if error is None:
+                result.set_result(value)
+            else:
+                result.set_exception(error)
+        self.control.send(command, *args,
+                          done=lambda value, error: loop.call_soon_threadsafe(
+                              finish, value, error))
+        return await result
+
+    async def command(self, client, line):
+        # Carry out one command line, returns False to hang up
+        line = line.strip()
+        if not line:
+            return True
+        if line.startswith('\\'):
+            name, _sep, arg = line[1:].partition(' ')
+        else:
+            name = SHORT_COMMANDS.get(line[0], line[0])
+            arg = line[1:]
+        arg = arg.strip()
+        controller = self.controller
+        if name == 'quit':
+            return False
+        if name == 'get_pos':
+            client.reply('%d\n' % controller.encoder.position)
+            return True
+        if name == 'get_status':
+            client.reply('%s %d %s\n' % (antenna_state(controller),
+                                         controller.encoder.position,
+                                         controller.status))
+            return True
+        if name == 'get_encoder':
+            encoder = controller.encoder
+            client.reply('%d %d %.1f\n' % (encoder.accepted, encoder.rejected,
+                                           encoder.window * 1000))
+            return True
+        result = RPRT_OK
+        try:
+            if name == 'set_pos':
+                await self.run(controller.goto, int(arg))
+            elif name == 'goto_preset':
+                # ini keys are lower case
+                await self.run(controller.goto_preset, arg.lower())
+            elif name == 'set_freq':
+                await self.run(controller.goto_frequency, float(arg))
+            elif name == 'raise':
+                await self.run(controller.raise_antenna)
+                client.manual = True
+            elif name == 'lower':
+                await self.run(controller.lower_antenna)
+                client.manual = True
+            elif name == 'stop':
+                await self.run(controller.halt)
+                client.manual = False
+            elif name == 'watch':
+                client.watching = arg != '0'
+                if client.watching:
+                    # Start the subscriber off with where it is now
+                    client.post('pos %d %s\n' % (controller.encoder.position,
+                                                 antenna_state(controller)))
+            else:
+                result = RPRT_ENIMPL
+        except (ValueError, KeyError):
+            result = RPRT_EINVAL
+        client.reply('RPRT %d\n' % result)
+        return True
+
+class ServerThread(threading.Thread):
+    # Runs an AntennaServer on its own event loop, so it can sit beside
+    # the Tk mainloop. error is set if the server couldn't start.
+    def __init__(self, server):
+        threading.Thread.__init__(self, name='RPiAntNet', daemon=True)
+        self.server = server
+        self.loop = asyncio.new_event_loop()
+        self.started = threading.Event()
+        self.error = None
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.server.start())
+        except OSError as e:
+            self.error = e
+            self.started.set()
+            return
+        self.started.set()
+        self.loop.run_forever()
+        self.loop.run_until_complete(self.server.stop())
+        self.loop.close()
+
+    def stop(self):
+        if self.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.join()
+
+class RigPoller(threading.Thread):
+    # Asks rigctld for the VFO frequency every period seconds and hands it
+    # to the controller's FrequencyFollower. rigctld can't push changes,
+    # so it has to be polled. Reconnects if rigctld goes away.
+    def __init__(self, controller, host='127.0.0.1', port=RIGCTLD_PORT,
+                 period=0.1):
+        threading.Thread.__init__(self, name='RPiAntNet rig', daemon=True)
+        self.controller = controller
+        self.host = host
+        self.port = port
+        self.period = period
+        self.retry = 2.0           # Seconds between connection attempts
+        self.stopping = threading.Event()
+        self.polls = 0
+        self.error = None          # Last connection error
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                with socket.create_connection((self.host, self.port),
+                                              timeout=2.0) as sock:
+                    self.error = None
+                    self.poll(sock.makefile('rwb'))
+            except OSError as e:
+                if self.error is None:
+                    self.controller.status = "Radio: %s" % (e.strerror or e)
+                self.error = e
+            self.stopping.wait(self.retry)
+
+    def poll(self, rig):
+        while not self.stopping.is_set():
+            rig.write(b'f\n')
+            rig.flush()
+            line = rig.readline()
+            if not line:
+                raise ConnectionResetError('rigctld hung up')
+            try:
+                hz = float(line)
+            except ValueError:
+                pass               # RPRT error from rigctld, try again
+            else:
+                follower = self.controller.follower
+                if follower is not None:
+                    follower.update(hz / 1e6)
+            self.polls += 1
+            self.stopping.wait(self.period)
+
+    def stop(self):
+        # Doesn't wait, a poll in progress can take a while to time out
+        self.stopping.set()
+
+def start_server(controller, control, host='127.0.0.1', port=DEFAULT_PORT):
+    # Serve a controller from a background thread, with its commands run
+    # by the ControlThread control, returns the thread once the server is
+    # listening, or has failed to
+    thread = ServerThread(AntennaServer(controller, control, host, port))
+    thread.start()
+    thread.started.wait()
+    return thread
+
+def serve(controller, host='127.0.0.1', port=DEFAULT_PORT):
+    # Serve until interrupted or terminated, with a thread of its own
+    # running the antenna so slow clients can't hold up motor control
+    control = RPiAntDrv.ControlThread(controller)
+    control.start()
+    server = AntennaServer(controller, control, host, port)
+    async def run():
+        await server.start()
+        print ('Serving %s on %s port %d' % (controller.antenna, host,
+                                            server.port), flush=True)
+        stopping = asyncio.Event()
+        try:
+            # Stopping a service sends SIGTERM, exit cleanly so the
+            # position gets saved
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM,
+                                                          stopping.set)
+        except NotImplementedError:
+            pass
+        await stopping.wait()
+        await server.stop()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        control.stop()
+
+def follow(controller):
+    # Follow the radio without serving, until interrupted or terminated
+    control = RPiAntDrv.ControlThread(controller)
+    control.start()
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: stopping.set())
+    try:
+        while not stopping.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        control.stop()
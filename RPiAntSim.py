@@ -0,0 +1,517 @@
+#! /usr/bin/python3
+##################################################################
+#
+# Raspberry Pi Antenna Driver simulator (RPiAntSim.py)
+#
+# Simulated DC motor tuned antenna and RPi.GPIO stand-in for
+# exercising RPiAntDrv.py without Raspberry Pi hardware. Runs on a
+# virtual clock so moves complete much faster than real time. Run it
+# on its own for a stand-in rigctld to try frequency follow with.
+#
+##################################################################
+
+import math
+import random
+import socketserver
+import threading
+import time
+
+class VirtualClock:
+    # Stand-in for time.monotonic that only moves when told to
+    def __init__(self, start=1000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+class MotorPlant:
+    # DC motor driving the antenna through a reed switch encoder. Speed
+    # follows PWM duty through a first order lag, slowed by a load that
+    # may vary with position, and the antenna coasts down after power is
+    # removed. One encoder pulse per revolution, each of which may bounce.
+    # Hard end stops stall the motor.
+    def __init__(self, clock, position=0, max_rate=20.0, min_duty=10,
+                 spin_up=0.15, coast_down=0.3, friction=4.0, minimum=-5,
+                 maximum=275, load=None, bounces=0, bounce_time=0.003,
+                 seed=1):
+        self.clock = clock
+        self.position = position + 0.5  # Revolutions, mid way between pulses
+        self.velocity = 0.0             # Signed revolutions per second
+        self.max_rate = max_rate        # Pulses/s at 100% duty
+        self.min_duty = min_duty        # Duty below which the motor won't turn
+        self.spin_up = spin_up          # Time constant with power applied
+        self.coast_down = coast_down    # Time constant with power removed
+        self.friction = friction        # Extra slowing in rev/s/s when coasting
+        self.minimum = minimum          # Lower hard end stop in revolutions
+        self.maximum = maximum          # Upper hard end stop in revolutions
+        self.load = load                # load(position) speed divisor, or None
+        self.bounces = bounces          # Most extra edges per switch closure
+        self.bounce_time = bounce_time  # Seconds the switch contacts chatter
+        self.random = random.Random(seed)
+        self.direction = 0              # +1 raise, -1 lower, 0 off
+        self.duty = 0                   # PWM duty cycle in percent
+        self.callbacks = []             # Called on each encoder falling edge
+        self.edges = []                 # Pending edge times, oldest first
+        self.edge_count = 0             # Falling edges including bounces
+        self.step_size = 0.0005         # Integration step in seconds
+        self.last_moved = clock.now     # Last time the shaft was turning
+        self.stop_hit = None            # When the motor drove into an end stop
+        self.power_off = None           # When power was last removed
+        self.starts = 0                 # Times power was applied
+        self.on_time = 0.0              # Seconds with power applied
+
+    @property
+    def count(self):
+        # True encoder count for the current shaft position
+        return math.floor(self.position)
+
+    @property
+    def moving(self):
+        return self.velocity != 0.0
+
+    @property
+    def stalled(self):
+        return self.stop_hit is not None
+
+    def drive(self, direction, duty):
+        if direction and not self.direction:
+            self.stop_hit = None
+            self.starts += 1
+        if self.direction and not direction:
+            self.power_off = self.clock.now
+        self.direction = direction
+        self.duty = duty
+
+    def stop(self):
+        self.drive(0, self.duty)
+
+    def target_velocity(self):
+        if self.direction == 0:
+            return 0.0
+        span = 100.0 - self.min_duty
+        speed = self.max_rate * max(0.0, (self.duty - self.min_duty) / span)
+        if self.load:
+            speed /= self.load(self.position)
+        return self.direction * speed
+
+    def step(self, dt):
+        # Integrate one step of dt seconds ending at clock.now + dt
+        target = self.target_velocity()
+        lag = self.spin_up if self.direction else self.coast_down
+        self.velocity += (target - self.velocity) * min(1.0, dt / lag)
+        if not self.direction:
+            # Friction brings a coasting antenna all the way to rest
+            slowed = abs(self.velocity) - self.friction * dt
+            self.velocity = math.copysign(max(0.0, slowed), self.velocity)
+        if self.direction:
+            self.on_time += dt
+        before = self.position
+        self.position += self.velocity * dt
+        # Hard end stops, driving into one stalls the motor
+        if not self.minimum <= self.position <= self.maximum:
+            self.position = min(max(self.position, self.minimum), self.maximum)
+            self.velocity = 0.0
+            if self.direction and self.stop_hit is None:
+                self.stop_hit = self.clock.now + dt
+        if self.velocity:
+            self.last_moved = self.clock.now + dt
+        if math.floor(before) != math.floor(self.position):
+            # Reed switch closes, the contacts may chatter a few times
+            edge = self.clock.now + dt
+            self.edges.append(edge)
+            if self.bounces:
+                for _ in range(self.random.randint(0, self.bounces)):
+                    self.edges.append(edge + self.random.uniform(
+                        0.0, self.bounce_time))
+                self.edges.sort()
+
+    def fire_edges(self):
+        # Call the encoder callbacks for every edge now due
+        while self.edges and self.edges[0] <= self.clock.now + 1e-9:
+            self.edges.pop(0)
+            self.edge_count += 1
+            for callback in self.callbacks:
+                callback(None)
+
+    def advance(self, seconds):
+        # Run this plant alone for the given time
+        end = self.clock.now + seconds
+        while self.clock.now < end:
+            dt = min(self.step_size, end - self.clock.now)
+            self.step(dt)
+            self.clock.advance(dt)
+            self.fire_edges()
+
+class SimPWM:
+    # Stand-in for an RPi.GPIO software PWM channel
+    def __init__(self, gpio, pin, frequency):
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty = 0
+
+    def start(self, duty):
+        self.ChangeDutyCycle(duty)
+
+    def ChangeDutyCycle(self, duty):
+        self.duty = duty
+        self.gpio.pin_changed(self.pin)
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+
+    def stop(self):
+        self.ChangeDutyCycle(0)
+
+class SimGPIO:
+    # Stand-in for the RPi.GPIO module. Motor plants are attached to the
+    # pins of their H-bridge and encoder, output and PWM writes drive the
+    # plants and encoder edges call the registered event callbacks.
+    BOARD = 10
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, clock=None):
+        self.clock = clock or VirtualClock()
+        self.mode = None
+        self.levels = {}        # Output pin levels
+        self.pwms = {}          # PWM channels by pin
+        self.plants = []        # (plant, pwm_pin, dir1_pin, dir2_pin)
+        self.encoders = {}      # Encoder pin to plant
+        self.events = {}        # Encoder pin to [callback, bouncetime, last]
+        self.step_size = 0.0005
+
+    def attach(self, plant, pwm_pin=19, dir1_pin=13, dir2_pin=15,
+               encoder_pin=11):
+        # Wire a plant to its pins, defaults match the default ini file
+        self.plants.append((plant, pwm_pin, dir1_pin, dir2_pin))
+        self.encoders[encoder_pin] = plant
+        plant.callbacks.append(lambda _c: self.edge(encoder_pin))
+        return plant
+
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        if direction == self.OUT:
+            self.output(pin, self.LOW if initial is None else initial)
+
+    def output(self, pin, value):
+        self.levels[pin] = value
+        self.pin_changed(pin)
+
+    def input(self, pin):
+        return self.levels.get(pin, self.HIGH)
+
+    def PWM(self, pin, frequency):
+        pwm = SimPWM(self, pin, frequency)
+        self.pwms[pin] = pwm
+        return pwm
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.events[pin] = [callback, (bouncetime or 0) / 1000.0, None]
+
+    def remove_event_detect(self, pin):
+        self.events.pop(pin, None)
+
+    def cleanup(self, channels=None):
+        if channels is None:
+            channels = list(self.levels) + list(self.events)
+        elif isinstance(channels, int):
+            channels = [channels]
+        for pin in channels:
+            if pin in self.levels:
+                self.output(pin, self.LOW)
+            if pin in self.pwms:
+                self.pwms.pop(pin).stop()
+            self.events.pop(pin, None)
+
+    def pin_changed(self, pin):
+        # Re-evaluate the H-bridge of any plant wired to this pin
+        for plant, pwm_pin, dir1_pin, dir2_pin in self.plants:
+            if pin not in (pwm_pin, dir1_pin, dir2_pin):
+                continue
+            dir1 = self.levels.get(dir1_pin, self.LOW)
+            dir2 = self.levels.get(dir2_pin, self.LOW)
+            pwm = self.pwms.get(pwm_pin)
+            duty = pwm.duty if pwm else 0
+            if dir1 and not dir2 and duty:
+                plant.drive(1, duty)
+            elif dir2 and not dir1 and duty:
+                plant.drive(-1, duty)
+            else:
+                plant.drive(0, duty)
+
+    def edge(self, pin):
+        # Falling edge on an encoder pin, filtered like RPi.GPIO bouncetime
+        event = self.events.get(pin)
+        if event is None:
+            return
+        callback, bouncetime, last = event
+        now = self.clock.now
+        if last is not None and now - last <= bouncetime:
+            return
+        event[2] = now
+        if callback:
+            callback(pin)
+
+    def advance(self, seconds):
+        # Run all attached plants in lock step on the shared clock
+        end = self.clock.now + seconds
+        while self.clock.now < end - 1e-12:
+            dt = min(self.step_size, end - self.clock.now)
+            for plant, _pwm, _dir1, _dir2 in self.plants:
+                plant.step(dt)
+            self.clock.advance(dt)
+            for plant, _pwm, _dir1, _dir2 in self.plants:
+                plant.fire_edges()
+
+    def run_realtime(self):
+        # Keep the plants running against the wall clock in a daemon
+        # thread, for running the GUI on a desktop without an antenna
+        def follow():
+            while True:
+                time.sleep(0.001)
+                behind = time.monotonic() - self.clock.now
+                if behind > 0:
+                    self.advance(behind)
+        self.clock.now = time.monotonic()
+        for plant, _pwm, _dir1, _dir2 in self.plants:
+            plant.last_moved = self.clock.now
+        thread = threading.Thread(target=follow, name='RPiAntSim',
+                                  daemon=True)
+        thread.start()
+        return thread
+
+def default_load(position, span=270.0, extra=0.3):
+    # A screwdriver antenna gets a little harder to drive as it extends
+    return 1.0 + extra * max(0.0, min(position, span)) / span
+
+def simulated_gpio(pins=(19, 13, 15, 11), **plant_args):
+    # GPIO stand-in with one antenna on the given pins, running in real
+    # time, used when RPi.GPIO is not available
+    gpio = SimGPIO()
+    plant_args.setdefault('load', default_load)
+    gpio.attach(MotorPlant(gpio.clock, **plant_args), *pins)
+    gpio.run_realtime()
+    return gpio
+
+def simulated_antennas(controllers):
+    # GPIO stand-in with an antenna on the pins of each controller
+    gpio = SimGPIO()
+    for controller in controllers:
+        gpio.attach(MotorPlant(gpio.clock, position=controller.encoder.position,
+                               load=default_load), *controller.pins)
+    gpio.run_realtime()
+    return gpio
+
+def run(clock, plant, tick, period, limit):
+    # Call tick() every period seconds of virtual time while the plant
+    # runs, until tick() returns False or the time limit is reached.
+    # Returns the time taken for the antenna to come to its final rest.
+    start = clock.now
+    plant.last_moved = start
+    while clock.now - start < limit:
+        if not tick():
+            break
+        plant.advance(period)
+    # Let the antenna come to rest
+    while plant.moving and clock.now - start < limit:
+        plant.advance(period)
+    return plant.last_moved - start
+
+def sim_controller(gpio, antenna='Antenna 1', **plant_args):
+    # AntennaController for a simulated antenna set up from the default
+    # ini file contents, with a plant attached to its pins
+    import configparser
+    import RPiAntDrv
+    config = configparser.ConfigParser()
+    config.read_dict(RPiAntDrv.DEFAULT_INI)
+    config.set('Settings', 'last_antenna', antenna)
+    controller = RPiAntDrv.AntennaController(gpio=gpio, clock=gpio.clock)
+    controller.load(config)
+    plant_args.setdefault('position', controller.encoder.position)
+    plant = MotorPlant(gpio.clock, **plant_args)
+    gpio.attach(plant, controller.pwm_pin, controller.dir1_pin,
+                controller.dir2_pin, controller.encoder_pin)
+    controller.start(monitor=False, record=False) # tick() runs on the virtual clock
+    return controller, plant
+
+def run_controller(gpio, controller, limit, until=None):
+    # Tick the controller on the virtual clock until it is idle, or
+    # until() is true, and the antenna has come to rest
+    start = gpio.clock.now
+    while gpio.clock.now - start < limit:
+        busy = controller.tick()
+        if until is not None:
+            if until():
+                break
+        elif not busy and not any(plant.moving for plant, _p, _d1, _d2
+                                  in gpio.plants):
+            break
+        gpio.advance(controller.tick_period)
+    return gpio.clock.now - start
+
+class SimTimers:
+    # Stand-in for Tk's after() and after_cancel() on the virtual clock,
+    # callbacks only run when run_due() is called
+    def __init__(self, clock):
+        self.clock = clock
+        self.jobs = {}            # Job id to (due time, callback)
+        self.next_job = 0
+        self.fired = []           # When each callback ran
+
+    def after(self, ms, callback):
+        self.next_job += 1
+        self.jobs[self.next_job] = (self.clock.now + ms / 1000.0, callback)
+        return self.next_job
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def run_due(self):
+        now = self.clock.now + 1e-9
+        for job, (due, callback) in sorted(self.jobs.items(),
+                                           key=lambda item: item[1][0]):
+            if due <= now and self.jobs.pop(job, None) is not None:
+                self.fired.append(self.clock.now)
+                callback()
+
+class SimRig(socketserver.ThreadingTCPServer):
+    # Stand-in for Hamlib rigctld, just enough of it for frequency follow:
+    # f / \get_freq, F / \set_freq and q. Frequencies are in Hz.
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=4532, frequency=14074000):
+        self.frequency = frequency
+        self.requests = 0
+        socketserver.ThreadingTCPServer.__init__(self, (host, port),
+                                                 RigHandler)
+        self.port = self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='SimRig',
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def play(self, sweep):
+        # Replay (seconds, MHz) VFO steps in real time from a thread
+        def replay():
+            start = time.monotonic()
+            for t, mhz in sweep:
+                delay = start + t - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self.frequency = int(round(mhz * 1e6))
+        thread = threading.Thread(target=replay, name='SimRig sweep',
+                                  daemon=True)
+        thread.start()
+        return thread
+
+class RigHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        rig = self.server
+        for line in self.rfile:
+            command = line.decode('ascii', 'replace').strip()
+            rig.requests += 1
+            if command in ('f', '\\get_freq'):
+                reply = '%d\n' % rig.frequency
+            elif command.startswith(('F ', '\\set_freq ')):
+                try:
+                    rig.frequency = int(float(command.split()[1]))
+                    reply = 'RPRT 0\n'
+                except ValueError:
+                    reply = 'RPRT -1\n'
+            elif command in ('q', '\\quit'):
+                break
+            else:
+                reply = 'RPRT -4\n'
+            self.wfile.write(reply.encode())
+
+def vfo_sweep(rate=20):
+    # An operator working 80m and then 40m, VFO positions reported rate
+    # times a second: spins of the knob that speed up and slow down,
+    # pauses, small tweaks back and forth, an overshoot and a band change.
+    moves = [(3.573, 1.0),      # (MHz to tune to, seconds taken)
+             (3.573, 1.5),
+             (3.650, 2.0),
+             (3.790, 3.0),
+             (3.790, 1.0),
+             (3.815, 0.6),      # Hunting for a station
+             (3.770, 1.0),
+             (3.800, 0.8),
+             (3.785, 0.6),
+             (3.791, 0.5),
+             (3.791, 1.5),
+             (3.700, 2.5),
+             (3.680, 0.5),      # Overshoot and back
+             (3.7005, 0.8),
+             (3.7005, 2.0),
+             (7.074, 0.05),     # Band change
+             (7.074, 2.0),
+             (7.200, 3.0),
+             (7.150, 1.5),
+             (7.160, 0.8)]
+    sweep = [(0.0, moves[0][0])]
+    t, freq = 0.0, moves[0][0]
+    for target, seconds in moves[1:]:
+        steps = max(1, int(round(seconds * rate)))
+        start = freq
+        for i in range(1, steps + 1):
+            # Knob speeds up then slows down, smoothstep from start to target
+            x = i / steps
+            freq = start + (target - start) * x * x * (3 - 2 * x)
+            t += 1.0 / rate
+            sweep.append((round(t, 3), round(freq, 6)))
+    return sweep
+
+def read_sweep(path):
+    # Recorded VFO sweep, one "seconds MHz" pair per line
+    sweep = []
+    with open(path) as sweep_file:
+        for line in sweep_file:
+            fields = line.split()
+            if len(fields) >= 2 and not line.startswith('#'):
+                sweep.append((float(fields[0]), float(fields[1])))
+    return sweep
+
+def main():
+    # A stand-in rigctld for trying out frequency follow without a radio
+    import argparse
+    parser = argparse.ArgumentParser(prog='RPiAntSim.py',
+                                     description='Stand-in rigctld')
+    parser.add_argument('--port', type=int, default=4532)
+    parser.add_argument('--freq', type=float, default=3.573,
+                        help='starting frequency in MHz')
+    parser.add_argument('--sweep', nargs='?', const='', metavar='FILE',
+                        help='replay a recorded "seconds MHz" VFO sweep, '
+                        'or a built in one if no FILE is given')
+    args = parser.parse_args()
+    rig = SimRig(port=args.port, frequency=int(round(args.freq * 1e6)))
+    print ('Stand-in rigctld on port %d' % rig.port, flush=True)
+    if args.sweep is not None:
+        rig.play(read_sweep(args.sweep) if args.sweep else vfo_sweep())
+    try:
+        rig.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()